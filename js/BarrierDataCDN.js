@@ -89,6 +89,48 @@ class BarrierDataCDN {
         }
     }
     
+    /**
+     * Charge progressivement la version par blocs d'un fichier
+     * (.geojsonl.gz et son index .geojsonl.idx)
+     *
+     * Chaque bloc est téléchargé par une requête Range et décompressé seul :
+     * onFeatures est appelé dès le premier bloc, sans attendre le fichier
+     * entier. Avec bbox ([ouest, sud, est, nord]), seuls les blocs dont
+     * l'emprise l'intersecte sont téléchargés.
+     */
+    async loadGeoJSONSeq(filePath, onFeatures, bbox = null) {
+        const base = `${this.baseUrl}/data/${filePath.replace(/\.geojson$/, '')}`;
+        const indexResponse = await fetch(`${base}.geojsonl.idx`);
+        if (!indexResponse.ok) {
+            throw new Error(`HTTP error ${indexResponse.status}`);
+        }
+        const index = await indexResponse.json();
+        const fields = index.fields;
+        const at = (block, name) => block[fields.indexOf(name)];
+        let count = 0;
+
+        for (const block of index.blocks) {
+            if (bbox && at(block, 'min_x') !== null
+                && (at(block, 'min_x') > bbox[2] || at(block, 'min_y') > bbox[3]
+                    || at(block, 'max_x') < bbox[0] || at(block, 'max_y') < bbox[1])) {
+                continue;
+            }
+            const start = at(block, 'offset');
+            const end = start + at(block, 'length') - 1;
+            const response = await fetch(`${base}.geojsonl.gz`, {
+                headers: { Range: `bytes=${start}-${end}` }
+            });
+            if (response.status !== 206) {
+                throw new Error(`Range requests not supported (HTTP ${response.status})`);
+            }
+            const text = pako.inflate(new Uint8Array(await response.arrayBuffer()), { to: 'string' });
+            const features = text.split('\n').filter(line => line).map(line => JSON.parse(line));
+            count += features.length;
+            onFeatures(features);
+        }
+        return count;
+    }
+
     /**
      * Charge les données d'un pays
      */
@@ -2,9 +2,65 @@ import os
 import json
 import shutil
 import argparse
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 
-def add_geojson_to_cdn(source_file, category, name):
+from catalog import DEFAULT_CATALOG, Catalog, update_catalog
+from metrics import NO_METRICS, add_metrics_arguments, metrics_from_args
+from validate_geojson import (DEFAULT_ID_PROPERTY, ERRORS, failed_report, print_report,
+                              validate_file)
+
+VALID_CATEGORIES = ['types', 'countries', 'regions']
+
+def ingest_file(source_file, dest_file, validate=True, repair=False, minify=False, compress=False,
+                id_property=DEFAULT_ID_PROPERTY):
+    """
+    Valide un fichier source et le place dans le CDN s'il est publiable
+
+    Le fichier est lu une seule fois, en flux (voir validate_geojson). Avec
+    repair, minify ou compress, la version compacte (et sa version .gz) est
+    écrite pendant cette lecture ; sinon le fichier validé est copié tel
+    quel (un source .gz reste compressé).
+
+    Args:
+        source_file: Fichier .geojson ou .geojson.gz
+        dest_file: Fichier de destination (data/<catégorie>/<nom>.geojson)
+        validate: Valider avant de copier (toujours fait en cas de réécriture)
+        repair: Corriger ou écarter les features invalides
+        minify: Réécrire le fichier sans espaces
+        compress: Écrire aussi dest_file.gz
+        id_property: Propriété d'identifiant vérifiée pour l'unicité
+
+    Returns:
+        Rapport de validate_file ("outputs" : fichiers publiés), ou None
+        sans validation
+    """
+    rewrite = repair or minify or compress
+    report = None
+    if validate or rewrite:
+        report = validate_file(source_file,
+                               output=dest_file if rewrite else None,
+                               compressed=f"{dest_file}.gz" if compress else None,
+                               repair=repair, id_property=id_property)
+        if not report["valid"] or rewrite:
+            return report
+    target = f"{dest_file}.gz" if source_file.endswith('.gz') else dest_file
+    shutil.copy2(source_file, target)
+    if report is not None:
+        report["outputs"] = [target]
+        report["bytes_out"] = os.path.getsize(target)
+    return report
+
+def rejection_reason(report):
+    """Raison du refus d'un fichier invalide"""
+    if report["fatal"]:
+        return f"fichier illisible ({report['fatal']})"
+    errors = {issue: count for issue, count in report["issues"].items() if issue in ERRORS}
+    details = ', '.join(f"{issue} : {count}" for issue, count in errors.items())
+    return f"{sum(errors.values())} problème(s) bloquant(s) ({details}), --repair pour les corriger"
+
+def add_geojson_to_cdn(source_file, category, name, catalog=None, metrics=NO_METRICS,
+                       validate=True, repair=False, minify=False, compress=False,
+                       id_property=DEFAULT_ID_PROPERTY, reports=None):
     """
     Ajoute un fichier GeoJSON au CDN
     
@@ -12,11 +68,19 @@ def add_geojson_to_cdn(source_file, category, name):
         source_file: Chemin vers le fichier GeoJSON source
         category: Catégorie (types, countries, regions)
         name: Nom à donner au fichier (sans extension)
+        catalog: Catalogue ouvert (voir catalog.Catalog) ; par défaut le
+            catalogue est mis à jour immédiatement
+        metrics: Mesures (étapes "validate" ou "copy", et "catalog")
+        validate, repair, minify, compress, id_property: Voir ingest_file
+        reports: Liste complétée par le rapport de validation
+
+    Raises:
+        ValueError: si la catégorie est invalide ou si le fichier est refusé
+            par la validation
     """
     # Vérifier que la catégorie est valide
-    valid_categories = ['types', 'countries', 'regions']
-    if category not in valid_categories:
-        raise ValueError(f"Catégorie invalide. Doit être l'une de : {valid_categories}")
+    if category not in VALID_CATEGORIES:
+        raise ValueError(f"Catégorie invalide. Doit être l'une de : {VALID_CATEGORIES}")
     
     # Vérifier que le fichier source existe
     if not os.path.isfile(source_file):
@@ -28,69 +92,177 @@ def add_geojson_to_cdn(source_file, category, name):
     
     dest_file = f"{dest_dir}/{name.lower()}.geojson"
     
-    # Copier le fichier
-    shutil.copy2(source_file, dest_file)
-    print(f"Fichier copié : {dest_file}")
+    # Valider puis copier (ou réécrire) le fichier
+    with metrics.stage("validate" if validate or repair or minify or compress else "copy") as stage:
+        report = ingest_file(source_file, dest_file, validate, repair, minify, compress, id_property)
+        if report is None:
+            size = os.path.getsize(source_file)
+            stage.add(rows=1, bytes_in=size, bytes_out=size)
+        else:
+            stage.add(rows=report["features"], bytes_in=report["bytes_in"], bytes_out=report["bytes_out"])
+    if report is not None:
+        print_report([report])
+        if reports is not None:
+            reports.append(report)
+        if not report["valid"]:
+            raise ValueError(f"Fichier refusé : {rejection_reason(report)}")
+        dest_file = report["outputs"][0]
+    print(f"Fichier publié : {dest_file}")
     
     # Mettre à jour le catalogue
-    update_catalog(dest_file)
+    with metrics.stage("catalog"):
+        if catalog is None:
+            update_catalog(dest_file)
+        else:
+            catalog.add_file(dest_file)
     
     return dest_file
 
-def update_catalog(file_path):
-    """Met à jour le catalogue avec le nouveau fichier"""
-    catalog_path = "metadata/catalog.json"
-    
-    # Lire le catalogue existant
-    with open(catalog_path, 'r', encoding='utf-8') as f:
-        catalog = json.load(f)
-    
-    # Déterminer la catégorie
-    if '/types/' in file_path:
-        category = 'types'
-    elif '/countries/' in file_path:
-        category = 'countries'
-    elif '/regions/' in file_path:
-        category = 'regions'
-    else:
-        category = None
-    
-    # Ajouter le fichier au catalogue
-    if category:
-        # Retirer le préfixe "data/" pour le stockage dans le catalogue
-        relative_path = file_path
-        if relative_path.startswith('data/'):
-            relative_path = relative_path[5:]
-        
-        # Vérifier si le fichier existe déjà
-        if relative_path not in catalog['data_categories'][category]['files']:
-            catalog['data_categories'][category]['files'].append(relative_path)
-    
-    # Mettre à jour la date
-    catalog['last_updated'] = datetime.now().isoformat()
-    
-    # Sauvegarder le catalogue
-    with open(catalog_path, 'w', encoding='utf-8') as f:
-        json.dump(catalog, f, indent=2)
-    
-    print(f"Catalogue mis à jour avec {file_path}")
+def default_name(source_file):
+    """Nom par défaut d'un fichier : son nom sans extension"""
+    name = os.path.basename(source_file)
+    for extension in ('.gz', '.geojson', '.json'):
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+    return name
+
+def add_geojson_batch(source_files, category, catalog_path=DEFAULT_CATALOG, metrics=NO_METRICS,
+                      validate=True, repair=False, minify=False, compress=False,
+                      id_property=DEFAULT_ID_PROPERTY, workers=None, reports=None):
+    """
+    Ajoute plusieurs fichiers GeoJSON au CDN en une seule écriture du catalogue
+    
+    Les fichiers sont validés (et réécrits) en parallèle, un processus par
+    fichier ; un rapport de débit et de problèmes est affiché pour chacun.
+    
+    Args:
+        source_files: Chemins des fichiers sources (nommés d'après leur nom de fichier)
+        category: Catégorie (types, countries, regions)
+        catalog_path: Chemin vers le catalogue
+        metrics: Mesures (étapes "validate" ou "copy", mesurées dans les
+            processus, et "catalog")
+        validate, repair, minify, compress, id_property: Voir ingest_file
+        workers: Nombre de processus (défaut : nombre de CPU)
+        reports: Liste complétée par les rapports de validation
+    
+    Returns:
+        Liste des fichiers ajoutés
+
+    Raises:
+        ValueError: si la catégorie est invalide ou si plusieurs sources
+            donnent le même fichier de destination (noms égaux à la casse près)
+    """
+    if category not in VALID_CATEGORIES:
+        raise ValueError(f"Catégorie invalide. Doit être l'une de : {VALID_CATEGORIES}")
+    dest_dir = f"data/{category}"
+    
+    jobs = {}
+    for source_file in source_files:
+        if not os.path.isfile(source_file):
+            print(f"Erreur pour {source_file} : le fichier source n'existe pas")
+            metrics.event("file_failed", source=source_file, error="missing")
+            continue
+        jobs[source_file] = f"{dest_dir}/{default_name(source_file).lower()}.geojson"
+
+    # Deux sources vers la même destination seraient écrites en même temps
+    # par deux processus : le lot est refusé avant toute écriture
+    sources_by_dest = {}
+    for source_file, dest_file in jobs.items():
+        sources_by_dest.setdefault(dest_file, []).append(source_file)
+    conflicts = {dest_file: sources for dest_file, sources in sources_by_dest.items() if len(sources) > 1}
+    if conflicts:
+        raise ValueError("Plusieurs sources pour une même destination : " + "; ".join(
+            f"{dest_file} <- {', '.join(sources)}" for dest_file, sources in sorted(conflicts.items())))
+    os.makedirs(dest_dir, exist_ok=True)
+    
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {source_file: executor.submit(ingest_file, source_file, dest_file, validate, repair,
+                                                minify, compress, id_property)
+                   for source_file, dest_file in jobs.items()}
+        for source_file, future in futures.items():
+            try:
+                results[source_file] = future.result()
+            except Exception as e:
+                results[source_file] = failed_report(source_file, e)
+    
+    checked = [report for report in results.values() if report is not None]
+    for report in checked:
+        metrics.record("validate", report["seconds"], report["cpu_seconds"], rows=report["features"],
+                       bytes_in=report["bytes_in"], bytes_out=report["bytes_out"])
+    if checked:
+        print_report(checked)
+    if reports is not None:
+        reports.extend(checked)
+    
+    added = []
+    with metrics.stage("catalog"), Catalog(catalog_path) as catalog:
+        for source_file, report in results.items():
+            if report is not None and not report["valid"]:
+                print(f"Fichier refusé {source_file} : {rejection_reason(report)}")
+                metrics.event("file_failed", source=source_file, error=rejection_reason(report))
+                continue
+            dest_file = jobs[source_file] if report is None else report["outputs"][0]
+            catalog.add_file(dest_file)
+            added.append(dest_file)
+    print(f"Catalogue mis à jour avec {len(added)} fichier(s)")
+    return added
 
 def main():
     parser = argparse.ArgumentParser(description='Ajouter un fichier GeoJSON au CDN')
-    parser.add_argument('source', help='Chemin vers le fichier GeoJSON source')
+    parser.add_argument('sources', nargs='+', help='Chemin(s) vers le(s) fichier(s) GeoJSON source(s)')
     parser.add_argument('--category', '-c', required=True, 
-                        choices=['types', 'countries', 'regions'],
+                        choices=VALID_CATEGORIES,
                         help='Catégorie du fichier')
-    parser.add_argument('--name', '-n', required=True,
-                        help='Nom à donner au fichier (sans extension)')
+    parser.add_argument('--name', '-n',
+                        help='Nom à donner au fichier (sans extension, un seul fichier source)')
+    parser.add_argument('--no-validate', action='store_true',
+                        help='Copier sans valider les features')
+    parser.add_argument('--repair', action='store_true',
+                        help='Corriger les géométries réparables (anneaux ouverts, longitude et '
+                             'latitude inversées) et écarter les features invalides ou en double')
+    parser.add_argument('--minify', '-m', action='store_true',
+                        help='Réécrire le fichier sans espaces')
+    parser.add_argument('--compress', '-z', action='store_true',
+                        help='Écrire aussi la version .gz dans la même passe')
+    parser.add_argument('--id-property', default=DEFAULT_ID_PROPERTY,
+                        help=f'Propriété d\'identifiant vérifiée pour l\'unicité '
+                             f'(défaut : {DEFAULT_ID_PROPERTY})')
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                        help='Nombre de processus pour plusieurs fichiers (défaut : nombre de CPU)')
+    parser.add_argument('--report', '-r',
+                        help='Fichier JSON où écrire les rapports de validation')
+    add_metrics_arguments(parser)
     
     args = parser.parse_args()
     
-    try:
-        dest_file = add_geojson_to_cdn(args.source, args.category, args.name)
-        print(f"Fichier ajouté avec succès : {dest_file}")
-    except Exception as e:
-        print(f"Erreur : {e}")
+    if len(args.sources) > 1 and args.name:
+        parser.error("--name ne peut être utilisé qu'avec un seul fichier source")
+    
+    options = {"validate": not args.no_validate, "repair": args.repair, "minify": args.minify,
+               "compress": args.compress, "id_property": args.id_property}
+    reports = []
+    with metrics_from_args(args, "add_geojson_to_cdn") as metrics:
+        if len(args.sources) > 1:
+            try:
+                add_geojson_batch(args.sources, args.category, metrics=metrics, workers=args.workers,
+                                  reports=reports, **options)
+            except ValueError as e:
+                print(f"Erreur : {e}")
+        else:
+            try:
+                name = args.name or default_name(args.sources[0])
+                dest_file = add_geojson_to_cdn(args.sources[0], args.category, name, metrics=metrics,
+                                               reports=reports, **options)
+                print(f"Fichier ajouté avec succès : {dest_file}")
+            except Exception as e:
+                print(f"Erreur : {e}")
+                metrics.event("file_failed", source=args.sources[0], error=str(e))
+    
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+        print(f"Rapports écrits dans {args.report}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
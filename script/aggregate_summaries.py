@@ -0,0 +1,402 @@
+import os
+import gzip
+import json
+import math
+import time
+import struct
+import argparse
+from array import array
+from collections import Counter
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from catalog import DEFAULT_CATALOG, Catalog
+from columnar_format import ColumnarReader, columnar_path_for
+from generate_tiles import MAX_LATITUDE
+from geojson_stream import iter_features
+from property_schema import country_from_path
+
+DEFAULT_OUTPUT_DIR = "aggregates"
+
+# Propriétés croisées dans le résumé global (cube des effectifs)
+DEFAULT_DIMENSIONS = ("Country", "LabelAtlas", "HClass")
+
+# Propriété détaillée dans chaque cellule de grille
+GRID_PROPERTY = "LabelAtlas"
+
+# Niveaux de quadkey (zooms des tuiles Web Mercator) des grilles
+DEFAULT_LEVELS = (4, 6, 8, 10)
+
+# Catégories agrégées : les fichiers par pays partitionnent les données
+# (les autres catégories en sont des sous-ensembles et seraient comptées deux fois)
+DEFAULT_CATEGORIES = ("countries",)
+
+# En-tête des grilles binaires : signature, niveau, nombre de valeurs de
+# GRID_PROPERTY, nombre de cellules, types (array) des tuiles et des effectifs
+GRID_MAGIC = b'CDNAGG\x01\x00'
+GRID_HEADER = struct.Struct('<8sHHIcc2x')
+
+# Plus petit type entier non signé (array) pour une valeur maximale
+_UINT_TYPES = ((0xFF, 'B'), (0xFFFF, 'H'), (0xFFFFFFFF, 'I'))
+
+
+def quadkey(x, y, level):
+    """Quadkey (texte) de la tuile (x, y) d'un niveau"""
+    digits = []
+    for i in range(level, 0, -1):
+        mask = 1 << (i - 1)
+        digits.append(str((1 if x & mask else 0) + (2 if y & mask else 0)))
+    return ''.join(digits)
+
+
+def tile_columns(xs, ys, level):
+    """
+    Tuiles (x, y) entières de points au niveau donné
+
+    La projection n'est calculée qu'une fois, au niveau le plus fin : les
+    niveaux inférieurs s'obtiennent par décalage de bits (voir
+    aggregate_file).
+    """
+    n = 1 << level
+    scale_x = n / 360.0
+    tiles_x = array('I', (min(max(int((x + 180.0) * scale_x), 0), n - 1) for x in xs))
+    tiles_y = array('I', (
+        min(max(int((1.0 - math.asinh(math.tan(math.radians(max(-MAX_LATITUDE, min(MAX_LATITUDE, y)))))
+                     / math.pi) / 2.0 * n), 0), n - 1)
+        for y in ys))
+    return tiles_x, tiles_y
+
+
+def _read_columns(file_path, names):
+    """
+    Coordonnées et propriétés d'un fichier, colonne par colonne
+
+    Le fichier colonnes .geocol est utilisé s'il est à jour (lecture sans
+    décodage JSON), sinon les features sont lues une par une. Les points
+    sans géométrie sont ignorés.
+
+    Returns:
+        Tuple (longitudes, latitudes, {propriété: valeurs})
+    """
+    columnar_file = columnar_path_for(file_path)
+    if os.path.isfile(columnar_file) and os.path.getmtime(columnar_file) >= os.path.getmtime(file_path):
+        xs, ys, columns = array('d'), array('d'), {name: [] for name in names}
+        with ColumnarReader(columnar_file) as reader:
+            for group in range(len(reader.row_groups)):
+                group_xs, group_ys = reader.coordinates(group)
+                keep = [i for i, x in enumerate(group_xs) if not math.isnan(x)]
+                xs.extend(group_xs[i] for i in keep)
+                ys.extend(group_ys[i] for i in keep)
+                del group_xs, group_ys
+                for name in names:
+                    values = reader.values(name, group)
+                    columns[name].extend(values[i] for i in keep)
+        return xs, ys, columns
+
+    xs, ys, columns = array('d'), array('d'), {name: [] for name in names}
+    opener = gzip.open if file_path.endswith('.gz') else open
+    with opener(file_path, 'rt', encoding='utf-8') as f:
+        for feature in iter_features(f):
+            geometry = feature.get("geometry")
+            if not geometry or geometry.get("type") != "Point":
+                continue
+            xs.append(geometry["coordinates"][0])
+            ys.append(geometry["coordinates"][1])
+            properties = feature.get("properties") or {}
+            for name in names:
+                columns[name].append(properties.get(name))
+    return xs, ys, columns
+
+
+def aggregate_file(file_path, dimensions=DEFAULT_DIMENSIONS, levels=DEFAULT_LEVELS):
+    """
+    Effectifs d'un fichier : cube des dimensions et grilles par niveau
+
+    Les comptages portent sur des colonnes entières (Counter sur des
+    tuples), sans boucle Python par feature et par agrégat. Les fichiers
+    par pays normalisés n'ont plus de propriété Country (voir
+    property_schema.PROFILES) : elle est déduite du nom du fichier.
+
+    Returns:
+        Dictionnaire (features, cube : Counter {tuple des dimensions: n},
+        grids : {niveau: Counter {(x, y, valeur de GRID_PROPERTY): n}})
+    """
+    names = list(dict.fromkeys(list(dimensions) + [GRID_PROPERTY]))
+    xs, ys, columns = _read_columns(file_path, names)
+    country = country_from_path(file_path) if "Country" in columns else None
+    if country:
+        columns["Country"] = [country if value is None else value for value in columns["Country"]]
+
+    cube = Counter(zip(*(columns[name] for name in dimensions)))
+    grids = {}
+    if levels:
+        top = max(levels)
+        tiles_x, tiles_y = tile_columns(xs, ys, top)
+        labels = columns[GRID_PROPERTY]
+        for level in levels:
+            shift = top - level
+            if shift:
+                level_x = [x >> shift for x in tiles_x]
+                level_y = [y >> shift for y in tiles_y]
+            else:
+                level_x, level_y = tiles_x, tiles_y
+            grids[level] = Counter(zip(level_x, level_y, labels))
+    return {"features": len(xs), "cube": cube, "grids": grids}
+
+
+def find_sources(data_dir="data", categories=DEFAULT_CATEGORIES):
+    """Fichiers à agréger (le .geojson est préféré au .geojson.gz)"""
+    sources = {}
+    for category in categories:
+        category_dir = os.path.join(data_dir, category)
+        if not os.path.isdir(category_dir):
+            continue
+        for name in sorted(os.listdir(category_dir)):
+            if name.endswith('.geojson') or name.endswith('.geojson.gz'):
+                base_path = os.path.join(category_dir, name.split('.geojson')[0])
+                if base_path not in sources or name.endswith('.geojson'):
+                    sources[base_path] = os.path.join(category_dir, name)
+    return list(sources.values())
+
+
+def _sort_key(value):
+    # Valeurs absentes en dernier, types mélangés comparés par leur texte
+    return (value is None, str(value))
+
+
+def _write_bytes(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _write_json(path, data):
+    _write_bytes(path, json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def write_summary(totals, dimensions, output_dir):
+    """
+    Écrit le résumé global (summary.json)
+
+    Chaque dimension a sa liste de valeurs ; le cube est une liste creuse de
+    [indice de la valeur de chaque dimension..., effectif]. Les totaux par
+    dimension sont aussi donnés directement.
+    """
+    cube = totals["cube"]
+    values = {name: sorted({key[i] for key in cube}, key=_sort_key)
+              for i, name in enumerate(dimensions)}
+    positions = {name: {value: i for i, value in enumerate(values[name])} for name in dimensions}
+    counts = sorted([positions[name][key[i]] for i, name in enumerate(dimensions)] + [n]
+                    for key, n in cube.items())
+    by_dimension = {}
+    for i, name in enumerate(dimensions):
+        marginal = Counter()
+        for key, n in cube.items():
+            marginal[key[i]] += n
+        by_dimension[name] = [[positions[name][value], n] for value, n in sorted(
+            marginal.items(), key=lambda item: _sort_key(item[0]))]
+
+    summary = {
+        "created": datetime.now().isoformat(),
+        "features": totals["features"],
+        "dimensions": list(dimensions),
+        "values": values,
+        "totals": by_dimension,
+        "counts": counts
+    }
+    path = os.path.join(output_dir, "summary.json")
+    _write_json(path, summary)
+    return path
+
+
+def write_grid(level, grid, labels, output_dir):
+    """
+    Écrit la grille d'un niveau en JSON (cellules par quadkey) et en binaire
+
+    Chaque cellule porte [total, effectif de chaque valeur de labels]. Le
+    fichier binaire contient, après GRID_HEADER, les x puis les y des
+    tuiles, puis les effectifs (une ligne de 1 + len(labels) par cellule),
+    en entiers non signés little-endian de la plus petite taille suffisante
+    (types array de l'en-tête).
+
+    Returns:
+        Dictionnaire (json, bin, cells, size) des fichiers écrits
+    """
+    label_index = {label: i + 1 for i, label in enumerate(labels)}
+    cells = {}
+    for (x, y, label), n in grid.items():
+        row = cells.get((x, y))
+        if row is None:
+            row = cells[(x, y)] = [0] * (len(labels) + 1)
+        row[0] += n
+        row[label_index[label]] += n
+    ordered = sorted(cells)
+
+    json_path = os.path.join(output_dir, f"grid_z{level}.json")
+    _write_json(json_path, {
+        "level": level,
+        "property": GRID_PROPERTY,
+        "labels": labels,
+        "cells": {quadkey(x, y, level): cells[(x, y)] for x, y in ordered}
+    })
+
+    tile_type = _uint_type((1 << level) - 1)
+    count_type = _uint_type(max((cells[cell][0] for cell in ordered), default=0))
+    xs = array(tile_type, (x for x, _ in ordered))
+    ys = array(tile_type, (y for _, y in ordered))
+    counts = array(count_type, (n for cell in ordered for n in cells[cell]))
+    if struct.pack('=I', 1) != struct.pack('<I', 1):
+        for values in (xs, ys, counts):
+            values.byteswap()
+    bin_path = os.path.join(output_dir, f"grid_z{level}.bin")
+    header = GRID_HEADER.pack(GRID_MAGIC, level, len(labels), len(ordered),
+                              tile_type.encode('ascii'), count_type.encode('ascii'))
+    _write_bytes(bin_path, header + xs.tobytes() + ys.tobytes() + counts.tobytes())
+
+    return {
+        "json": json_path,
+        "bin": bin_path,
+        "cells": len(ordered),
+        "size": os.path.getsize(json_path),
+        "bin_size": os.path.getsize(bin_path)
+    }
+
+
+def _uint_type(maximum):
+    return next(typecode for limit, typecode in _UINT_TYPES if maximum <= limit)
+
+
+def read_grid(bin_path):
+    """
+    Relit une grille binaire
+
+    Returns:
+        Tuple (niveau, {(x, y): [total, effectif de chaque valeur]})
+    """
+    with open(bin_path, 'rb') as f:
+        data = f.read()
+    magic, level, labels, count, tile_type, count_type = GRID_HEADER.unpack_from(data)
+    if magic != GRID_MAGIC:
+        raise ValueError(f"Grille binaire invalide : {bin_path}")
+    offset = GRID_HEADER.size
+    columns = []
+    for typecode, length in ((tile_type, count), (tile_type, count),
+                             (count_type, count * (labels + 1))):
+        values = array(typecode.decode('ascii'))
+        values.frombytes(data[offset:offset + length * values.itemsize])
+        if struct.pack('=I', 1) != struct.pack('<I', 1):
+            values.byteswap()
+        offset += length * values.itemsize
+        columns.append(values)
+    xs, ys, counts = columns
+    width = labels + 1
+    return level, {(xs[i], ys[i]): list(counts[i * width:(i + 1) * width]) for i in range(count)}
+
+
+def _relative(path, output_dir):
+    """Chemin publié (dossier de sortie/nom du fichier)"""
+    return f"{os.path.basename(os.path.normpath(output_dir))}/{os.path.basename(path)}"
+
+
+def build_aggregates(data_dir="data", output_dir=DEFAULT_OUTPUT_DIR, dimensions=DEFAULT_DIMENSIONS,
+                     levels=DEFAULT_LEVELS, categories=DEFAULT_CATEGORIES, workers=None,
+                     catalog_path=None):
+    """
+    Calcule les résumés de tout l'arbre de données et les publie
+
+    Chaque fichier est agrégé dans un processus séparé (une seule lecture) ;
+    les effectifs sont ensuite additionnés. Les fichiers écrits sont
+    référencés dans le catalogue (clé "aggregates") si catalog_path est
+    fourni.
+
+    Returns:
+        Entrée "aggregates" du catalogue
+
+    Raises:
+        RuntimeError: si un fichier n'a pas pu être agrégé (rien n'est
+            publié : les effectifs seraient incomplets)
+    """
+    start = time.perf_counter()
+    files = find_sources(data_dir, categories)
+    print(f"Trouvé {len(files)} fichiers à agréger, niveaux {list(levels)}")
+
+    totals = {"features": 0, "cube": Counter(), "grids": {level: Counter() for level in levels}}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(aggregate_file, path, dimensions, levels): path for path in files}
+        failed = []
+        for future, path in futures.items():
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Erreur lors de l'agrégation de {path}: {e}")
+                failed.append(path)
+                continue
+            totals["features"] += result["features"]
+            totals["cube"].update(result["cube"])
+            for level, grid in result["grids"].items():
+                totals["grids"][level].update(grid)
+    if failed:
+        raise RuntimeError(f"{len(failed)} fichier(s) non agrégé(s), résumés non publiés : "
+                           + ", ".join(failed))
+
+    os.makedirs(output_dir, exist_ok=True)
+    summary_path = write_summary(totals, dimensions, output_dir)
+    labels = sorted({label for grid in totals["grids"].values() for _, _, label in grid},
+                    key=_sort_key)
+    grids = {}
+    for level in levels:
+        info = write_grid(level, totals["grids"][level], labels, output_dir)
+        grids[str(level)] = {
+            "json": _relative(info["json"], output_dir),
+            "bin": _relative(info["bin"], output_dir),
+            "cells": info["cells"],
+            "size": info["size"],
+            "bin_size": info["bin_size"]
+        }
+        print(f"  Niveau {level} : {info['cells']} cellules, {info['size'] / 1024:.1f} KB")
+
+    entry = {
+        "summary": _relative(summary_path, output_dir),
+        "features": totals["features"],
+        "dimensions": list(dimensions),
+        "grid_property": GRID_PROPERTY,
+        "grids": grids
+    }
+    if catalog_path:
+        with Catalog(catalog_path) as catalog:
+            catalog.set_aggregates(entry)
+
+    print(f"Résumés écrits dans {output_dir} : {totals['features']} features "
+          f"en {time.perf_counter() - start:.2f} s")
+    return entry
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Calculer les effectifs agrégés (résumé et grilles par quadkey)')
+    parser.add_argument('--data-dir', '-d', default='data',
+                        help='Répertoire des données (défaut : data)')
+    parser.add_argument('--output-dir', '-o', default=DEFAULT_OUTPUT_DIR,
+                        help=f'Répertoire des résumés (défaut : {DEFAULT_OUTPUT_DIR})')
+    parser.add_argument('--dimensions', nargs='+', default=list(DEFAULT_DIMENSIONS),
+                        help='Propriétés croisées dans le résumé global')
+    parser.add_argument('--levels', '-l', type=int, nargs='+', default=list(DEFAULT_LEVELS),
+                        help='Niveaux de quadkey des grilles')
+    parser.add_argument('--categories', nargs='+', default=list(DEFAULT_CATEGORIES),
+                        help='Catégories agrégées (défaut : countries)')
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                        help='Nombre de processus (défaut : nombre de CPU)')
+    parser.add_argument('--catalog', '-c', default=DEFAULT_CATALOG,
+                        help=f'Catalogue où référencer les résumés (défaut : {DEFAULT_CATALOG})')
+
+    args = parser.parse_args()
+
+    try:
+        build_aggregates(args.data_dir, args.output_dir, tuple(args.dimensions), tuple(args.levels),
+                         tuple(args.categories), args.workers, args.catalog)
+    except RuntimeError as e:
+        print(f"Erreur : {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+from datetime import datetime
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from geojson_stream import SERIALIZERS, encode_feature, feature_separator, iter_features
+from metrics import peak_rss_mb
+
+# Tailles des jeux synthétiques par défaut (nombre de features)
+DEFAULT_SIZES = (10000, 100000)
+
+# Écart relatif au-delà duquel un temps est signalé comme une régression
+DEFAULT_THRESHOLD = 0.10
+
+DEFAULT_RESULTS = "benchmarks/results.json"
+
+
+def _read_features(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return list(iter_features(f))
+
+
+# Chaque étape est un couple (préparation, mesure) : seule la mesure est
+# chronométrée ; elle retourne (nombre de features, octets traités)
+
+def _prepare_rows(path, workdir):
+    from create_geojson import plan_table
+    features = _read_features(path)
+    names = list(features[0]["properties"]) if features else []
+    columns = ["longitude", "latitude"] + names
+    rows = [[f["geometry"]["coordinates"][0], f["geometry"]["coordinates"][1]]
+            + [f["properties"].get(name) for name in names] for f in features]
+    return rows, columns, plan_table("benchmark", columns)
+
+
+def _run_rows(state):
+    from create_geojson import row_to_feature
+    rows, columns, plan = state
+    count = sum(1 for row in rows if row_to_feature(row, columns, plan) is not None)
+    return count, 0
+
+
+def _run_converter(state):
+    from create_geojson import row_converter
+    rows, columns, plan = state
+    convert = row_converter(columns, plan)
+    count = sum(1 for row in rows if convert(row) is not None)
+    return count, 0
+
+
+def _prepare_serialize(path, workdir):
+    return _read_features(path)
+
+
+def _run_serialize(features, serializer=None):
+    separator = feature_separator()
+    text = separator.join(encode_feature(feature, serializer=serializer) for feature in features)
+    return len(features), len(text.encode('utf-8'))
+
+
+def _prepare_gzip(path, workdir):
+    source = os.path.join(workdir, "gzip.geojson")
+    with gzip.open(path, 'rb') as src, open(source, 'wb') as out:
+        shutil.copyfileobj(src, out)
+    return source
+
+
+def _run_gzip(source):
+    from compress_geojson_file import compress_file
+    stats = compress_file(source)
+    return 0, stats["original_size"]
+
+
+def _prepare_catalog(path, workdir):
+    category_dir = os.path.join(workdir, "data", "countries")
+    os.makedirs(category_dir, exist_ok=True)
+    target = os.path.join(category_dir, os.path.basename(path))
+    shutil.copy(path, target)
+    return workdir, target
+
+
+def _run_catalog(state):
+    from catalog import Catalog
+    from build_catalog import find_datasets, scan_dataset
+    workdir, target = state
+    catalog_path = os.path.join(workdir, "metadata", "catalog.json")
+    if os.path.exists(catalog_path):
+        os.remove(catalog_path)
+    count = 0
+    for files in find_datasets(os.path.join(workdir, "data")).values():
+        count += scan_dataset(files)["features"]
+    # Ajout groupé de 500 fichiers au catalogue
+    with Catalog(catalog_path) as catalog:
+        for i in range(500):
+            catalog.add_file(os.path.join(workdir, "data", "countries", f"f{i}.geojson"))
+    return count, os.path.getsize(target)
+
+
+def _prepare_decode(path, workdir):
+    return path
+
+
+def _run_decode(path):
+    with gzip.open(path, 'rb') as f:
+        data = f.read()
+    collection = json.loads(data)
+    return len(collection["features"]), len(data)
+
+
+def _prepare_seq(path, workdir):
+    from geojson_seq import convert_file
+    return convert_file(path, os.path.join(workdir, "seq.geojsonl.gz"))
+
+
+def _run_seq_first(info):
+    # Temps jusqu'à la première feature (à comparer à client_decode)
+    from geojson_seq import SeqReader
+    with SeqReader(info["path"], info["index"]) as reader:
+        features = reader.block(0) if reader.blocks else []
+        size = os.path.getsize(info["index"]) + (reader.blocks[0]["length"] if reader.blocks else 0)
+    return min(len(features), 1), size
+
+
+STAGES = {
+    "row_to_feature": (_prepare_rows, _run_rows),
+    "row_converter": (_prepare_rows, _run_converter),
+    "serialize": (_prepare_serialize, _run_serialize),
+    "gzip": (_prepare_gzip, _run_gzip),
+    "catalog": (_prepare_catalog, _run_catalog),
+    "client_decode": (_prepare_decode, _run_decode),
+    "seq_first_feature": (_prepare_seq, _run_seq_first),
+}
+
+# Encodage JSON avec chacun des sérialiseurs installés (débit en MB/s par
+# backend ; "serialize" utilise le sérialiseur par défaut)
+for _name in SERIALIZERS:
+    STAGES[f"serialize_{_name}"] = (_prepare_serialize, partial(_run_serialize, serializer=_name))
+
+
+def run_stage(stage, path, repeat=3):
+    """
+    Mesure une étape sur un fichier (appelé dans un processus neuf, pour que
+    le pic de mémoire soit propre à l'étape)
+
+    Returns:
+        Dictionnaire (seconds, features, bytes, peak_rss_mb) ; seconds est
+        le meilleur temps sur repeat exécutions
+    """
+    prepare, run = STAGES[stage]
+    workdir = tempfile.mkdtemp(prefix="cdn-bench-")
+    try:
+        state = prepare(path, workdir)
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            count, size = run(state)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return {"seconds": best, "features": count, "bytes": size, "peak_rss_mb": peak_rss_mb()}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def synthetic_datasets(sizes, cache_dir, seed=0):
+    """Génère (ou réutilise) les jeux synthétiques de chaque taille"""
+    from generate_test_geojson import generate_large_geojson
+    os.makedirs(cache_dir, exist_ok=True)
+    datasets = []
+    for size in sizes:
+        path = os.path.join(cache_dir, f"synthetic_{size}_{seed}.geojson.gz")
+        if not os.path.exists(path):
+            print(f"Génération de {path}...")
+            generate_large_geojson(path, size, seed)
+        datasets.append((f"synthetic_{size}", path))
+    return datasets
+
+
+def run_benchmarks(datasets, stages=tuple(STAGES), repeat=3):
+    """
+    Mesure chaque étape sur chaque jeu de données
+
+    Returns:
+        Liste de résultats (dataset, stage, seconds, features, bytes,
+        features_per_s, mb_per_s, peak_rss_mb)
+    """
+    results = []
+    for name, path in datasets:
+        for stage in stages:
+            # Un processus par mesure (pic de mémoire résidente propre à l'étape)
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                try:
+                    result = executor.submit(run_stage, stage, path, repeat).result()
+                except ImportError as e:
+                    print(f"  {name} / {stage} ignoré : {e}")
+                    continue
+            seconds = result["seconds"] or 1e-9
+            result.update({
+                "dataset": name,
+                "stage": stage,
+                "features_per_s": result["features"] / seconds if result["features"] else None,
+                "mb_per_s": result["bytes"] / seconds / 1024 / 1024 if result["bytes"] else None,
+            })
+            results.append(result)
+            print(f"  {name:<28} {stage:<17} {result['seconds'] * 1000:>10.1f} ms"
+                  + (f" {result['features_per_s']:>12,.0f} features/s" if result["features_per_s"] else " " * 24)
+                  + (f" {result['mb_per_s']:>8.1f} MB/s" if result["mb_per_s"] else "")
+                  + (f"  RSS {result['peak_rss_mb']:.0f} MB" if result["peak_rss_mb"] else ""))
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare les temps au fichier de référence
+
+    Returns:
+        Liste de (dataset, stage, temps de référence, temps mesuré, écart
+        relatif) des étapes plus lentes que la référence de plus de threshold
+    """
+    reference = {(r["dataset"], r["stage"]): r["seconds"] for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        key = (result["dataset"], result["stage"])
+        if key not in reference or not reference[key]:
+            continue
+        change = result["seconds"] / reference[key] - 1
+        if change > threshold:
+            regressions.append((key[0], key[1], reference[key], result["seconds"], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mesurer les étapes du pipeline (export, compression, catalogue, lecture)')
+    parser.add_argument('--fixtures', '-f', default='data/countries/*.geojson.gz',
+                        help='Fichiers réels mesurés (motif glob)')
+    parser.add_argument('--max-fixtures', type=int, default=3,
+                        help='Nombre de fichiers réels mesurés, les plus gros en premier (0 : aucun)')
+    parser.add_argument('--sizes', '-n', type=int, nargs='*', default=list(DEFAULT_SIZES),
+                        help='Tailles des jeux synthétiques')
+    parser.add_argument('--cache-dir', default=os.path.join(tempfile.gettempdir(), 'cdn-bench-data'),
+                        help='Dossier des jeux synthétiques générés')
+    parser.add_argument('--stages', '-s', nargs='+', choices=list(STAGES), default=list(STAGES),
+                        help='Étapes mesurées')
+    parser.add_argument('--repeat', '-r', type=int, default=3,
+                        help='Nombre de répétitions (le meilleur temps est retenu)')
+    parser.add_argument('--output', '-o', default=DEFAULT_RESULTS,
+                        help=f'Fichier JSON des résultats (défaut : {DEFAULT_RESULTS}) ; '
+                             'une exécution de référence est conservée sous un autre nom')
+    parser.add_argument('--baseline', '-b',
+                        help='Résultats de référence à comparer')
+    parser.add_argument('--threshold', '-t', type=float, default=DEFAULT_THRESHOLD,
+                        help='Écart relatif signalé comme régression (défaut : 0.10)')
+
+    args = parser.parse_args()
+
+    fixtures = sorted(glob.glob(args.fixtures), key=os.path.getsize, reverse=True)[:args.max_fixtures]
+    datasets = [(os.path.basename(path).split('.')[0], path) for path in fixtures]
+    datasets += synthetic_datasets(args.sizes, args.cache_dir)
+
+    results = run_benchmarks(datasets, args.stages, args.repeat)
+
+    report = {
+        "created": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results
+    }
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Résultats écrits dans {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        if not regressions:
+            print(f"Aucune régression de plus de {args.threshold:.0%} par rapport à {args.baseline}")
+            return
+        print(f"{len(regressions)} régression(s) par rapport à {args.baseline} :")
+        for dataset, stage, before, after, change in regressions:
+            print(f"  {dataset} / {stage} : {before * 1000:.1f} ms -> {after * 1000:.1f} ms (+{change:.0%})")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+import os
+import io
+import gzip
+import shutil
+import hashlib
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from catalog import (CATEGORIES, DEFAULT_CATALOG, catalog_lock, catalog_relative_path,
+                     load_catalog, save_catalog)
+from geojson_stream import iter_features
+from aggregate_summaries import DEFAULT_OUTPUT_DIR, build_aggregates
+
+# Extension de chaque encodage servi (Content-Encoding)
+ENCODING_EXTENSIONS = {
+    "identity": "",
+    "gzip": ".gz",
+    "br": ".br",
+    "zstd": ".zst",
+}
+
+DEFAULT_IMMUTABLE_DIR = "immutable"
+
+# Nombre de caractères hexadécimaux du hash dans les noms de fichiers
+HASH_LENGTH = 12
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path):
+    """SHA-256 (hexadécimal) des octets d'un fichier"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _HashingReader(io.RawIOBase):
+    """Flux binaire qui calcule le SHA-256 de ce qui y est lu"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.digest = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.fileobj.read(len(buffer))
+        self.digest.update(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _extend_bbox(bbox, coordinates):
+    if coordinates and isinstance(coordinates[0], (list, tuple)):
+        for position in coordinates:
+            _extend_bbox(bbox, position)
+        return
+    bbox[0] = min(bbox[0], coordinates[0])
+    bbox[1] = min(bbox[1], coordinates[1])
+    bbox[2] = max(bbox[2], coordinates[0])
+    bbox[3] = max(bbox[3], coordinates[1])
+
+
+def find_datasets(data_dir="data"):
+    """
+    Regroupe les fichiers du répertoire de données par jeu de données
+
+    Returns:
+        Dictionnaire {(catégorie, chemin de base .geojson): {encodage: chemin}}
+    """
+    datasets = {}
+    for category in CATEGORIES:
+        category_dir = os.path.join(data_dir, category)
+        if not os.path.isdir(category_dir):
+            continue
+        for name in sorted(os.listdir(category_dir)):
+            for encoding, extension in ENCODING_EXTENSIONS.items():
+                if name.endswith('.geojson' + extension):
+                    base_name = name[:len(name) - len(extension)]
+                    key = (category, os.path.join(category_dir, base_name))
+                    datasets.setdefault(key, {})[encoding] = os.path.join(category_dir, name)
+    return {key: files for key, files in datasets.items()
+            if "identity" in files or "gzip" in files}
+
+
+def scan_dataset(files):
+    """
+    Calcule les statistiques d'un jeu de données
+
+    Le contenu (.geojson, sinon .geojson.gz décompressé) est lu une fois :
+    le nombre de features, l'emprise et le SHA-256 du contenu sont calculés
+    pendant l'analyse.
+
+    Args:
+        files: Dictionnaire {encodage: chemin} retourné par find_datasets
+
+    Returns:
+        Dictionnaire (features, bbox, sha256, encodings)
+    """
+    if "identity" in files:
+        source = open(files["identity"], 'rb')
+    else:
+        source = gzip.open(files["gzip"], 'rb')
+
+    with source:
+        reader = _HashingReader(source)
+        text = io.TextIOWrapper(io.BufferedReader(reader, CHUNK_SIZE), encoding='utf-8')
+        count = 0
+        bbox = [float('inf'), float('inf'), float('-inf'), float('-inf')]
+        for feature in iter_features(text):
+            count += 1
+            coordinates = (feature.get("geometry") or {}).get("coordinates")
+            if coordinates:
+                _extend_bbox(bbox, coordinates)
+        # Lire la fin du fichier pour que le hash couvre tout le contenu
+        while text.read(CHUNK_SIZE):
+            pass
+
+    return {
+        "features": count,
+        "bbox": bbox if count and bbox[0] != float('inf') else None,
+        "sha256": reader.digest.hexdigest(),
+        "encodings": {
+            encoding: {
+                "extension": ENCODING_EXTENSIONS[encoding],
+                "size": os.path.getsize(path),
+                # Permet au serveur de vérifier que le fichier n'a pas changé
+                # depuis le calcul du hash (voir cdn_server.StaticSite.etag)
+                "mtime_ns": os.stat(path).st_mtime_ns,
+                "sha256": file_sha256(path)
+            }
+            for encoding, path in files.items()
+        }
+    }
+
+
+def publish_hashed(files, category, sha256, immutable_dir=DEFAULT_IMMUTABLE_DIR):
+    """
+    Publie les fichiers d'un jeu de données sous un nom contenant le hash de
+    leur contenu (tbITALY.<hash>.geojson.gz), servis avec un cache immuable
+
+    Un lien physique est créé quand c'est possible, sinon le fichier est copié.
+
+    Returns:
+        Dictionnaire {encodage: chemin relatif à immutable_dir}
+    """
+    target_dir = os.path.join(immutable_dir, category)
+    os.makedirs(target_dir, exist_ok=True)
+    hashed = {}
+    for encoding, path in files.items():
+        name = os.path.basename(path)
+        stem = name[:name.index('.geojson')]
+        hashed_name = f"{stem}.{sha256[:HASH_LENGTH]}{name[len(stem):]}"
+        target = os.path.join(target_dir, hashed_name)
+        if not os.path.exists(target):
+            try:
+                os.link(path, target)
+            except OSError:
+                shutil.copy2(path, target)
+        hashed[encoding] = f"{category}/{hashed_name}"
+    return hashed
+
+
+def dataset_files(file_path):
+    """
+    Fichiers existants du jeu de données d'un fichier
+
+    Returns:
+        Dictionnaire {encodage: chemin}
+    """
+    base_path = file_path[:-3] if file_path.endswith('.gz') else file_path
+    return {encoding: base_path + extension for encoding, extension in ENCODING_EXTENSIONS.items()
+            if os.path.isfile(base_path + extension)}
+
+
+def refresh_dataset(file_path, catalog_path=DEFAULT_CATALOG, immutable_dir=None):
+    """
+    Réanalyse un jeu de données dont les fichiers ont été réécrits et met à
+    jour son entrée du catalogue : encodages (tailles, SHA-256), statistiques
+    et, s'ils étaient publiés, noms hachés
+
+    Args:
+        file_path: Fichier .geojson ou .geojson.gz du jeu de données
+        catalog_path: Catalogue à mettre à jour
+        immutable_dir: Dossier des copies hachées (défaut : immutable_base
+            du catalogue)
+    """
+    relative_path = catalog_relative_path(file_path)
+    if relative_path is None:
+        raise ValueError(f"Fichier hors des catégories du catalogue : {file_path}")
+    category = relative_path.split('/')[0]
+    files = dataset_files(file_path)
+    result = scan_dataset(files)
+
+    with catalog_lock(catalog_path):
+        catalog = load_catalog(catalog_path)
+        entry = catalog['data_categories'][category]
+        previous = entry.get('stats', {}).get(relative_path, {})
+        if relative_path not in entry.setdefault('files', []):
+            entry['files'].append(relative_path)
+        entry.setdefault('encodings', {})[relative_path] = result["encodings"]
+        stats = {
+            "features": result["features"],
+            "bbox": result["bbox"],
+            "sha256": result["sha256"]
+        }
+        immutable_dir = immutable_dir or catalog.get('immutable_base')
+        if "hashed" in previous and immutable_dir:
+            stats["hashed"] = publish_hashed(files, category, result["sha256"], immutable_dir)
+        entry.setdefault('stats', {})[relative_path] = stats
+        catalog['last_updated'] = datetime.now().isoformat()
+        save_catalog(catalog, catalog_path)
+    return result
+
+
+def build_catalog(data_dir="data", catalog_path=DEFAULT_CATALOG, workers=None,
+                  immutable_dir=None):
+    """
+    Reconstruit le catalogue à partir du contenu du répertoire de données
+
+    Chaque jeu de données est analysé dans un processus séparé. Pour chaque
+    catégorie, le catalogue liste les fichiers ("files"), les encodages
+    disponibles avec leur taille et leur SHA-256 ("encodings") et les
+    statistiques du contenu ("stats" : features, bbox, sha256 et noms
+    hachés si immutable_dir est fourni).
+
+    Returns:
+        Le catalogue écrit
+    """
+    datasets = find_datasets(data_dir)
+    print(f"Trouvé {len(datasets)} jeux de données dans {data_dir}")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {key: executor.submit(scan_dataset, files) for key, files in datasets.items()}
+        results = {}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                print(f"Erreur lors de l'analyse de {key[1]}: {e}")
+
+    with catalog_lock(catalog_path):
+        catalog = load_catalog(catalog_path)
+        kept = _fill_catalog(catalog, datasets, results, immutable_dir)
+        save_catalog(catalog, catalog_path)
+
+    failed = len(datasets) - len(results)
+    if failed:
+        print(f"{failed} jeu(x) de données non analysé(s) ; entrée précédente conservée pour "
+              f"{len(kept)} : {', '.join(kept) or 'aucun'}")
+
+    total = sum(result["features"] for result in results.values())
+    print(f"Catalogue {catalog_path} : {len(results)} fichiers, {total} features")
+    return catalog
+
+
+def _fill_catalog(catalog, datasets, results, immutable_dir):
+    """
+    Remplace les listes et statistiques des catégories par les résultats de
+    l'analyse
+
+    Un jeu de données dont l'analyse a échoué garde son entrée précédente
+    (fichier, encodages, statistiques) au lieu de disparaître du catalogue.
+
+    Returns:
+        Chemins relatifs des jeux de données gardés sans nouvelle analyse
+    """
+    categories = catalog['data_categories']
+    previous = {}
+    for category in CATEGORIES:
+        entry = categories[category]
+        previous[category] = (set(entry.get('files', [])), entry.get('encodings', {}),
+                              entry.get('stats', {}))
+        entry['files'] = []
+        entry['encodings'] = {}
+        entry['stats'] = {}
+
+    kept = []
+    for category, base_path in sorted(datasets):
+        if (category, base_path) in results:
+            continue
+        relative_path = f"{category}/{os.path.basename(base_path)}"
+        files, encodings, stats = previous[category]
+        if relative_path not in files:
+            continue
+        entry = categories[category]
+        entry['files'].append(relative_path)
+        if relative_path in encodings:
+            entry['encodings'][relative_path] = encodings[relative_path]
+        if relative_path in stats:
+            entry['stats'][relative_path] = stats[relative_path]
+        kept.append(relative_path)
+
+    for (category, base_path), result in sorted(results.items()):
+        relative_path = f"{category}/{os.path.basename(base_path)}"
+        entry = categories[category]
+        entry['files'].append(relative_path)
+        entry['encodings'][relative_path] = result["encodings"]
+        stats = {
+            "features": result["features"],
+            "bbox": result["bbox"],
+            "sha256": result["sha256"]
+        }
+        if immutable_dir:
+            stats["hashed"] = publish_hashed(datasets[(category, base_path)], category,
+                                             result["sha256"], immutable_dir)
+        entry['stats'][relative_path] = stats
+
+    for category in CATEGORIES:
+        categories[category]['files'].sort()
+    if immutable_dir:
+        catalog['immutable_base'] = os.path.basename(os.path.normpath(immutable_dir))
+    catalog['last_updated'] = datetime.now().isoformat()
+    return kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Générer le catalogue à partir des fichiers de données')
+    parser.add_argument('--data-dir', '-d', default='data',
+                        help='Répertoire des données (défaut : data)')
+    parser.add_argument('--catalog', '-c', default=DEFAULT_CATALOG,
+                        help=f'Catalogue à écrire (défaut : {DEFAULT_CATALOG})')
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                        help='Nombre de processus (défaut : nombre de CPU)')
+    parser.add_argument('--hashed', nargs='?', const=DEFAULT_IMMUTABLE_DIR, metavar='DOSSIER',
+                        help='Publier des copies nommées par hash de contenu '
+                             f'(défaut : {DEFAULT_IMMUTABLE_DIR})')
+    parser.add_argument('--aggregates', nargs='?', const=DEFAULT_OUTPUT_DIR, metavar='DOSSIER',
+                        help='Calculer aussi les résumés agrégés et les référencer dans le catalogue '
+                             f'(défaut : {DEFAULT_OUTPUT_DIR})')
+
+    args = parser.parse_args()
+
+    build_catalog(args.data_dir, args.catalog, args.workers, args.hashed)
+    if args.aggregates:
+        build_aggregates(args.data_dir, args.aggregates, workers=args.workers,
+                         catalog_path=args.catalog)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+DEFAULT_CATALOG = "metadata/catalog.json"
+
+CATEGORIES = {
+    "types": "Barrier data organized by type",
+    "countries": "Barrier data organized by country",
+    "regions": "Barrier data organized by geographical region",
+}
+
+# Délai d'attente du verrou, et âge au-delà duquel un verrou est considéré
+# comme abandonné (processus interrompu)
+LOCK_TIMEOUT = 60
+LOCK_STALE_AFTER = 300
+
+
+def _remove_lock_if(lock_path, check):
+    """
+    Retire le fichier de verrou si check(contenu, date de modification) est vrai
+
+    Le fichier est d'abord renommé sous un nom unique : deux processus ne
+    peuvent pas retirer le même verrou, et le contrôle porte sur le fichier
+    effectivement retiré. Si ce n'est pas le verrou attendu (il a été
+    remplacé entre-temps), il est remis en place.
+
+    Returns:
+        True si le verrou a été retiré
+    """
+    claimed = f"{lock_path}.{uuid.uuid4().hex}.lock"
+    try:
+        os.rename(lock_path, claimed)
+    except OSError:
+        return False
+    try:
+        with open(claimed, 'r', encoding='ascii', errors='replace') as f:
+            content = f.read()
+        matches = check(content, os.path.getmtime(claimed))
+    except OSError:
+        matches = False
+    if not matches:
+        try:
+            # Échoue si un autre processus a pris le verrou entre-temps
+            os.link(claimed, lock_path)
+        except OSError:
+            pass
+    os.remove(claimed)
+    return matches
+
+
+@contextmanager
+def catalog_lock(catalog_path=DEFAULT_CATALOG, timeout=LOCK_TIMEOUT):
+    """
+    Verrou exclusif sur le catalogue (fichier catalog.json.lock)
+
+    Le fichier de verrou est créé avec O_CREAT | O_EXCL, ce qui est atomique
+    sur tous les systèmes de fichiers locaux (Windows compris). Il contient
+    un jeton propre au détenteur : un verrou abandonné n'est retiré qu'une
+    fois, et seul son détenteur retire un verrou valide.
+
+    Raises:
+        TimeoutError: si le verrou n'a pas pu être obtenu à temps
+    """
+    lock_path = f"{catalog_path}.lock"
+    os.makedirs(os.path.dirname(catalog_path) or '.', exist_ok=True)
+    token = f"{os.getpid()}:{uuid.uuid4().hex}"
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                stale = time.time() - os.path.getmtime(lock_path) > LOCK_STALE_AFTER
+            except OSError:
+                continue
+            if stale and _remove_lock_if(
+                    lock_path, lambda content, mtime: time.time() - mtime > LOCK_STALE_AFTER):
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Catalogue verrouillé : {lock_path}")
+            time.sleep(0.05)
+    try:
+        os.write(fd, token.encode('ascii'))
+        os.close(fd)
+        yield
+    finally:
+        # Le verrou a pu être retiré puis repris par un autre processus
+        # (considéré comme abandonné) : il n'est alors pas touché
+        _remove_lock_if(lock_path, lambda content, mtime: content == token)
+
+
+def new_catalog():
+    """Catalogue vide avec toutes les catégories"""
+    return {
+        "name": "Barrier Data CDN",
+        "description": "Content Delivery Network for river barrier data",
+        "last_updated": datetime.now().isoformat(),
+        "data_categories": {
+            category: {"description": description, "files": []}
+            for category, description in CATEGORIES.items()
+        }
+    }
+
+
+def load_catalog(catalog_path=DEFAULT_CATALOG):
+    """Lit le catalogue (un catalogue vide est retourné s'il n'existe pas)"""
+    if not os.path.isfile(catalog_path):
+        return new_catalog()
+    with open(catalog_path, 'r', encoding='utf-8') as f:
+        catalog = json.load(f)
+    categories = catalog.setdefault('data_categories', {})
+    for category, description in CATEGORIES.items():
+        categories.setdefault(category, {"description": description, "files": []})
+    return catalog
+
+
+def save_catalog(catalog, catalog_path=DEFAULT_CATALOG):
+    """Écrit le catalogue de façon atomique (fichier temporaire puis renommage)"""
+    tmp_path = f"{catalog_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(catalog, f, indent=2)
+    os.replace(tmp_path, catalog_path)
+
+
+def category_for_path(file_path):
+    """Catégorie d'un fichier d'après son chemin (data/<catégorie>/...), ou None"""
+    parts = os.path.normpath(file_path).split(os.sep)
+    for category in CATEGORIES:
+        if category in parts[:-1]:
+            return category
+    return None
+
+
+def catalog_relative_path(file_path):
+    """
+    Chemin d'un fichier tel qu'enregistré dans le catalogue
+    (data/countries/x.geojson.gz -> countries/x.geojson)
+    """
+    category = category_for_path(file_path)
+    if category is None:
+        return None
+    parts = os.path.normpath(file_path).split(os.sep)
+    relative_path = '/'.join(parts[len(parts) - 1 - parts[::-1].index(category):])
+    return relative_path[:-3] if relative_path.endswith('.gz') else relative_path
+
+
+class Catalog:
+    """
+    Catalogue ouvert pour modification, sous verrou
+
+    Les ajouts sont indexés dans des ensembles (test d'appartenance en temps
+    constant) et le catalogue n'est écrit qu'une fois, à la sortie du bloc
+    with, s'il a été modifié::
+
+        with Catalog() as catalog:
+            for path in files:
+                catalog.add_file(path)
+    """
+
+    def __init__(self, catalog_path=DEFAULT_CATALOG, timeout=LOCK_TIMEOUT):
+        self.catalog_path = catalog_path
+        self.timeout = timeout
+        self.data = None
+        self.modified = False
+        self._lock = None
+        self._index = {}
+
+    def __enter__(self):
+        self._lock = catalog_lock(self.catalog_path, self.timeout)
+        self._lock.__enter__()
+        try:
+            self.data = load_catalog(self.catalog_path)
+        except Exception:
+            self._lock.__exit__(None, None, None)
+            raise
+        self._index = {category: set(entry.get('files', []))
+                       for category, entry in self.data['data_categories'].items()}
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None and self.modified:
+                self.data['last_updated'] = datetime.now().isoformat()
+                save_catalog(self.data, self.catalog_path)
+        finally:
+            self._lock.__exit__(exc_type, exc_value, traceback)
+
+    def category(self, name):
+        """Entrée d'une catégorie du catalogue"""
+        return self.data['data_categories'].setdefault(name, {"files": []})
+
+    def add_file(self, file_path):
+        """
+        Ajoute un fichier à sa catégorie
+
+        Returns:
+            True si le fichier a été ajouté, False s'il était déjà présent
+            ou hors des catégories
+        """
+        relative_path = catalog_relative_path(file_path)
+        if relative_path is None:
+            return False
+        category = relative_path.split('/')[0]
+        files = self._index.setdefault(category, set())
+        if relative_path in files:
+            return False
+        files.add(relative_path)
+        self.category(category).setdefault('files', []).append(relative_path)
+        self.modified = True
+        return True
+
+    def set_encodings(self, file_path, encodings):
+        """Enregistre les encodages disponibles d'un fichier ({encodage: {extension, size, ...}})"""
+        relative_path = catalog_relative_path(file_path)
+        if relative_path is None:
+            return
+        entry = self.category(relative_path.split('/')[0])
+        entry.setdefault('encodings', {})[relative_path] = encodings
+        self.modified = True
+
+    def set_sequence(self, file_path, sequence):
+        """
+        Enregistre la version par blocs d'un fichier (voir geojson_seq) :
+        {extension, index, features, blocks, size}
+        """
+        relative_path = catalog_relative_path(file_path)
+        if relative_path is None:
+            return
+        entry = self.category(relative_path.split('/')[0])
+        entry.setdefault('sequences', {})[relative_path] = sequence
+        self.modified = True
+
+    def set_aggregates(self, aggregates):
+        """Référence les résumés agrégés (voir aggregate_summaries.build_aggregates)"""
+        self.data['aggregates'] = aggregates
+        self.modified = True
+
+
+def update_catalog(file_paths, catalog_path=DEFAULT_CATALOG):
+    """
+    Ajoute un ou plusieurs fichiers au catalogue en une seule écriture
+
+    Returns:
+        Nombre de fichiers ajoutés
+    """
+    if isinstance(file_paths, str):
+        file_paths = [file_paths]
+    with Catalog(catalog_path) as catalog:
+        added = sum(catalog.add_file(path) for path in file_paths)
+    print(f"Catalogue mis à jour : {added} fichier(s) ajouté(s)")
+    return added
@@ -0,0 +1,501 @@
+import os
+import json
+import gzip
+import time
+import hashlib
+import argparse
+import threading
+import http.client
+from collections import OrderedDict
+from concurrent.futures import Future
+from urllib.parse import urlsplit, quote
+
+DEFAULT_BASE_URL = 'https://raw.githubusercontent.com/Gilles-Segura/carto-data-cdn/main'
+
+# Taille maximale du cache mémoire, en octets de JSON décompressé : les
+# dictionnaires Python gardés occupent en mémoire plusieurs fois cette taille
+DEFAULT_MEMORY_BYTES = 256 * 1024 * 1024
+
+# Connexions gardées ouvertes par hôte
+DEFAULT_POOL_SIZE = 4
+
+DEFAULT_TIMEOUT = 30
+
+# Erreurs d'une connexion keep-alive fermée par le serveur entre deux requêtes
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                            ConnectionResetError, BrokenPipeError)
+
+
+class CDNHTTPError(OSError):
+    """Réponse HTTP inattendue du CDN (status : code HTTP)"""
+
+    def __init__(self, url, status):
+        super().__init__(f"HTTP {status} : {url}")
+        self.url = url
+        self.status = status
+
+
+class CDNIntegrityError(OSError):
+    """Octets reçus dont le SHA-256 ne correspond pas au catalogue"""
+
+    def __init__(self, url, expected, actual):
+        super().__init__(f"SHA-256 inattendu pour {url} : {actual} (catalogue : {expected})")
+        self.url = url
+        self.expected = expected
+        self.actual = actual
+
+
+class LRUCache:
+    """
+    Cache mémoire borné en octets, éviction du moins récemment utilisé
+
+    Chaque entrée est ajoutée avec sa taille, choisie par l'appelant (pour
+    BarrierDataCDN, la longueur du JSON décompressé) ; les entrées les plus
+    anciennes sont retirées tant que le total dépasse max_bytes. Une entrée
+    plus grande que max_bytes n'est pas gardée. Utilisable depuis plusieurs
+    threads.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class DiskCache:
+    """
+    Cache disque des fichiers téléchargés, adressé par contenu
+
+    Les octets sont rangés sous leur SHA-256 (objects/ab/abcdef...) : un
+    fichier dont le catalogue donne le hash est lu sans aucune requête. Les
+    validateurs HTTP (ETag, Last-Modified) de chaque URL sont gardés à côté
+    (urls/<hash de l'URL>.json) pour les requêtes conditionnelles. Les
+    écritures passent par un fichier temporaire renommé : plusieurs
+    processus peuvent partager le même dossier.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _object_path(self, sha256):
+        return os.path.join(self.directory, "objects", sha256[:2], sha256)
+
+    def _url_path(self, url):
+        return os.path.join(self.directory, "urls", hashlib.sha256(url.encode('utf-8')).hexdigest() + ".json")
+
+    @staticmethod
+    def _write(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def get(self, sha256):
+        """Octets d'un objet, ou None s'il est absent ou altéré"""
+        try:
+            with open(self._object_path(sha256), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if hashlib.sha256(data).hexdigest() != sha256:
+            return None
+        return data
+
+    def put(self, data):
+        """Range des octets dans le cache ; retourne leur SHA-256"""
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self._object_path(sha256)
+        if not os.path.exists(path):
+            self._write(path, data)
+        return sha256
+
+    def validators(self, url):
+        """Validateurs enregistrés pour une URL ({etag, last_modified, sha256}) ou None"""
+        try:
+            with open(self._url_path(url), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def set_validators(self, url, etag, last_modified, sha256):
+        data = {"url": url, "etag": etag, "last_modified": last_modified, "sha256": sha256}
+        self._write(self._url_path(url), json.dumps(data).encode('utf-8'))
+
+
+class ConnectionPool:
+    """
+    Connexions HTTP(S) keep-alive réutilisées entre les requêtes
+
+    Au plus pool_size connexions inactives sont gardées par hôte. Une
+    connexion fermée par le serveur entre deux requêtes est remplacée et la
+    requête renvoyée une fois.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.created = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, scheme, netloc):
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            if idle:
+                return idle.pop(), True
+            self.created += 1
+        connection_class = (http.client.HTTPSConnection if scheme == 'https'
+                            else http.client.HTTPConnection)
+        return connection_class(netloc, timeout=self.timeout), False
+
+    def _release(self, scheme, netloc, connection):
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self.pool_size:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def request(self, method, url, headers=None):
+        """
+        Envoie une requête et lit toute la réponse
+
+        Returns:
+            Tuple (status, en-têtes {nom en minuscules: valeur}, corps)
+        """
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        while True:
+            connection, reused = self._acquire(parts.scheme, parts.netloc)
+            try:
+                connection.request(method, path, headers=headers or {})
+                response = connection.getresponse()
+                body = response.read()
+            except _STALE_CONNECTION_ERRORS:
+                connection.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+            response_headers = {name.lower(): value for name, value in response.getheaders()}
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(parts.scheme, parts.netloc, connection)
+            return response.status, response_headers, body
+
+    def close(self):
+        with self._lock:
+            for idle in self._idle.values():
+                for connection in idle:
+                    connection.close()
+            self._idle.clear()
+
+
+class BarrierDataCDN:
+    """
+    Client Python du CDN (équivalent de js/BarrierDataCDN.js)
+
+    Trois niveaux : un cache mémoire LRU borné en octets, un cache disque
+    adressé par le SHA-256 du catalogue, puis le réseau. Les fichiers sans
+    hash dans le catalogue sont revalidés par des GET conditionnels
+    (If-None-Match, If-Modified-Since) sur des connexions keep-alive
+    réutilisées. Plusieurs threads demandant le même fichier en même temps
+    ne provoquent qu'un téléchargement::
+
+        cdn = BarrierDataCDN(cache_dir="~/.cache/carto-data-cdn")
+        cdn.initialize()
+        france = cdn.load_country("tbFRANCE")
+
+    Args:
+        base_url: URL racine du CDN
+        cache_dir: Dossier du cache disque (None : pas de cache disque)
+        max_memory_bytes: Taille maximale du cache mémoire, mesurée en octets
+            de JSON décompressé (les features décodées occupent plus)
+        pool_size: Connexions gardées ouvertes par hôte
+        timeout: Délai d'attente des requêtes (secondes)
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, cache_dir=None,
+                 max_memory_bytes=DEFAULT_MEMORY_BYTES, pool_size=DEFAULT_POOL_SIZE,
+                 timeout=DEFAULT_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.metadata = None
+        self.memory = LRUCache(max_memory_bytes)
+        self.disk = DiskCache(os.path.expanduser(cache_dir)) if cache_dir else None
+        self.pool = ConnectionPool(pool_size, timeout)
+        self.requests = 0
+        self.not_modified = 0
+        self._validators = {}
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def close(self):
+        """Ferme les connexions gardées ouvertes"""
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _url(self, path):
+        return f"{self.base_url}/{quote(path)}"
+
+    def _once(self, key, function):
+        """
+        Exécute function une seule fois pour des appels simultanés de même
+        clé : les autres threads attendent et reçoivent le même résultat
+        """
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            future.set_result(function())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+        return future.result()
+
+    def fetch(self, path, sha256=None):
+        """
+        Octets d'un fichier du CDN, depuis le cache disque si possible
+
+        Args:
+            path: Chemin relatif à base_url
+            sha256: Hash attendu (catalogue) : si le cache disque contient
+                ces octets, aucune requête n'est envoyée
+
+        Returns:
+            Octets du fichier (tels que servis)
+
+        Raises:
+            CDNHTTPError: si le serveur répond autre chose que 200 ou 304
+            CDNIntegrityError: si les octets reçus n'ont pas le hash attendu
+        """
+        if sha256 and self.disk is not None:
+            data = self.disk.get(sha256)
+            if data is not None:
+                return data
+        url = self._url(path)
+        return self._once(url, lambda: self._download(url, sha256))
+
+    def _download(self, url, sha256=None):
+        validators = self.disk.validators(url) if self.disk is not None else self._validators.get(url)
+        cached = None
+        headers = {}
+        # Une version gardée qui n'est plus celle du catalogue n'est pas revalidée
+        if validators and not (sha256 and validators.get("sha256") not in (None, sha256)):
+            cached = (self.disk.get(validators["sha256"]) if self.disk is not None
+                      else validators.get("data"))
+        if cached is not None:
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+
+        with self._inflight_lock:
+            self.requests += 1
+        status, response_headers, body = self.pool.request("GET", url, headers)
+        if status == 304 and cached is not None:
+            with self._inflight_lock:
+                self.not_modified += 1
+            return cached
+        if status != 200:
+            raise CDNHTTPError(url, status)
+        if sha256:
+            actual = hashlib.sha256(body).hexdigest()
+            if actual != sha256:
+                raise CDNIntegrityError(url, sha256, actual)
+
+        etag = response_headers.get("etag")
+        last_modified = response_headers.get("last-modified")
+        if self.disk is not None:
+            digest = self.disk.put(body)
+            if etag or last_modified:
+                self.disk.set_validators(url, etag, last_modified, digest)
+        elif etag or last_modified:
+            # Sans cache disque, seul le catalogue est gardé pour être revalidé
+            if url.endswith("catalog.json"):
+                self._validators[url] = {"etag": etag, "last_modified": last_modified,
+                                         "data": body}
+        return body
+
+    def initialize(self):
+        """
+        Charge (ou revalide) le catalogue
+
+        Returns:
+            True si le catalogue a été chargé, False en cas d'erreur
+        """
+        try:
+            self.metadata = json.loads(self.fetch("metadata/catalog.json"))
+        except (OSError, ValueError) as e:
+            print(f"Échec de l'initialisation du CDN : {e}")
+            return False
+        print(f"CDN initialisé. Dernière mise à jour : {self.metadata.get('last_updated')}")
+        return True
+
+    def _category(self, category):
+        if self.metadata is None:
+            raise RuntimeError("CDN non initialisé : appeler initialize() d'abord")
+        entry = self.metadata["data_categories"].get(category)
+        if entry is None:
+            raise ValueError(f"Catégorie invalide : {category}")
+        return entry
+
+    def list_available_files(self, category):
+        """Liste les fichiers disponibles d'une catégorie"""
+        return self._category(category)["files"]
+
+    def _encoding_info(self, file_path, encoding):
+        if self.metadata is None:
+            return {}
+        entry = self.metadata["data_categories"].get(file_path.split('/')[0], {})
+        return entry.get("encodings", {}).get(file_path, {}).get(encoding, {})
+
+    def load_geojson(self, file_path, use_compressed=True):
+        """
+        Charge un fichier GeoJSON du CDN (categorie/nom.geojson)
+
+        Le .gz est demandé d'abord ; la version non compressée n'est
+        téléchargée que s'il n'existe pas (404).
+
+        Returns:
+            FeatureCollection décodée (dictionnaire, partagé entre les appels :
+            à ne pas modifier)
+        """
+        encoding = "gzip" if use_compressed else "identity"
+        sha256 = self._encoding_info(file_path, encoding).get("sha256")
+        key = (file_path, encoding, sha256)
+        data = self.memory.get(key)
+        if data is not None:
+            return data
+        # Un seul téléchargement et un seul décodage pour des appels simultanés
+        return self._once(key, lambda: self._load(file_path, use_compressed, sha256, key))
+
+    def _load(self, file_path, use_compressed, sha256, key):
+        path = f"data/{file_path}" + (".gz" if use_compressed else "")
+        try:
+            raw = self.fetch(path, sha256)
+        except CDNHTTPError as e:
+            if use_compressed and e.status == 404:
+                return self.load_geojson(file_path, False)
+            raise
+        text = gzip.decompress(raw) if use_compressed else raw
+        data = json.loads(text)
+        # Taille comptée : octets du JSON décompressé (voir DEFAULT_MEMORY_BYTES)
+        self.memory.put(key, data, len(text))
+        return data
+
+    def load_country(self, country):
+        """Charge les données d'un pays"""
+        return self.load_geojson(f"countries/{country}.geojson")
+
+    def load_barrier_type(self, type_name):
+        """Charge les données d'un type de barrière"""
+        return self.load_geojson(f"types/{type_name}.geojson")
+
+    def load_region(self, region_name):
+        """Charge les données d'une région"""
+        return self.load_geojson(f"regions/{region_name}.geojson")
+
+    def clear_cache(self):
+        """Vide le cache mémoire (le cache disque est conservé)"""
+        self.memory.clear()
+
+    def stats(self):
+        """Compteurs du cache et du réseau"""
+        return {
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.size,
+            "memory_hits": self.memory.hits,
+            "memory_misses": self.memory.misses,
+            "requests": self.requests,
+            "not_modified": self.not_modified,
+            "connections": self.pool.created,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Télécharger des fichiers du CDN avec cache')
+    parser.add_argument('files', nargs='*',
+                        help='Fichiers à charger (categorie/nom.geojson) ; aucun : liste les fichiers')
+    parser.add_argument('--base-url', '-u', default=DEFAULT_BASE_URL,
+                        help='URL racine du CDN')
+    parser.add_argument('--cache-dir', '-c',
+                        default=os.path.join('~', '.cache', 'carto-data-cdn'),
+                        help='Dossier du cache disque')
+    parser.add_argument('--memory-mb', type=int, default=DEFAULT_MEMORY_BYTES // (1024 * 1024),
+                        help='Taille maximale du cache mémoire (MB de JSON décompressé)')
+
+    args = parser.parse_args()
+
+    with BarrierDataCDN(args.base_url, args.cache_dir, args.memory_mb * 1024 * 1024) as cdn:
+        if not cdn.initialize():
+            return
+        if not args.files:
+            for category in cdn.metadata["data_categories"]:
+                for file_path in cdn.list_available_files(category):
+                    print(file_path)
+            return
+        for file_path in args.files:
+            start = time.perf_counter()
+            try:
+                data = cdn.load_geojson(file_path)
+            except (OSError, ValueError) as e:
+                print(f"Erreur lors du chargement de {file_path}: {e}")
+                continue
+            print(f"{file_path} : {len(data.get('features', []))} features "
+                  f"en {(time.perf_counter() - start) * 1000:.1f} ms")
+        print(f"Statistiques : {cdn.stats()}")
+
+
+if __name__ == "__main__":
+    main()
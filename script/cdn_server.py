@@ -0,0 +1,532 @@
+import os
+import re
+import zlib
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import mimetypes
+import multiprocessing
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import unquote, urlsplit
+
+from catalog import catalog_relative_path
+
+DEFAULT_PORT = 8080
+
+# Durée de cache des fichiers non hachés (secondes) ; les fichiers nommés
+# par leur hash (dossier immutable) sont servis avec un cache d'un an
+DEFAULT_MAX_AGE = 300
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Encodages précompressés, par ordre de préférence à qualité égale
+PRECOMPRESSED = (("br", ".br"), ("zstd", ".zst"), ("gzip", ".gz"))
+
+CONTENT_TYPES = {
+    ".geojson": "application/geo+json",
+    ".geojsonl": "application/geo+json-seq",
+    ".json": "application/json",
+    ".idx": "application/json",
+    ".geocol": "application/octet-stream",
+    ".bin": "application/octet-stream",
+    ".gz": "application/gzip",
+    ".br": "application/octet-stream",
+    ".zst": "application/zstd",
+}
+
+# Dossiers servis sous la racine ; tout autre fichier (scripts, .git,
+# verrous et fichiers temporaires) reste inaccessible
+SERVED_DIRECTORIES = ("data", "metadata", "immutable", "aggregates", "tiles")
+# Fichiers de travail jamais servis (verrou du catalogue, écritures en cours)
+HIDDEN_SUFFIXES = (".lock", ".tmp")
+
+# Taille maximale de la ligne de requête et des en-têtes
+MAX_HEADER_SIZE = 16 * 1024
+
+# Taille des blocs décompressés à la volée (client sans gzip)
+CHUNK_SIZE = 256 * 1024
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+_REASONS = {200: "OK", 204: "No Content", 206: "Partial Content", 304: "Not Modified",
+            400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+            416: "Range Not Satisfiable", 500: "Internal Server Error"}
+
+
+def parse_accept_encoding(header):
+    """
+    Encodages acceptés par le client
+
+    Returns:
+        Dictionnaire {encodage: qualité} ; "identity" est accepté sauf refus
+        explicite
+    """
+    accepted = {}
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        match = re.search(r'q\s*=\s*([0-9.]+)', params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+    wildcard = accepted.pop('*', None)
+    if wildcard is not None:
+        for encoding, _ in PRECOMPRESSED:
+            accepted.setdefault(encoding, wildcard)
+        accepted.setdefault('identity', wildcard)
+    accepted.setdefault('identity', 0.001)
+    return accepted
+
+
+def parse_range(header, size):
+    """
+    Intervalle d'une requête Range (une seule plage)
+
+    Returns:
+        (début, fin incluse), None si l'en-tête est absent ou ignoré
+        (plusieurs plages, syntaxe inconnue), ou "unsatisfiable"
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        length = int(end)
+        if length == 0:
+            return "unsatisfiable"
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, end
+
+
+def _file_digest(path):
+    """32 premiers caractères hexadécimaux du SHA-256 d'un fichier"""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()[:32]
+
+
+class StaticSite:
+    """
+    Arbre de fichiers servi (data, metadata, immutable...) et hashes connus
+
+    Les ETag sont forts : le SHA-256 de chaque représentation est lu dans le
+    catalogue (encodages des fichiers de données) quand la taille et la date
+    de modification correspondent, sinon calculé une fois et gardé tant que
+    le fichier ne change pas (taille et date de modification).
+    """
+
+    def __init__(self, root, catalog_path=None, max_age=DEFAULT_MAX_AGE):
+        self.root = os.path.realpath(root)
+        self.catalog_path = catalog_path or os.path.join(self.root, "metadata", "catalog.json")
+        self.max_age = max_age
+        self._catalog_hashes = {}
+        self._catalog_mtime = None
+        self._hashes = {}
+
+    def _load_catalog(self):
+        """Relit les hashes du catalogue s'il a changé"""
+        try:
+            mtime = os.stat(self.catalog_path).st_mtime_ns
+        except OSError:
+            self._catalog_hashes = {}
+            return
+        if mtime == self._catalog_mtime:
+            return
+        self._catalog_mtime = mtime
+        hashes = {}
+        try:
+            with open(self.catalog_path, 'r', encoding='utf-8') as f:
+                catalog = json.load(f)
+        except ValueError:
+            return
+        for entry in catalog.get("data_categories", {}).values():
+            for relative_path, encodings in entry.get("encodings", {}).items():
+                for info in encodings.values():
+                    if info.get("sha256"):
+                        hashes[relative_path + info.get("extension", "")] = (
+                            info["sha256"], info.get("size"), info.get("mtime_ns"))
+        self._catalog_hashes = hashes
+
+    def resolve(self, url_path):
+        """
+        Fichier correspondant à un chemin d'URL
+
+        Returns:
+            Chemin du fichier, ou None si le chemin sort des dossiers servis
+            (SERVED_DIRECTORIES), contient un segment caché (commençant par
+            un point), désigne un fichier de travail (HIDDEN_SUFFIXES) ou
+            n'est pas un chemin valide (octet nul)
+        """
+        segments = unquote(url_path).lstrip('/').split('/')
+        if (segments[0] not in SERVED_DIRECTORIES or segments[-1].endswith(HIDDEN_SUFFIXES)
+                or any(segment.startswith('.') for segment in segments)):
+            return None
+        try:
+            path = os.path.realpath(os.path.join(self.root, *segments))
+        except ValueError:
+            return None
+        if not path.startswith(self.root + os.sep):
+            return None
+        return path
+
+    async def etag(self, path, stat):
+        """
+        ETag fort d'un fichier
+
+        Le hash d'un fichier absent du catalogue est calculé dans un thread,
+        sans bloquer la boucle d'événements.
+        """
+        self._load_catalog()
+        base, extension = path, ''
+        for _, suffix in PRECOMPRESSED:
+            if path.endswith(suffix):
+                base, extension = path[:-len(suffix)], suffix
+        relative_path = catalog_relative_path(base)
+        if relative_path is not None:
+            known = self._catalog_hashes.get(relative_path + extension)
+            # Un fichier modifié depuis le catalogue (même taille) est rehaché
+            if known and known[1] == stat.st_size and known[2] == stat.st_mtime_ns:
+                return f'"{known[0][:32]}"'
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        digest = self._hashes.get(key)
+        if digest is None:
+            loop = asyncio.get_running_loop()
+            digest = self._hashes[key] = await loop.run_in_executor(None, _file_digest, path)
+        return f'"{digest}"'
+
+    def cache_control(self, path):
+        relative_path = os.path.relpath(path, self.root).replace(os.sep, '/')
+        if relative_path.startswith('immutable/'):
+            return f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+        if relative_path.startswith('metadata/'):
+            # Le catalogue est toujours revalidé (requête conditionnelle)
+            return "no-cache"
+        return f"public, max-age={self.max_age}"
+
+    def select(self, url_path, accept_encoding):
+        """
+        Représentation à servir pour un chemin
+
+        Une variante précompressée (.br, .zst, .gz) est choisie selon
+        Accept-Encoding. Un fichier demandé explicitement avec son
+        extension (.gz) est servi tel quel, sans Content-Encoding.
+
+        Returns:
+            Tuple (chemin du fichier, Content-Encoding ou None, négocié) ou
+            None si aucun fichier ne correspond
+        """
+        path = self.resolve(url_path)
+        if path is None:
+            return None
+        accepted = parse_accept_encoding(accept_encoding)
+        candidates = []
+        for preference, (encoding, extension) in enumerate(PRECOMPRESSED):
+            quality = accepted.get(encoding, 0)
+            if quality > 0 and os.path.isfile(path + extension):
+                candidates.append((-quality, preference, path + extension, encoding))
+        exists = os.path.isfile(path)
+        if exists and accepted['identity'] > 0:
+            candidates.append((-accepted['identity'], len(PRECOMPRESSED), path, None))
+        if candidates:
+            _, _, selected, encoding = min(candidates)
+            return selected, encoding, True
+        if exists:
+            return path, None, False
+        # Seule une variante gzip existe et le client ne l'accepte pas : elle
+        # sera décompressée à la volée
+        if os.path.isfile(path + '.gz'):
+            return path + '.gz', 'decompress', True
+        return None
+
+    @staticmethod
+    def content_type(url_path):
+        name = url_path.rsplit('/', 1)[-1]
+        for extension, content_type in CONTENT_TYPES.items():
+            if name.endswith(extension):
+                return content_type
+        return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+class CDNServer:
+    """
+    Serveur HTTP/1.1 asyncio des fichiers statiques du CDN
+
+    - Négociation de Accept-Encoding avec les variantes précompressées
+      (Content-Encoding br, zstd, gzip ; Vary: Accept-Encoding)
+    - Envoi par sendfile (copie noyau, sans passer par Python)
+    - Requêtes Range (une plage), If-Range
+    - ETag forts (hashes du catalogue), If-None-Match, If-Modified-Since
+    - Cache immuable pour les fichiers nommés par hash (dossier immutable)
+    - Connexions keep-alive, CORS ouvert (comme raw.githubusercontent.com)
+    """
+
+    def __init__(self, site, host="0.0.0.0", port=DEFAULT_PORT, log=False):
+        self.site = site
+        self.host = host
+        self.port = port
+        self.log = log
+        self.requests = 0
+
+    async def serve(self, reuse_port=False, ready=None):
+        server = await asyncio.start_server(self.handle, self.host, self.port,
+                                            reuse_port=reuse_port or None)
+        self.port = server.sockets[0].getsockname()[1]
+        if ready is not None:
+            ready.set_result(self.port)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._send_error(writer, 400, close=True)
+                    break
+                if len(head) > MAX_HEADER_SIZE:
+                    await self._send_error(writer, 400, close=True)
+                    break
+                keep_alive = await self._respond(head, writer)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _respond(self, head, writer):
+        start = time.perf_counter()
+        try:
+            lines = head.decode('latin-1').split('\r\n')
+            method, target, version = lines[0].split(' ')
+        except ValueError:
+            await self._send_error(writer, 400, close=True)
+            return False
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        self.requests += 1
+
+        if method == 'OPTIONS':
+            await self._send(writer, 204, {
+                "Access-Control-Allow-Methods": "GET, HEAD, OPTIONS",
+                "Access-Control-Allow-Headers": "Range, If-None-Match, If-Modified-Since",
+                "Access-Control-Max-Age": "86400",
+                "Content-Length": "0"}, keep_alive)
+            return keep_alive
+        if method not in ('GET', 'HEAD'):
+            await self._send_error(writer, 405, keep_alive, {"Allow": "GET, HEAD, OPTIONS"})
+            return keep_alive
+
+        url_path = urlsplit(target).path
+        if url_path.endswith('/'):
+            url_path += 'index.html'
+        status = await self._serve_file(writer, method, url_path, headers, keep_alive)
+        if self.log:
+            print(f"{method} {target} {status} {(time.perf_counter() - start) * 1000:.1f} ms")
+        return keep_alive
+
+    async def _serve_file(self, writer, method, url_path, headers, keep_alive):
+        selected = self.site.select(url_path, headers.get('accept-encoding'))
+        if selected is None:
+            await self._send_error(writer, 404, keep_alive)
+            return 404
+        path, encoding, negotiated = selected
+        try:
+            stat = os.stat(path)
+        except OSError:
+            await self._send_error(writer, 404, keep_alive)
+            return 404
+
+        response = {
+            "Content-Type": self.site.content_type(url_path),
+            "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+            "Cache-Control": self.site.cache_control(path),
+        }
+        if negotiated:
+            response["Vary"] = "Accept-Encoding"
+
+        if encoding == 'decompress':
+            if method == 'HEAD':
+                response["Transfer-Encoding"] = "chunked"
+                await self._send(writer, 200, response, keep_alive)
+                return 200
+            await self._send_decompressed(writer, path, response, keep_alive)
+            return 200
+
+        etag = await self.site.etag(path, stat)
+        response["ETag"] = etag
+        response["Accept-Ranges"] = "bytes"
+        if encoding:
+            response["Content-Encoding"] = encoding
+
+        if self._not_modified(headers, etag, stat):
+            await self._send(writer, 304, response, keep_alive)
+            return 304
+
+        size = stat.st_size
+        byte_range = parse_range(headers.get('range'), size)
+        if byte_range is not None and headers.get('if-range') not in (None, etag):
+            byte_range = None
+        if byte_range == "unsatisfiable":
+            response["Content-Range"] = f"bytes */{size}"
+            await self._send_error(writer, 416, keep_alive, response)
+            return 416
+
+        status = 200
+        offset, count = 0, size
+        if byte_range is not None:
+            status = 206
+            offset, end = byte_range
+            count = end - offset + 1
+            response["Content-Range"] = f"bytes {offset}-{end}/{size}"
+        response["Content-Length"] = str(count)
+        await self._send(writer, status, response, keep_alive)
+        if method == 'GET' and count:
+            with open(path, 'rb') as f:
+                await self._sendfile(writer, f, offset, count)
+        return status
+
+    @staticmethod
+    def _not_modified(headers, etag, stat):
+        if_none_match = headers.get('if-none-match')
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or etag in tags or f"W/{etag}" in tags
+        if_modified_since = headers.get('if-modified-since')
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(stat.st_mtime) <= since
+        return False
+
+    @staticmethod
+    async def _sendfile(writer, fileobj, offset, count):
+        """Copie noyau (os.sendfile) quand le transport le permet, lecture par blocs sinon"""
+        await writer.drain()
+        loop = asyncio.get_running_loop()
+        await loop.sendfile(writer.transport, fileobj, offset, count)
+
+    async def _send_decompressed(self, writer, path, response, keep_alive):
+        response["Transfer-Encoding"] = "chunked"
+        await self._send(writer, 200, response, keep_alive)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                data = decompressor.decompress(chunk)
+                # Fichier fait de plusieurs membres gzip (voir geojson_seq)
+                while decompressor.eof and decompressor.unused_data:
+                    rest = decompressor.unused_data
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    data += decompressor.decompress(rest)
+                if data:
+                    writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+                    await writer.drain()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    async def _send(self, writer, status, headers, keep_alive):
+        lines = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+                 f"Date: {formatdate(usegmt=True)}",
+                 "Server: carto-data-cdn",
+                 "Access-Control-Allow-Origin: *",
+                 "Access-Control-Expose-Headers: Content-Length, Content-Range, ETag, Content-Encoding",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+
+    async def _send_error(self, writer, status, keep_alive=False, headers=None, close=False):
+        body = f"{status} {_REASONS.get(status, '')}\n".encode('utf-8')
+        response = {key: value for key, value in (headers or {}).items()
+                    if key not in ("Content-Length", "Content-Encoding", "ETag", "Accept-Ranges")}
+        response["Content-Type"] = "text/plain; charset=utf-8"
+        response["Content-Length"] = str(len(body))
+        await self._send(writer, status, response, keep_alive and not close)
+        writer.write(body)
+        await writer.drain()
+
+
+def run_server(root, host="0.0.0.0", port=DEFAULT_PORT, catalog_path=None,
+               max_age=DEFAULT_MAX_AGE, reuse_port=False, log=False):
+    """Sert un arbre de fichiers jusqu'à l'interruption du processus"""
+    server = CDNServer(StaticSite(root, catalog_path, max_age), host, port, log)
+    try:
+        asyncio.run(server.serve(reuse_port))
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servir les fichiers du CDN (négociation des variantes précompressées)')
+    parser.add_argument('--root', '-r', default='.',
+                        help='Racine servie (contient data, metadata...)')
+    parser.add_argument('--host', default='0.0.0.0',
+                        help='Adresse d\'écoute')
+    parser.add_argument('--port', '-p', type=int, default=DEFAULT_PORT,
+                        help=f'Port (défaut : {DEFAULT_PORT})')
+    parser.add_argument('--catalog', '-c',
+                        help='Catalogue des hashes (défaut : metadata/catalog.json sous la racine)')
+    parser.add_argument('--max-age', type=int, default=DEFAULT_MAX_AGE,
+                        help='Durée de cache des fichiers non hachés (secondes)')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='Nombre de processus partageant le port (SO_REUSEPORT)')
+    parser.add_argument('--log', action='store_true',
+                        help='Afficher chaque requête')
+
+    args = parser.parse_args()
+
+    print(f"Service de {os.path.abspath(args.root)} sur http://{args.host}:{args.port}/ "
+          f"({args.workers} processus)")
+    if args.workers <= 1:
+        run_server(args.root, args.host, args.port, args.catalog, args.max_age, log=args.log)
+        return
+    processes = [multiprocessing.Process(target=run_server,
+                                         args=(args.root, args.host, args.port, args.catalog,
+                                               args.max_age, True, args.log))
+                 for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+import os
+import gzip
+import json
+import math
+import mmap
+import time
+import struct
+import weakref
+import argparse
+from array import array
+
+from geojson_stream import iter_features
+
+# Signature en tête et en fin de fichier
+COLUMNAR_MAGIC = b'CDNCOL\x01\x00'
+FOOTER_LENGTH = struct.Struct('<I')
+
+COLUMNAR_EXTENSION = '.geocol'
+
+DEFAULT_ROW_GROUP_SIZE = 65536
+
+# Colonnes texte toujours encodées par dictionnaire (valeurs très répétées)
+DICTIONARY_COLUMNS = ('LabelAtlas', 'Country', 'type', 'BasinName')
+
+# Valeur réservée aux entiers absents
+INT_NULL = -2 ** 63
+
+# Largeur des codes de dictionnaire (le code 0 représente une valeur absente)
+_CODE_TYPES = ((0xFF, 'B'), (0xFFFF, 'H'), (0xFFFFFFFF, 'I'))
+
+
+def _align(fileobj):
+    """Complète le fichier pour que le prochain tableau soit aligné sur 8 octets"""
+    padding = -fileobj.tell() % 8
+    if padding:
+        fileobj.write(b'\x00' * padding)
+
+
+def _column_encoding(name, values):
+    """
+    Choisit l'encodage d'une colonne pour un groupe de lignes
+
+    Returns:
+        "int64", "float64", "dict", "utf8" ou "json"
+    """
+    present = [v for v in values if v is not None]
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        return "int64" if present else "dict"
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return "float64"
+    if all(isinstance(v, (str, bool)) for v in present):
+        if name in DICTIONARY_COLUMNS or all(isinstance(v, bool) for v in present):
+            return "dict"
+        strings = [v for v in present if isinstance(v, str)]
+        if len(strings) == len(present):
+            return "dict" if len(set(strings)) * 2 <= len(strings) else "utf8"
+    return "json"
+
+
+class ColumnarWriter:
+    """
+    Écrit des features ponctuelles au format colonnes (.geocol)
+
+    Les features sont regroupées par groupes de row_group_size lignes. Chaque
+    groupe contient les longitudes et latitudes en float64 contigus puis une
+    colonne par propriété. Les dictionnaires et la position de chaque colonne
+    sont décrits dans un pied de page JSON, écrit à la fermeture.
+    """
+
+    def __init__(self, fileobj, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+        self.fileobj = fileobj
+        self.row_group_size = row_group_size
+        self.columns = []
+        self.dictionaries = {}
+        self.row_groups = []
+        self.count = 0
+        self._rows = []
+        fileobj.write(COLUMNAR_MAGIC)
+
+    def write(self, feature):
+        """Ajoute une feature (géométrie Point ou nulle)"""
+        geometry = feature.get("geometry")
+        if geometry is None:
+            position = (math.nan, math.nan)
+        elif geometry.get("type") == "Point":
+            position = tuple(geometry["coordinates"][:2])
+        else:
+            raise ValueError(f"Géométrie non supportée : {geometry.get('type')}")
+        properties = feature.get("properties") or {}
+        for name in properties:
+            if name not in self.dictionaries:
+                self.dictionaries[name] = {}
+                self.columns.append(name)
+        self._rows.append((position, properties))
+        self.count += 1
+        if len(self._rows) >= self.row_group_size:
+            self._flush()
+
+    def _write_array(self, values):
+        _align(self.fileobj)
+        offset = self.fileobj.tell()
+        self.fileobj.write(values.tobytes())
+        return [offset, len(values) * values.itemsize]
+
+    def _flush(self):
+        if not self._rows:
+            return
+        rows = self._rows
+        self._rows = []
+        xs = array('d', (position[0] for position, _ in rows))
+        ys = array('d', (position[1] for position, _ in rows))
+        finite_x = [x for x in xs if not math.isnan(x)]
+        finite_y = [y for y in ys if not math.isnan(y)]
+        group = {
+            "rows": len(rows),
+            "bbox": ([min(finite_x), min(finite_y), max(finite_x), max(finite_y)]
+                     if finite_x else None),
+            "x": self._write_array(xs),
+            "y": self._write_array(ys),
+            "columns": {}
+        }
+
+        for name in self.columns:
+            values = [properties.get(name) for _, properties in rows]
+            encoding = _column_encoding(name, values)
+            chunk = {"encoding": encoding}
+            if encoding == "int64":
+                chunk["data"] = self._write_array(array('q', (INT_NULL if v is None else v for v in values)))
+            elif encoding == "float64":
+                chunk["data"] = self._write_array(array('d', (math.nan if v is None else v for v in values)))
+            elif encoding == "dict":
+                dictionary = self.dictionaries[name]
+                codes = [0 if v is None else dictionary.setdefault(v, len(dictionary) + 1)
+                         for v in values]
+                typecode = next(t for limit, t in _CODE_TYPES if len(dictionary) <= limit)
+                chunk["data"] = self._write_array(array(typecode, codes))
+                chunk["typecode"] = typecode
+            else:
+                if encoding == "json":
+                    values = [None if v is None else json.dumps(v, ensure_ascii=False) for v in values]
+                # Décalages (uint32) dans un bloc UTF-8, plus un masque des valeurs absentes
+                blob = bytearray()
+                offsets = array('I', [0])
+                for v in values:
+                    if v is not None:
+                        blob += v.encode('utf-8')
+                    offsets.append(len(blob))
+                chunk["offsets"] = self._write_array(offsets)
+                if None in values:
+                    chunk["nulls"] = self._write_array(array('B', (v is None for v in values)))
+                chunk["data"] = [self.fileobj.tell(), len(blob)]
+                self.fileobj.write(blob)
+            group["columns"][name] = chunk
+        self.row_groups.append(group)
+
+    def close(self):
+        """Écrit le dernier groupe et le pied de page"""
+        self._flush()
+        footer = json.dumps({
+            "version": 1,
+            "rows": self.count,
+            "columns": self.columns,
+            # Les dictionnaires sont listés dans l'ordre des codes (à partir de 1)
+            "dictionaries": {name: list(values) for name, values in self.dictionaries.items() if values},
+            "row_groups": self.row_groups
+        }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.fileobj.write(footer)
+        self.fileobj.write(FOOTER_LENGTH.pack(len(footer)))
+        self.fileobj.write(COLUMNAR_MAGIC)
+
+
+def write_columnar(features, output_file, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+    Écrit des features dans un fichier .geocol (remplacé de façon atomique)
+
+    Returns:
+        Nombre de features écrites
+    """
+    tmp_path = f"{output_file}.tmp"
+    with open(tmp_path, 'wb') as f:
+        writer = ColumnarWriter(f, row_group_size)
+        for feature in features:
+            writer.write(feature)
+        writer.close()
+    os.replace(tmp_path, output_file)
+    return writer.count
+
+
+def columnar_path_for(file_path):
+    """Chemin du fichier colonnes d'un GeoJSON (data/x.geojson.gz -> data/x.geocol)"""
+    name = file_path
+    for extension in ('.gz', '.geojson'):
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+    return name + COLUMNAR_EXTENSION
+
+
+def convert_file(source, destination=None, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """Convertit un fichier .geojson ou .geojson.gz au format colonnes"""
+    if destination is None:
+        destination = columnar_path_for(source)
+    if source.endswith('.gz'):
+        f = gzip.open(source, 'rt', encoding='utf-8')
+    else:
+        f = open(source, 'r', encoding='utf-8')
+    with f:
+        write_columnar(iter_features(f), destination, row_group_size)
+    return destination
+
+
+class ColumnarReader:
+    """
+    Lecteur d'un fichier .geocol projeté en mémoire
+
+    Les colonnes numériques et les codes de dictionnaire sont des vues
+    (memoryview) sur le fichier, sans copie ni décodage.
+    """
+
+    def __init__(self, file_path):
+        with open(file_path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        # Vues retournées à l'appelant, libérées par close()
+        self._exports = []
+        if self._view[:8] != COLUMNAR_MAGIC or self._view[-8:] != COLUMNAR_MAGIC:
+            self.close()
+            raise ValueError(f"Fichier colonnes invalide : {file_path}")
+        footer_length, = FOOTER_LENGTH.unpack_from(self._mmap, len(self._mmap) - 12)
+        footer_start = len(self._mmap) - 12 - footer_length
+        footer = json.loads(bytes(self._view[footer_start:footer_start + footer_length]))
+        self.rows = footer["rows"]
+        self.columns = footer["columns"]
+        self.dictionaries = footer["dictionaries"]
+        self.row_groups = footer["row_groups"]
+
+    def close(self):
+        """
+        Libère la projection du fichier
+
+        Les vues encore détenues par l'appelant (coordinates, column) sont
+        libérées d'abord : elles deviennent invalides (ValueError à l'accès).
+        """
+        for ref in self._exports:
+            view = ref()
+            if view is not None:
+                view.release()
+        self._exports = []
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _slice(self, location, typecode=None):
+        offset, length = location
+        view = self._view[offset:offset + length]
+        if typecode:
+            cast = view.cast(typecode)
+            view.release()
+            view = cast
+        self._exports.append(weakref.ref(view))
+        return view
+
+    def coordinates(self, group):
+        """Vues (longitudes, latitudes) d'un groupe de lignes"""
+        chunk = self.row_groups[group]
+        return self._slice(chunk["x"], 'd'), self._slice(chunk["y"], 'd')
+
+    def column(self, name, group):
+        """
+        Données brutes d'une colonne dans un groupe de lignes
+
+        Returns:
+            (encodage, données) : une vue numérique pour int64 / float64, les
+            codes pour dict (0 = absent, voir dictionaries[name]), ou la liste
+            des valeurs décodées pour utf8 / json
+        """
+        chunk = self.row_groups[group]["columns"].get(name)
+        if chunk is None:
+            return "dict", [0] * self.row_groups[group]["rows"]
+        encoding = chunk["encoding"]
+        if encoding == "int64":
+            return encoding, self._slice(chunk["data"], 'q')
+        if encoding == "float64":
+            return encoding, self._slice(chunk["data"], 'd')
+        if encoding == "dict":
+            return encoding, self._slice(chunk["data"], chunk["typecode"])
+        offsets = self._slice(chunk["offsets"], 'I')
+        nulls = self._slice(chunk["nulls"], 'B') if "nulls" in chunk else None
+        blob = self._slice(chunk["data"])
+        values = []
+        for i in range(len(offsets) - 1):
+            if nulls is not None and nulls[i]:
+                values.append(None)
+                continue
+            text = str(blob[offsets[i]:offsets[i + 1]], 'utf-8')
+            values.append(json.loads(text) if encoding == "json" else text)
+        return encoding, values
+
+    def values(self, name, group):
+        """Valeurs Python d'une colonne dans un groupe de lignes"""
+        encoding, data = self.column(name, group)
+        if encoding == "int64":
+            return [None if v == INT_NULL else v for v in data]
+        if encoding == "float64":
+            return [None if math.isnan(v) else v for v in data]
+        if encoding == "dict":
+            dictionary = [None] + self.dictionaries.get(name, [])
+            return [dictionary[code] for code in data]
+        return data
+
+    def groups_in_bbox(self, min_x, min_y, max_x, max_y):
+        """Groupes de lignes dont l'emprise intersecte une emprise"""
+        return [i for i, group in enumerate(self.row_groups)
+                if group["bbox"] and not (group["bbox"][0] > max_x or group["bbox"][1] > max_y
+                                          or group["bbox"][2] < min_x or group["bbox"][3] < min_y)]
+
+    def iter_features(self, groups=None):
+        """Reconstruit les features GeoJSON (de tous les groupes par défaut)"""
+        if groups is None:
+            groups = range(len(self.row_groups))
+        for group in groups:
+            xs, ys = self.coordinates(group)
+            names = [name for name in self.columns if name in self.row_groups[group]["columns"]]
+            columns = [self.values(name, group) for name in names]
+            for i, row in enumerate(zip(*columns) if columns else ((),) * len(xs)):
+                if math.isnan(xs[i]):
+                    geometry = None
+                else:
+                    geometry = {"type": "Point", "coordinates": [xs[i], ys[i]]}
+                properties = dict(zip(names, row))
+                yield {"type": "Feature", "geometry": geometry, "properties": properties}
+
+
+def benchmark(file_path, repeat=3):
+    """
+    Compare le chargement d'un .geojson.gz à celui de son fichier .geocol
+
+    Returns:
+        Dictionnaire des tailles (octets) et des meilleurs temps (secondes)
+    """
+    columnar_file = columnar_path_for(file_path)
+
+    def best(function):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def load_geojson():
+        with gzip.open(file_path, 'rt', encoding='utf-8') as f:
+            json.load(f)
+
+    def load_coordinates():
+        with ColumnarReader(columnar_file) as reader:
+            for group in range(len(reader.row_groups)):
+                xs, ys = reader.coordinates(group)
+                sum(xs), sum(ys)
+                del xs, ys
+
+    def load_features():
+        with ColumnarReader(columnar_file) as reader:
+            for _ in reader.iter_features():
+                pass
+
+    # Taille servie avec Content-Encoding: gzip
+    with open(columnar_file, 'rb') as f:
+        columnar_gz_size = len(gzip.compress(f.read(), mtime=0))
+
+    return {
+        "geojson_gz_size": os.path.getsize(file_path),
+        "columnar_size": os.path.getsize(columnar_file),
+        "columnar_gz_size": columnar_gz_size,
+        "geojson_gz_load": best(load_geojson),
+        "columnar_coordinates": best(load_coordinates),
+        "columnar_features": best(load_features)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convertir les GeoJSON au format colonnes (.geocol)')
+    parser.add_argument('--file', '-f', help='Fichier .geojson ou .geojson.gz à convertir')
+    parser.add_argument('--directory', '-d', default='data',
+                        help='Répertoire à convertir (défaut : data)')
+    parser.add_argument('--row-group-size', '-r', type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                        help='Nombre de lignes par groupe')
+    parser.add_argument('--benchmark', '-b', action='store_true',
+                        help='Comparer le chargement au .geojson.gz')
+
+    args = parser.parse_args()
+
+    if args.file:
+        files = [args.file]
+    else:
+        files = [os.path.join(root, name)
+                 for root, _, names in os.walk(args.directory)
+                 for name in sorted(names) if name.endswith('.geojson.gz')]
+
+    for file_path in files:
+        try:
+            columnar_file = convert_file(file_path, row_group_size=args.row_group_size)
+        except Exception as e:
+            print(f"Erreur lors de la conversion de {file_path}: {e}")
+            continue
+        print(f"{file_path} -> {columnar_file} "
+              f"({os.path.getsize(file_path) / 1024:.1f} KB -> {os.path.getsize(columnar_file) / 1024:.1f} KB)")
+        if args.benchmark and file_path.endswith('.gz'):
+            stats = benchmark(file_path)
+            print(f"  Taille gzip : .geojson.gz {stats['geojson_gz_size'] / 1024:.1f} KB, "
+                  f".geocol {stats['columnar_gz_size'] / 1024:.1f} KB")
+            print(f"  json.load du .geojson.gz : {stats['geojson_gz_load'] * 1000:.1f} ms")
+            print(f"  Coordonnées .geocol      : {stats['columnar_coordinates'] * 1000:.1f} ms")
+            print(f"  Features .geocol         : {stats['columnar_features'] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,96 +1,707 @@
 import os
+import re
 import json
+import time
 import gzip
-import glob
+import zlib
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 
-def compress_geojson_file(file_path, delete_original=False):
+from catalog import Catalog
+from coordinate_precision import quantize_feature
+from geojson_stream import COLLECTION_HEADER, encode_feature, feature_separator, iter_features
+from geojson_seq import DEFAULT_BLOCK_SIZE, SEQ_EXTENSION, INDEX_EXTENSION, convert_file
+from metrics import NO_METRICS, add_metrics_arguments, metrics_from_args
+
+# Codecs optionnels : les variantes correspondantes ne sont produites que
+# si le module est installé
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import zopfli.gzip as zopfli_gzip
+except ImportError:
+    zopfli_gzip = None
+
+# Taille des blocs lus dans le fichier source
+CHUNK_SIZE = 1024 * 1024
+
+# Chaîne JSON complète (les guillemets échappés sont gérés)
+_JSON_STRING = re.compile(rb'("[^"\\]*(?:\\.[^"\\]*)*")', re.S)
+
+# Espaces insignifiants en JSON
+_WHITESPACE = b' \t\r\n'
+
+
+def iter_chunks(fileobj, chunk_size=CHUNK_SIZE):
+    """Lit un fichier binaire bloc par bloc"""
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def iter_minified(chunks):
     """
-    Compresse un fichier GeoJSON en gzip
-    
+    Supprime les espaces hors des chaînes JSON, bloc par bloc
+
+    Le document n'est jamais chargé en entier : seule une chaîne coupée
+    entre deux blocs est conservée jusqu'au bloc suivant.
+
     Args:
-        file_path: Chemin vers le fichier GeoJSON
-        delete_original: Supprimer le fichier original après compression
-    
+        chunks: Itérable de blocs d'octets (JSON encodé en UTF-8)
+    """
+    pending = b''
+    for chunk in chunks:
+        # Les segments pairs sont hors chaîne, les segments impairs sont des chaînes
+        parts = _JSON_STRING.split(pending + chunk)
+
+        # Une chaîne coupée en fin de bloc est reportée au bloc suivant
+        tail = parts[-1]
+        quote = tail.find(b'"')
+        if quote >= 0:
+            pending = tail[quote:]
+            parts[-1] = tail[:quote]
+        else:
+            pending = b''
+
+        parts[0::2] = [part.translate(None, _WHITESPACE) for part in parts[0::2]]
+        yield b''.join(parts)
+    if pending:
+        yield pending
+
+
+def iter_quantized(fileobj, precision, report):
+    """
+    Réécrit une FeatureCollection avec des coordonnées arrondies, feature
+    par feature
+
+    Args:
+        fileobj: Fichier GeoJSON ouvert en lecture
+        precision: Nombre de décimales conservées
+        report: Dictionnaire où l'écart maximal est noté (clé max_error_m)
+    """
+    report.setdefault("max_error_m", 0.0)
+    separator = feature_separator().encode('utf-8')
+    yield COLLECTION_HEADER.encode('utf-8')
+    first = True
+    for feature in iter_features(fileobj):
+        report["max_error_m"] = max(report["max_error_m"], quantize_feature(feature, precision))
+        data = encode_feature(feature).encode('utf-8')
+        yield data if first else separator + data
+        first = False
+    yield b']}'
+
+
+def iter_source(src, minify=False, precision=None, report=None):
+    """
+    Blocs d'octets à compresser : contenu brut, sans espaces inutiles ou
+    avec des coordonnées arrondies (ce qui implique la minification)
+    """
+    if precision is not None:
+        return iter_quantized(src, precision, report if report is not None else {})
+    chunks = iter_chunks(src)
+    if minify:
+        chunks = iter_minified(chunks)
+    return chunks
+
+
+def compress_file(file_path, delete_original=False, minify=False, compresslevel=9,
+                  precision=None, metrics=NO_METRICS):
+    """
+    Compresse un fichier en gzip en lisant ses octets par blocs
+
+    Le contenu n'est ni parsé ni resérialisé, sauf si une précision est
+    demandée (les features sont alors relues une par une). Le fichier .gz
+    est écrit dans un fichier temporaire puis renommé, pour qu'un fichier
+    incomplet ne soit jamais considéré comme à jour. La lecture (et la
+    minification ou l'arrondi) et la compression sont mesurées dans metrics
+    (étapes "read" et "gzip").
+
     Returns:
-        Chemin vers le fichier compressé
+        Dictionnaire (source, compressed, original_size, compressed_size,
+        seconds, cpu_seconds, max_error_m)
     """
     # Vérifier que le fichier existe
     if not os.path.isfile(file_path):
         raise FileNotFoundError(f"Le fichier {file_path} n'existe pas")
-    
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+
     # Construire le chemin de destination
     compressed_path = f"{file_path}.gz"
-    
-    # Lire le fichier JSON
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
+    tmp_path = f"{compressed_path}.tmp"
+
     # Compresser et sauvegarder
-    with gzip.open(compressed_path, 'wt', encoding='utf-8') as f:
-        json.dump(data, f)
-    
+    report = {"max_error_m": 0.0}
+    try:
+        with open(file_path, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=compresslevel) as dst:
+            for chunk in metrics.timed_iter(iter_source(src, minify, precision, report), "read",
+                                           count_rows=False):
+                with metrics.stage("gzip") as stage:
+                    dst.write(chunk)
+                    stage.add(bytes_in=len(chunk))
+            with metrics.stage("gzip"):
+                dst.close()
+    except BaseException:
+        # Ne pas laisser de fichier temporaire incomplet
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, compressed_path)
+    _write_options(compressed_path, minify, precision)
+
+    stats = {
+        "source": file_path,
+        "compressed": compressed_path,
+        "original_size": os.path.getsize(file_path),
+        "compressed_size": os.path.getsize(compressed_path),
+        "seconds": time.perf_counter() - start,
+        "cpu_seconds": time.process_time() - cpu_start,
+        "max_error_m": report["max_error_m"]
+    }
+    with metrics.stage("read") as stage:
+        stage.add(bytes_in=stats["original_size"])
+    with metrics.stage("gzip") as stage:
+        stage.add(bytes_out=stats["compressed_size"])
+
+    # Supprimer l'original si demandé
+    if delete_original:
+        os.remove(file_path)
+
+    return stats
+
+
+def compress_geojson_file(file_path, delete_original=False, minify=False, precision=None,
+                          metrics=NO_METRICS):
+    """
+    Compresse un fichier GeoJSON en gzip
+
+    Args:
+        file_path: Chemin vers le fichier GeoJSON
+        delete_original: Supprimer le fichier original après compression
+        minify: Supprimer les espaces inutiles pendant la compression
+        precision: Nombre de décimales des coordonnées (None : inchangées)
+        metrics: Mesures de la lecture et de la compression
+
+    Returns:
+        Chemin vers le fichier compressé
+    """
+    stats = compress_file(file_path, delete_original, minify, precision=precision, metrics=metrics)
+
     # Obtenir les tailles des fichiers
-    original_size = os.path.getsize(file_path)
-    compressed_size = os.path.getsize(compressed_path)
-    reduction = (1 - compressed_size / original_size) * 100
-    
-    print(f"Fichier compressé : {compressed_path}")
+    original_size = stats["original_size"]
+    compressed_size = stats["compressed_size"]
+    reduction = (1 - compressed_size / original_size) * 100 if original_size else 0
+
+    print(f"Fichier compressé : {stats['compressed']}")
     print(f"  Taille originale : {original_size / 1024:.1f} KB")
     print(f"  Taille compressée : {compressed_size / 1024:.1f} KB")
     print(f"  Réduction : {reduction:.1f}%")
-    
-    # Supprimer l'original si demandé
+    if precision is not None:
+        print(f"  Erreur de position max : {stats['max_error_m']:.3f} m")
+
     if delete_original:
-        os.remove(file_path)
         print(f"Fichier original supprimé : {file_path}")
-    
-    return compressed_path
 
-def compress_all_geojson(directory=None, delete_originals=False):
-    """Compresse tous les fichiers GeoJSON dans un répertoire"""
+    return stats["compressed"]
+
+
+def _options_path(compressed_path):
+    # Fichier caché (jamais servi ni catalogué) à côté du .gz
+    directory, name = os.path.split(compressed_path)
+    return os.path.join(directory, f".{name}.options")
+
+
+def _write_options(compressed_path, minify, precision):
+    """Enregistre les options qui ont produit le contenu d'un .gz"""
+    with open(_options_path(compressed_path), 'w', encoding='utf-8') as f:
+        json.dump({"minify": bool(minify), "precision": precision}, f)
+
+
+def _read_options(compressed_path):
+    """Options d'un .gz (sans fichier d'options : celles par défaut)"""
+    try:
+        with open(_options_path(compressed_path), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"minify": False, "precision": None}
+
+
+def is_up_to_date(file_path, minify=False, precision=None):
+    """
+    Indique si le .gz d'un fichier existe, est plus récent que la source et
+    a été produit avec les mêmes options (minification, précision)
+    """
+    compressed_path = f"{file_path}.gz"
+    return (os.path.isfile(compressed_path)
+            and os.path.getmtime(compressed_path) >= os.path.getmtime(file_path)
+            and _read_options(compressed_path) == {"minify": bool(minify), "precision": precision})
+
+
+def compress_all_geojson(directory=None, delete_originals=False, minify=False,
+                         workers=None, force=False, precision=None, metrics=NO_METRICS):
+    """
+    Compresse tous les fichiers GeoJSON d'un répertoire en parallèle
+
+    Args:
+        directory: Répertoire à parcourir (défaut : data)
+        delete_originals: Supprimer les fichiers originaux après compression
+        minify: Supprimer les espaces inutiles pendant la compression
+        workers: Nombre de processus (défaut : nombre de CPU)
+        force: Recompresser même les fichiers dont le .gz est à jour
+        precision: Nombre de décimales des coordonnées (None : inchangées)
+        metrics: Mesures ; le temps et les octets de chaque fichier,
+            mesurés dans les workers, sont cumulés dans l'étape "compress"
+    """
     # Si aucun répertoire n'est spécifié, utiliser le répertoire data
     if directory is None:
         directory = "data"
-    
+
     # Trouver tous les fichiers GeoJSON
     geojson_files = []
     for root, _, files in os.walk(directory):
         for file in files:
-            if file.endswith('.geojson') and not file.endswith('.geojson.gz'):
+            if file.endswith('.geojson'):
                 geojson_files.append(os.path.join(root, file))
-    
+
+    # Ignorer les fichiers dont le .gz est déjà plus récent que la source
+    # et produit avec les mêmes options
+    if not force:
+        pending = [file_path for file_path in geojson_files
+                   if not is_up_to_date(file_path, minify, precision)]
+        skipped = len(geojson_files) - len(pending)
+        geojson_files = pending
+        if skipped:
+            print(f"{skipped} fichiers déjà à jour ignorés")
+
     print(f"Trouvé {len(geojson_files)} fichiers GeoJSON à compresser")
-    
-    # Compresser chaque fichier
+
+    # Compresser les fichiers en parallèle
+    start = time.perf_counter()
     compressed_files = []
-    for file_path in geojson_files:
-        try:
-            compressed_path = compress_geojson_file(file_path, delete_originals)
-            compressed_files.append(compressed_path)
-        except Exception as e:
-            print(f"Erreur lors de la compression de {file_path}: {e}")
-    
+    total_in = total_out = 0
+    max_error = 0.0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(compress_file, file_path, delete_originals, minify,
+                                   precision=precision)
+                   for file_path in geojson_files]
+        for file_path, future in zip(geojson_files, futures):
+            try:
+                stats = future.result()
+            except Exception as e:
+                print(f"Erreur lors de la compression de {file_path}: {e}")
+                continue
+            compressed_files.append(stats["compressed"])
+            metrics.record("compress", stats["seconds"], stats["cpu_seconds"],
+                           bytes_in=stats["original_size"], bytes_out=stats["compressed_size"])
+            total_in += stats["original_size"]
+            total_out += stats["compressed_size"]
+            max_error = max(max_error, stats["max_error_m"])
+    elapsed = time.perf_counter() - start
+
     print(f"Compression terminée. {len(compressed_files)} fichiers compressés.")
-    
+    if total_in:
+        throughput = total_in / (1024 * 1024) / elapsed if elapsed else 0
+        print(f"  Taille originale : {total_in / (1024 * 1024):.1f} MB")
+        print(f"  Taille compressée : {total_out / (1024 * 1024):.1f} MB")
+        print(f"  Réduction : {(1 - total_out / total_in) * 100:.1f}%")
+        print(f"  Débit : {throughput:.1f} MB/s ({elapsed:.2f} s)")
+        if precision is not None:
+            print(f"  Erreur de position max : {max_error:.3f} m")
+
     return compressed_files
 
+
+class _BufferedCompressor:
+    """Compresseur en une seule fois (zopfli) derrière l'interface compress/flush"""
+
+    def __init__(self, compress):
+        self._compress = compress
+        self._chunks = []
+
+    def compress(self, chunk):
+        self._chunks.append(chunk)
+        return b''
+
+    def flush(self):
+        return self._compress(b''.join(self._chunks))
+
+
+class _BrotliCompressor:
+    """Compresseur brotli derrière l'interface compress/flush"""
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=11)
+
+    def compress(self, chunk):
+        return self._compressor.process(chunk)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def _gzip_compressor():
+    # En-tête gzip sans date : deux compressions du même contenu sont identiques
+    return zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def _zstd_decompress(data):
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+# Codecs disponibles : (extension, Content-Encoding, fabrique de compresseur, décompression)
+CODECS = {
+    "gzip": (".gz", "gzip", _gzip_compressor, gzip.decompress),
+    "zopfli": (".gz", "gzip",
+               lambda: _BufferedCompressor(zopfli_gzip.compress), gzip.decompress),
+    "br": (".br", "br", _BrotliCompressor, lambda data: brotli.decompress(data)),
+    "zstd": (".zst", "zstd",
+             lambda: zstandard.ZstdCompressor(level=19).compressobj(), _zstd_decompress),
+}
+
+
+def available_codecs():
+    """Liste les codecs utilisables avec les modules installés"""
+    codecs = ["gzip"]
+    if zopfli_gzip is not None:
+        codecs.append("zopfli")
+    if brotli is not None:
+        codecs.append("br")
+    if zstandard is not None:
+        codecs.append("zstd")
+    return codecs
+
+
+def _default_variants():
+    """Une variante par extension : zopfli remplace gzip -9 s'il est installé"""
+    codecs = available_codecs()
+    if "zopfli" in codecs:
+        codecs.remove("gzip")
+    return codecs
+
+
+def _open_source(file_path):
+    """
+    Ouvre la source en binaire ; un fichier gzip (reconnu à sa signature,
+    quelle que soit son extension) est décompressé à la volée
+    """
+    with open(file_path, 'rb') as f:
+        magic = f.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(file_path, 'rb')
+    return open(file_path, 'rb')
+
+
+def write_variants(file_path, codecs=None, minify=False, precision=None, source=None,
+                   replace=True):
+    """
+    Produit les variantes précompressées d'un fichier GeoJSON en une passe
+
+    La source est lue une seule fois et chaque bloc est envoyé à tous les
+    compresseurs. La source peut être un .geojson ou un .geojson.gz (dont
+    la variante .gz est alors régénérée au niveau maximal).
+
+    Args:
+        file_path: Fichier .geojson ou .geojson.gz
+        codecs: Codecs à utiliser (défaut : meilleurs codecs installés)
+        minify: Supprimer les espaces inutiles pendant la compression
+        precision: Nombre de décimales des coordonnées (None : inchangées)
+        source: Fichier lu à la place de file_path (par exemple sa nouvelle
+            version encore temporaire) ; file_path donne les noms des variantes
+        replace: Remplacer les variantes ; sinon elles restent dans
+            <variante>.tmp, à renommer par l'appelant
+
+    Returns:
+        Dictionnaire {Content-Encoding: {"path", "extension", "size"}} des
+        variantes écrites
+    """
+    if codecs is None:
+        codecs = _default_variants()
+    missing = [codec for codec in codecs if codec not in available_codecs()]
+    if missing:
+        raise ValueError(f"Codecs non disponibles : {missing}")
+    extensions = [CODECS[codec][0] for codec in codecs]
+    if len(set(extensions)) != len(extensions):
+        raise ValueError("Deux codecs produisent la même extension (gzip et zopfli)")
+
+    base_path = file_path[:-3] if file_path.endswith('.gz') else file_path
+    sinks = []
+    try:
+        for codec in codecs:
+            extension, encoding, factory, _ = CODECS[codec]
+            path = base_path + extension
+            compressor = factory()
+            sinks.append((encoding, path, open(f"{path}.tmp", 'wb'), compressor))
+
+        with _open_source(source or file_path) as src:
+            for chunk in iter_source(src, minify, precision):
+                for _, _, out, compressor in sinks:
+                    out.write(compressor.compress(chunk))
+        for _, _, out, compressor in sinks:
+            out.write(compressor.flush())
+    except BaseException:
+        # Un codec a échoué : aucune variante n'est remplacée et les
+        # fichiers temporaires sont supprimés
+        for _, path, out, _ in sinks:
+            out.close()
+            os.remove(f"{path}.tmp")
+        raise
+    for _, _, out, _ in sinks:
+        out.close()
+
+    variants = {}
+    for encoding, path, _, _ in sinks:
+        if replace:
+            os.replace(f"{path}.tmp", path)
+        variants[encoding] = {
+            "path": path,
+            "extension": path[len(base_path):],
+            "size": os.path.getsize(path if replace else f"{path}.tmp")
+        }
+    return variants
+
+
+def benchmark_codecs(file_path, codecs=None, minify=False, precision=None):
+    """
+    Mesure taux de compression, temps de compression et de décompression
+    de chaque codec sur un fichier (en mémoire, sans écrire de variante)
+
+    Returns:
+        Liste de dictionnaires, un par codec
+    """
+    if codecs is None:
+        codecs = available_codecs()
+
+    with _open_source(file_path) as src:
+        data = b''.join(iter_source(src, minify, precision))
+
+    results = []
+    for codec in codecs:
+        _, _, factory, decompress = CODECS[codec]
+
+        start = time.perf_counter()
+        compressor = factory()
+        compressed = compressor.compress(data) + compressor.flush()
+        compress_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        decompress(compressed)
+        decompress_seconds = time.perf_counter() - start
+
+        results.append({
+            "file": file_path,
+            "codec": codec,
+            "original_size": len(data),
+            "compressed_size": len(compressed),
+            "ratio": len(data) / len(compressed) if compressed else 0,
+            "compress_seconds": compress_seconds,
+            "decompress_seconds": decompress_seconds
+        })
+    return results
+
+
+def print_benchmark(results):
+    """Affiche le tableau comparatif des codecs"""
+    print(f"{'Fichier':<40} {'Codec':<8} {'Taille (KB)':>12} {'Ratio':>7} "
+          f"{'Compr. (s)':>11} {'Décompr. (s)':>13}")
+    for row in results:
+        print(f"{os.path.basename(row['file']):<40} {row['codec']:<8} "
+              f"{row['compressed_size'] / 1024:>12.1f} {row['ratio']:>7.2f} "
+              f"{row['compress_seconds']:>11.3f} {row['decompress_seconds']:>13.4f}")
+
+
+def record_encodings(catalog_path, file_path, variants):
+    """
+    Enregistre dans le catalogue les encodages disponibles pour un fichier,
+    pour que les clients puissent choisir la plus petite variante
+
+    Args:
+        catalog_path: Chemin vers metadata/catalog.json
+        file_path: Fichier source (data/<catégorie>/<nom>.geojson[.gz])
+        variants: Résultat de write_variants
+    """
+    with Catalog(catalog_path) as catalog:
+        catalog.set_encodings(file_path, {
+            encoding: {"extension": info["extension"], "size": info["size"]}
+            for encoding, info in variants.items()
+        })
+
+
+def find_sources(directory=None):
+    """
+    Sources GeoJSON d'un répertoire : une par fichier, le .geojson étant
+    préféré au .geojson.gz quand les deux existent
+
+    Returns:
+        Liste des chemins
+    """
+    if directory is None:
+        directory = "data"
+    sources = {}
+    for root, _, files in os.walk(directory):
+        for file in files:
+            if file.endswith('.geojson') or file.endswith('.geojson.gz'):
+                path = os.path.join(root, file)
+                base_path = path[:-3] if path.endswith('.gz') else path
+                if base_path not in sources or path == base_path:
+                    sources[base_path] = path
+    return list(sources.values())
+
+
+def compress_all_variants(directory=None, codecs=None, minify=False, workers=None,
+                          catalog_path=None, precision=None, metrics=NO_METRICS):
+    """
+    Produit les variantes précompressées de tous les GeoJSON d'un répertoire
+
+    Les fichiers présents uniquement en .geojson.gz sont aussi traités.
+    """
+    sources = find_sources(directory)
+
+    print(f"Trouvé {len(sources)} fichiers GeoJSON, codecs : {codecs or _default_variants()}")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(write_variants, path, codecs, minify, precision): path
+                   for path in sources}
+        for future, path in futures.items():
+            try:
+                variants = future.result()
+            except Exception as e:
+                print(f"Erreur lors de la compression de {path}: {e}")
+                continue
+            sizes = ", ".join(f"{encoding} {info['size'] / 1024:.1f} KB"
+                              for encoding, info in variants.items())
+            print(f"  {path} : {sizes}")
+            if catalog_path:
+                with metrics.stage("catalog"):
+                    record_encodings(catalog_path, path, variants)
+
+
+def record_sequence(catalog_path, file_path, info):
+    """Enregistre dans le catalogue la version par blocs d'un fichier (résultat de convert_file)"""
+    with Catalog(catalog_path) as catalog:
+        catalog.set_sequence(file_path, {
+            "extension": SEQ_EXTENSION,
+            "index": INDEX_EXTENSION,
+            "features": info["features"],
+            "blocks": info["blocks"],
+            "size": info["size"]
+        })
+
+
+def compress_all_sequences(files, block_size=DEFAULT_BLOCK_SIZE, workers=None, catalog_path=None,
+                           metrics=NO_METRICS):
+    """
+    Écrit la version par blocs gzip indexés (.geojsonl.gz et .geojsonl.idx,
+    voir geojson_seq) de chaque fichier, en parallèle
+
+    Args:
+        files: Fichiers .geojson ou .geojson.gz
+        block_size: Taille visée des blocs avant compression
+        workers: Nombre de processus (défaut : nombre de CPU)
+        catalog_path: Catalogue où enregistrer les fichiers produits
+        metrics: Mesures (étape "catalog")
+
+    Returns:
+        Liste des résultats de convert_file
+    """
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(convert_file, path, block_size=block_size): path for path in files}
+        for future, path in futures.items():
+            try:
+                info = future.result()
+            except Exception as e:
+                print(f"Erreur lors de la conversion de {path}: {e}")
+                continue
+            print(f"  {info['path']} : {info['features']} features, {info['blocks']} blocs, "
+                  f"{info['size'] / 1024:.1f} KB")
+            results.append(info)
+            if catalog_path:
+                with metrics.stage("catalog"):
+                    record_sequence(catalog_path, path, info)
+    return results
+
+
 def main():
     parser = argparse.ArgumentParser(description='Compresser des fichiers GeoJSON')
     parser.add_argument('--file', '-f', help='Chemin vers un fichier GeoJSON spécifique')
     parser.add_argument('--directory', '-d', help='Répertoire contenant les fichiers GeoJSON')
-    parser.add_argument('--delete', '-x', action='store_true', 
+    parser.add_argument('--delete', '-x', action='store_true',
                         help='Supprimer les fichiers originaux après compression')
-    
+    parser.add_argument('--minify', '-m', action='store_true',
+                        help='Supprimer les espaces inutiles pendant la compression')
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                        help='Nombre de processus (défaut : nombre de CPU)')
+    parser.add_argument('--force', action='store_true',
+                        help='Recompresser même les fichiers dont le .gz est à jour')
+    parser.add_argument('--variants', '-v', nargs='*', choices=list(CODECS),
+                        help='Produire les variantes précompressées (.gz max, .br, .zst) ; '
+                             'sans valeur : tous les codecs installés')
+    parser.add_argument('--benchmark', '-b',
+                        help='Comparer les codecs et écrire le rapport JSON dans ce fichier')
+    parser.add_argument('--catalog', '-c',
+                        help='Catalogue où enregistrer les encodages disponibles')
+    parser.add_argument('--precision', '-p', type=int,
+                        help='Arrondir les coordonnées à ce nombre de décimales')
+    parser.add_argument('--seq', action='store_true',
+                        help='Écrire les features par lignes en blocs gzip indexés (.geojsonl.gz), '
+                             'lisibles par requêtes Range')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                        help='Taille visée des blocs de --seq avant compression (octets)')
+    add_metrics_arguments(parser)
+
     args = parser.parse_args()
-    
+    metrics = metrics_from_args(args, "compress_geojson_file")
+    metrics.start()
+
     try:
-        if args.file:
-            compress_geojson_file(args.file, args.delete)
+        if args.benchmark:
+            files = [args.file] if args.file else [
+                os.path.join(root, file)
+                for root, _, names in os.walk(args.directory or "data")
+                for file in names if file.endswith(('.geojson', '.geojson.gz'))
+            ]
+            results = []
+            for file_path in files:
+                results.extend(benchmark_codecs(file_path, args.variants or None, args.minify,
+                                                args.precision))
+            print_benchmark(results)
+            with open(args.benchmark, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+        elif args.seq:
+            files = [args.file] if args.file else find_sources(args.directory)
+            compress_all_sequences(files, args.block_size, args.workers, args.catalog, metrics)
+        elif args.variants is not None:
+            codecs = args.variants or None
+            if args.file:
+                variants = write_variants(args.file, codecs, args.minify, args.precision)
+                for encoding, info in variants.items():
+                    print(f"Variante {encoding} : {info['path']} ({info['size'] / 1024:.1f} KB)")
+                if args.catalog:
+                    record_encodings(args.catalog, args.file, variants)
+            else:
+                compress_all_variants(args.directory, codecs, args.minify, args.workers, args.catalog,
+                                      args.precision, metrics)
+        elif args.file:
+            compress_geojson_file(args.file, args.delete, args.minify, args.precision, metrics)
         else:
-            compress_all_geojson(args.directory, args.delete)
+            compress_all_geojson(args.directory, args.delete, args.minify, args.workers, args.force,
+                                 args.precision, metrics)
     except Exception as e:
         print(f"Erreur : {e}")
+        metrics.event("error", error=str(e))
+    finally:
+        metrics.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
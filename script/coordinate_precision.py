@@ -0,0 +1,146 @@
+import math
+import gzip
+import zlib
+import argparse
+
+from geojson_stream import encode_feature, feature_separator, iter_features
+
+# Mètres par degré de latitude (et de longitude à l'équateur)
+METERS_PER_DEGREE = 111320.0
+
+# Précisions comparées par défaut dans le rapport
+DEFAULT_PRECISIONS = (3, 4, 5, 6, 7)
+
+
+def round_coordinates(coordinates, precision):
+    """Arrondit récursivement des coordonnées GeoJSON à precision décimales"""
+    if coordinates and isinstance(coordinates[0], (list, tuple)):
+        return [round_coordinates(position, precision) for position in coordinates]
+    return [round(value, precision) for value in coordinates]
+
+
+def position_error(original, rounded):
+    """
+    Écart maximal en mètres entre deux jeux de coordonnées de même forme
+
+    La distance est calculée en projection équirectangulaire locale, ce qui
+    est exact à mieux que 0,1 % pour des écarts de quelques mètres.
+    """
+    if original and isinstance(original[0], (list, tuple)):
+        return max((position_error(a, b) for a, b in zip(original, rounded)), default=0.0)
+    dlon = (rounded[0] - original[0]) * math.cos(math.radians(original[1]))
+    dlat = rounded[1] - original[1]
+    return math.hypot(dlon, dlat) * METERS_PER_DEGREE
+
+
+def max_error_bound(precision):
+    """Erreur maximale théorique (en mètres) d'un arrondi à precision décimales"""
+    half_step = 0.5 * 10 ** -precision
+    return math.hypot(half_step, half_step) * METERS_PER_DEGREE
+
+
+def quantize_feature(feature, precision):
+    """
+    Arrondit les coordonnées d'une feature (la feature est modifiée)
+
+    Returns:
+        Écart maximal introduit, en mètres
+    """
+    geometry = feature.get("geometry")
+    if not geometry or "coordinates" not in geometry:
+        return 0.0
+    original = geometry["coordinates"]
+    geometry["coordinates"] = round_coordinates(original, precision)
+    return position_error(original, geometry["coordinates"])
+
+
+def precision_report(file_path, precisions=DEFAULT_PRECISIONS):
+    """
+    Compare la taille compressée et l'erreur de position de plusieurs
+    précisions, en une seule lecture du fichier
+
+    Args:
+        file_path: Fichier .geojson ou .geojson.gz
+        precisions: Nombres de décimales à comparer
+
+    Returns:
+        Liste de dictionnaires (precision, max_error_m, compressed_size), la
+        première ligne (precision None) correspondant aux coordonnées complètes
+    """
+    levels = [None] + list(precisions)
+    compressors = {p: zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS) for p in levels}
+    sizes = dict.fromkeys(levels, 0)
+    errors = dict.fromkeys(levels, 0.0)
+    separator = feature_separator().encode('utf-8')
+    first = True
+
+    if file_path.endswith('.gz'):
+        source = gzip.open(file_path, 'rt', encoding='utf-8')
+    else:
+        source = open(file_path, 'r', encoding='utf-8')
+
+    with source:
+        for feature in iter_features(source):
+            coordinates = (feature.get("geometry") or {}).get("coordinates")
+            for p in levels:
+                if p is not None and coordinates is not None:
+                    feature["geometry"]["coordinates"] = round_coordinates(coordinates, p)
+                    errors[p] = max(errors[p], position_error(coordinates, feature["geometry"]["coordinates"]))
+                data = encode_feature(feature).encode('utf-8')
+                if not first:
+                    data = separator + data
+                sizes[p] += len(compressors[p].compress(data))
+            if coordinates is not None:
+                feature["geometry"]["coordinates"] = coordinates
+            first = False
+
+    report = []
+    for p in levels:
+        sizes[p] += len(compressors[p].flush())
+        report.append({
+            "precision": p,
+            "max_error_m": errors[p],
+            "compressed_size": sizes[p]
+        })
+    return report
+
+
+def choose_precision(report, max_error_m):
+    """Plus petite précision dont l'erreur mesurée respecte le budget (ou None)"""
+    candidates = [row for row in report
+                  if row["precision"] is not None and row["max_error_m"] <= max_error_m]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda row: row["precision"])["precision"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Comparer les précisions de coordonnées')
+    parser.add_argument('files', nargs='+', help='Fichiers .geojson ou .geojson.gz')
+    parser.add_argument('--precisions', '-p', type=int, nargs='+', default=list(DEFAULT_PRECISIONS),
+                        help='Nombres de décimales à comparer')
+    parser.add_argument('--max-error', '-e', type=float,
+                        help='Budget de précision en mètres : indique la précision à retenir')
+
+    args = parser.parse_args()
+
+    for file_path in args.files:
+        report = precision_report(file_path, args.precisions)
+        full_size = report[0]["compressed_size"]
+        print(f"{file_path}")
+        print(f"  {'Décimales':>9} {'Erreur max (m)':>15} {'Taille gzip (KB)':>17} {'Gain':>7}")
+        for row in report:
+            label = "complète" if row["precision"] is None else str(row["precision"])
+            gain = (1 - row["compressed_size"] / full_size) * 100 if full_size else 0
+            print(f"  {label:>9} {row['max_error_m']:>15.3f} "
+                  f"{row['compressed_size'] / 1024:>17.1f} {gain:>6.1f}%")
+        if args.max_error is not None:
+            precision = choose_precision(report, args.max_error)
+            if precision is None:
+                print(f"  Aucune précision testée ne respecte {args.max_error} m")
+            else:
+                print(f"  Précision retenue pour {args.max_error} m : {precision} décimales")
+
+
+if __name__ == "__main__":
+    main()
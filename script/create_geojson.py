@@ -1,163 +1,422 @@
-import pyodbc
 import geojson
-import gzip
-import json
-import decimal
+import argparse
 from decimal import Decimal
+from contextlib import nullcontext
 import os
 
+from geojson_stream import (DEFAULT_BATCH_SIZE, SERIALIZERS, fetch_in_batches, json_value,
+                            write_geojson_files)
+from property_schema import PROFILES, convert_value, is_binary, normalize_properties
+from coordinate_precision import max_error_bound
+from columnar_format import COLUMNAR_EXTENSION, ColumnarWriter
+from geojson_seq import open_seq, seq_paths_for
+from query_planner import (add_filter_arguments, build_select, filters_from_args, find_filter_columns,
+                           project_columns, quote_identifier)
+from metrics import NO_METRICS, add_metrics_arguments, metrics_from_args
+
+# Décimales conservées par défaut, comme geojson.Point (bibliothèque
+# geojson) : une précision demandée (--precision) la remplace, plus grande
+# ou plus petite
+GEOJSON_PRECISION = 6
+
 # 1. Connexion SQL Server
 conn_str = (
-    r'DRIVER={SQL Server};'  
-    r'SERVER=.;'   
-    r'DATABASE=AMBER_202412_website;'   
+    r'DRIVER={SQL Server};'
+    r'SERVER=.;'
+    r'DATABASE=AMBER_202412_website;'
     r'Trusted_Connection=yes;'
 )
 
-conn = pyodbc.connect(conn_str)
-cursor = conn.cursor()
-
-# Définir l'encodeur personnalisé pour les objets Decimal
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return float(obj)
-        return super(DecimalEncoder, self).default(obj)
-
-# 2. Obtenir la liste de toutes les tables de la base de données
-cursor.execute("""
-    SELECT TABLE_NAME
-    FROM INFORMATION_SCHEMA.TABLES
-    WHERE TABLE_TYPE = 'BASE TABLE' AND TABLE_CATALOG = 'AMBER_202412_website'
-""")
-
-tables = [row[0] for row in cursor.fetchall()]
-print(f"Nombre de tables trouvées: {len(tables)}")
-
-# Créer le dossier "data" pour stocker les fichiers GeoJSON si nécessaire
-output_dir = "data"
-if not os.path.exists(output_dir):
-    os.makedirs(output_dir)
-    print(f"Dossier '{output_dir}' créé.")
-
-# 3. Boucler sur chaque table
-for table_name in tables:
-    print(f"Traitement de la table: {table_name}")
-    
-    # Vérifier si la table a des colonnes lat/lon
-    cursor.execute(f"""
-        SELECT COLUMN_NAME
-        FROM INFORMATION_SCHEMA.COLUMNS
-        WHERE TABLE_NAME = '{table_name}'
+
+def connect():
+    """Ouvre une connexion pyodbc vers la base SQL Server"""
+    import pyodbc
+    return pyodbc.connect(conn_str)
+
+
+def list_tables(cursor):
+    """Retourne la liste de toutes les tables de la base de données"""
+    cursor.execute("""
+        SELECT TABLE_NAME
+        FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_TYPE = 'BASE TABLE' AND TABLE_CATALOG = 'AMBER_202412_website'
     """)
-    
-    columns = [row[0] for row in cursor.fetchall()]
-    
+    return [row[0] for row in cursor.fetchall()]
+
+
+def get_table_columns(cursor, table_name):
+    """
+    Retourne la liste des colonnes d'une table
+
+    Les noms sont lus dans cursor.description d'une requête vide, ce qui
+    fonctionne avec tout pilote DB-API (pyodbc, sqlite3...).
+    """
+    cursor.execute(f"SELECT * FROM {quote_identifier(table_name)} WHERE 1 = 0")
+    columns = [description[0] for description in cursor.description]
+    cursor.fetchall()
+    return columns
+
+
+def plan_table(table_name, columns, profile=None, precision=None):
+    """
+    Identifie les colonnes de coordonnées d'une table et les colonnes à lire
+
+    Avec un profil, les colonnes qu'il supprime ne sont pas lues (voir
+    query_planner.project_columns).
+
+    Args:
+        table_name: Nom de la table
+        columns: Colonnes de la table
+        profile: Profil de propriétés (voir property_schema.PROFILES) ; sans
+            profil, les propriétés sont exportées en texte comme auparavant
+        precision: Nombre de décimales des coordonnées (None : 6 décimales, comme geojson.Point)
+
+    Returns:
+        Dictionnaire (lat_col, lon_col, id_col, columns : colonnes du SELECT
+        dans l'ordre des lignes lues, property_columns, filter_columns,
+        profile, precision) ou None si la table ne contient pas de
+        coordonnées géographiques
+    """
     # Identifier les colonnes potentielles de latitude et longitude
     lat_columns = [col for col in columns if col.lower() in ('latitude', 'lat', 'y')]
     lon_columns = [col for col in columns if col.lower() in ('longitude', 'long', 'lon', 'lng', 'x')]
-    
+
     # Vérifier si la table a des colonnes lat/lon
     if not (lat_columns and lon_columns):
-        print(f"  La table {table_name} ne semble pas contenir de coordonnées géographiques. Ignorée.")
-        continue
-    
+        return None
+
     # Utiliser les premières colonnes identifiées
     lat_col = lat_columns[0]
     lon_col = lon_columns[0]
-    
+
     # Identifier une colonne ID potentielle
     id_columns = [col for col in columns if col.lower() in ('id', f'{table_name.lower()}_id', 'object_id', 'objectid')]
     id_col = id_columns[0] if id_columns else columns[0]  # Utiliser la première colonne si aucun ID n'est trouvé
-    
-    # Construire la liste des autres colonnes pour les propriétés
-    property_columns = [col for col in columns if col not in (lat_col, lon_col)]
-    
-    # Construire la requête dynamiquement
-    cols_str = ", ".join([f"[{col}]" for col in columns])
-    
+
+    # Colonnes lues (projection du profil) ; les autres sont les propriétés
+    select_columns = project_columns(columns, lat_col, lon_col, profile)
+
+    return {
+        "lat_col": lat_col,
+        "lon_col": lon_col,
+        "id_col": id_col,
+        "columns": select_columns,
+        "property_columns": select_columns[2:],
+        "filter_columns": find_filter_columns(columns),
+        "profile": profile,
+        "precision": precision
+    }
+
+
+def build_table_query(table_name, plan, filters=None):
+    """
+    Construit la requête SELECT paramétrée des lignes géolocalisées d'une table
+
+    La validité des coordonnées et les filtres (emprise, types, pays,
+    intervalle d'identifiants, voir query_planner.build_where) sont
+    évalués par le serveur.
+
+    Returns:
+        Tuple (requête, paramètres) à passer à cursor.execute
+    """
+    return build_select(table_name, plan["columns"], plan["lat_col"], plan["lon_col"], filters,
+                        plan["filter_columns"], plan["id_col"])
+
+
+def row_to_feature(row, columns, plan):
+    """
+    Convertit une ligne en feature GeoJSON
+
+    Version de référence, pratique pour une ligne isolée : les exports
+    utilisent row_converter, qui produit les mêmes features sans objets
+    intermédiaires.
+
+    Returns:
+        La feature, ou None si les coordonnées sont invalides
+    """
+    lat_col = plan["lat_col"]
+    lon_col = plan["lon_col"]
+
+    # Créer un dictionnaire des valeurs de colonnes
+    row_dict = {columns[i]: row[i] for i in range(len(columns))}
+
+    # Extraire les coordonnées
     try:
-        cursor.execute(f"""
-            SELECT {cols_str}
-            FROM [{table_name}]
-            WHERE [{lat_col}] IS NOT NULL 
-            AND [{lon_col}] IS NOT NULL
-            AND [{lat_col}] BETWEEN -90 AND 90
-            AND [{lon_col}] BETWEEN -180 AND 180
-        """)
-        
-        rows = cursor.fetchall()
-        
-        if not rows:
-            print(f"  Aucune donnée géographique valide trouvée dans la table {table_name}. Ignorée.")
-            continue
-            
-        print(f"  {len(rows)} enregistrements trouvés avec coordonnées valides.")
-        
-        features = []
-        
-        # Construire les features GeoJSON
-        for row in rows:
-            # Créer un dictionnaire des valeurs de colonnes
-            row_dict = {columns[i]: row[i] for i in range(len(columns))}
-            
-            # Extraire les coordonnées
-            try:
-                lat = float(row_dict[lat_col])
-                lon = float(row_dict[lon_col])
-                
-                # Vérifier que les coordonnées sont valides
-                if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        lat = float(row_dict[lat_col])
+        lon = float(row_dict[lon_col])
+    except (ValueError, TypeError):
+        # Ignorer les lignes avec des coordonnées non convertibles
+        return None
+
+    # Vérifier que les coordonnées sont valides
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+
+    # Arrondir les coordonnées à la précision demandée
+    precision = plan.get("precision")
+    if precision is None:
+        precision = GEOJSON_PRECISION
+    lon = round(lon, precision)
+    lat = round(lat, precision)
+
+    # Créer le point GeoJSON
+    point = geojson.Point((lon, lat), precision=precision)  # longitude, latitude
+
+    # Avec un profil : types natifs, colonnes redondantes et binaires supprimées
+    profile = plan.get("profile")
+    if profile is not None:
+        properties = normalize_properties({col: row_dict[col] for col in plan["property_columns"]},
+                                          profile)
+        return geojson.Feature(geometry=point, properties=properties)
+
+    # Préparer les propriétés (toutes les colonnes sauf lat/lon) : Decimal
+    # et binaires sont convertis ici, pas par le sérialiseur
+    properties = {}
+    for col in plan["property_columns"]:
+        value = row_dict[col]
+        if value is None or isinstance(value, Decimal):
+            properties[col] = json_value(value)
+        else:
+            properties[col] = str(json_value(value))
+
+    # Créer la feature
+    return geojson.Feature(geometry=point, properties=properties)
+
+
+def row_converter(columns, plan, check_ranges=True):
+    """
+    Prépare la conversion rapide des lignes d'une table en features
+
+    Les positions des colonnes, les clés des propriétés et les conversions
+    sont résolues une fois par table. La fonction retournée lit la ligne par
+    index et construit directement les dictionnaires de la feature, sans
+    dictionnaire de la ligne ni objets geojson ; le résultat est identique
+    à celui de row_to_feature une fois sérialisé.
+
+    Args:
+        columns: Colonnes des lignes (plan["columns"] pour les lignes lues
+            par build_table_query)
+        plan: Résultat de plan_table
+        check_ranges: Vérifier que les coordonnées sont dans les bornes
+            (inutile pour les lignes filtrées par build_table_query)
+
+    Returns:
+        Fonction ligne -> feature (None si les coordonnées sont invalides)
+    """
+    lat_index = columns.index(plan["lat_col"])
+    lon_index = columns.index(plan["lon_col"])
+    precision = plan.get("precision")
+    if precision is None:
+        precision = GEOJSON_PRECISION
+    profile = plan.get("profile")
+    property_columns = plan["property_columns"]
+
+    if profile is None:
+        fields = [(col, columns.index(col)) for col in property_columns]
+    else:
+        # Colonnes supprimées par le profil, connues dès le plan
+        drop = profile.get("drop", ())
+        duplicates = profile.get("duplicates", {})
+        declared = profile.get("types", {})
+        fields = [(col, columns.index(col), declared.get(col)) for col in property_columns
+                  if col not in drop
+                  and not (col in duplicates and duplicates[col] in property_columns)]
+
+    def convert(row):
+        try:
+            lat = float(row[lat_index])
+            lon = float(row[lon_index])
+        except (ValueError, TypeError):
+            return None
+        if check_ranges and not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return None
+        lon = round(lon, precision)
+        lat = round(lat, precision)
+
+        if profile is None:
+            properties = {}
+            for col, index in fields:
+                value = row[index]
+                if value.__class__ is str:
+                    properties[col] = value
+                elif value is None or isinstance(value, Decimal):
+                    properties[col] = json_value(value)
+                else:
+                    properties[col] = str(json_value(value))
+        else:
+            properties = {}
+            for col, index, kind in fields:
+                value = row[index]
+                if is_binary(value):
                     continue
-                
-                # Créer le point GeoJSON
-                point = geojson.Point((lon, lat))  # longitude, latitude
-                
-                # Préparer les propriétés (toutes les colonnes sauf lat/lon)
-                properties = {}
-                for col in property_columns:
-                    value = row_dict[col]
-                    # Conversion des types non sérialisables
-                    if isinstance(value, Decimal):
-                        properties[col] = float(value)
-                    elif value is None:
-                        properties[col] = None
-                    else:
-                        properties[col] = str(value)
-                
-                # Créer la feature
-                feature = geojson.Feature(geometry=point, properties=properties)
-                features.append(feature)
-                
-            except (ValueError, TypeError):
-                # Ignorer les lignes avec des coordonnées non convertibles
-                continue
-        
-        # Créer la FeatureCollection si des features ont été créées
-        if features:
-            feature_collection = {
-                "type": "FeatureCollection",
-                "features": features
-            }
-            
-            # Créer les fichiers de sortie dans le dossier "data"
-            output_file = os.path.join(output_dir, f"{table_name}.geojson")
-            compressed_file = os.path.join(output_dir, f"{table_name}.geojson.gz")
-            
-            # Écrire dans un fichier GeoJSON non compressé
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(feature_collection, f, ensure_ascii=False, indent=2, cls=DecimalEncoder)
-            
-            # Écrire le même fichier compressé en gzip
-            with gzip.open(compressed_file, "wt", encoding="utf-8") as f:
-                json.dump(feature_collection, f, ensure_ascii=False, cls=DecimalEncoder)
-                
-            print(f"  Fichiers créés dans le dossier 'data': {table_name}.geojson et {table_name}.geojson.gz")
+                try:
+                    properties[col] = convert_value(value, kind)
+                except ValueError:
+                    properties[col] = value
+
+        return {
+            "type": "Feature",
+            "geometry": {"type": "Point",
+                         "coordinates": [lon, lat]},
+            "properties": properties
+        }
+
+    return convert
+
+
+def iter_table_features(cursor, table_name, columns, plan, batch_size=DEFAULT_BATCH_SIZE,
+                        metrics=NO_METRICS, filters=None):
+    """
+    Génère les features GeoJSON d'une table, lot par lot
+
+    Args:
+        cursor: Curseur pyodbc (ou tout curseur DB-API)
+        table_name: Nom de la table
+        columns: Colonnes de la table
+        plan: Résultat de plan_table (seules ses colonnes sont lues)
+        batch_size: Nombre de lignes récupérées par fetchmany
+        metrics: Mesures (étapes "query" et "fetch"), voir metrics.Metrics
+        filters: Filtres évalués par le serveur (voir query_planner.build_where)
+    """
+    with metrics.stage("query"):
+        cursor.execute(*build_table_query(table_name, plan, filters))
+
+    # Construire les features GeoJSON (coordonnées déjà validées par la requête)
+    convert = row_converter(plan["columns"], plan, check_ranges=False)
+    for row in fetch_in_batches(cursor, batch_size, metrics):
+        feature = convert(row)
+        if feature is not None:
+            yield feature
+
+
+def export_table(cursor, table_name, output_dir="data", batch_size=DEFAULT_BATCH_SIZE,
+                 profile=None, precision=None, columnar=False, metrics=NO_METRICS,
+                 indent=None, serializer=None, filters=None, seq=False):
+    """
+    Exporte une table en GeoJSON (et .geojson.gz) en streaming
+
+    Avec columnar, le fichier colonnes .geocol est écrit dans la même passe,
+    avec seq le fichier par blocs .geojsonl.gz et son index (voir geojson_seq).
+    Les étapes (requête, fetch, construction des features, encodage,
+    écriture, gzip) sont mesurées dans metrics. Le fichier .geojson est
+    compact sauf si une indentation est demandée ; serializer choisit
+    l'encodeur JSON (voir geojson_stream.get_serializer). Les filtres
+    (emprise, types, pays, intervalle d'identifiants) sont évalués par le
+    serveur (voir query_planner.build_where).
+
+    Returns:
+        Nombre de features exportées (0 si la table est ignorée)
+    """
+    columns = get_table_columns(cursor, table_name)
+    plan = plan_table(table_name, columns, profile, precision)
+    if plan is None:
+        print(f"  La table {table_name} ne semble pas contenir de coordonnées géographiques. Ignorée.")
+        return 0
+
+    # Créer les fichiers de sortie dans le dossier "data"
+    output_file = os.path.join(output_dir, f"{table_name}.geojson")
+    compressed_file = os.path.join(output_dir, f"{table_name}.geojson.gz")
+
+    columnar_file = os.path.join(output_dir, f"{table_name}{COLUMNAR_EXTENSION}")
+    seq_file, index_file = seq_paths_for(output_file)
+
+    features = iter_table_features(cursor, table_name, columns, plan, batch_size, metrics, filters)
+    with open_seq(seq_file, index_file) if seq else nullcontext() as seq_writer:
+        if columnar:
+            columnar_out = open(f"{columnar_file}.tmp", 'wb')
+            columnar_writer = ColumnarWriter(columnar_out)
+
+            def tee(features):
+                for feature in features:
+                    with metrics.stage("columnar"):
+                        columnar_writer.write(feature)
+                    yield feature
+
+            with columnar_out:
+                count = write_geojson_files(tee(features), output_file, compressed_file, metrics,
+                                            indent, serializer, seq_writer)
+                with metrics.stage("columnar"):
+                    columnar_writer.close()
+            os.replace(f"{columnar_file}.tmp", columnar_file)
         else:
-            print(f"  Aucune feature valide n'a pu être créée pour {table_name}.")
-            
-    except Exception as e:
-        print(f"  Erreur lors du traitement de la table {table_name}: {str(e)}")
-        continue
+            count = write_geojson_files(features, output_file, compressed_file, metrics, indent,
+                                        serializer, seq_writer)
+
+    if not count:
+        # Ne pas laisser de collection vide dans le dossier de sortie
+        os.remove(output_file)
+        os.remove(compressed_file)
+        if columnar:
+            os.remove(columnar_file)
+        if seq:
+            os.remove(seq_file)
+            os.remove(index_file)
+        print(f"  Aucune feature valide n'a pu être créée pour {table_name}.")
+        return 0
+
+    print(f"  {count} features exportées avec coordonnées valides.")
+    print(f"  Fichiers créés dans le dossier '{output_dir}': {table_name}.geojson et {table_name}.geojson.gz")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exporter les tables SQL Server en GeoJSON')
+    parser.add_argument('--output-dir', '-o', default='data',
+                        help='Dossier de sortie des fichiers GeoJSON')
+    parser.add_argument('--batch-size', '-b', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='Nombre de lignes récupérées par lot (fetchmany)')
+    parser.add_argument('--profile', '-p', choices=list(PROFILES),
+                        help='Profil de propriétés : types natifs, colonnes redondantes supprimées')
+    parser.add_argument('--precision', type=int,
+                        help='Nombre de décimales des coordonnées (défaut : 6)')
+    parser.add_argument('--columnar', action='store_true',
+                        help='Écrire aussi le format colonnes .geocol')
+    parser.add_argument('--seq', action='store_true',
+                        help='Écrire aussi les features par lignes en blocs gzip indexés (.geojsonl.gz)')
+    parser.add_argument('--indent', type=int,
+                        help='Indentation des fichiers .geojson (défaut : compact)')
+    parser.add_argument('--serializer', '-s', choices=list(SERIALIZERS),
+                        help='Sérialiseur JSON (défaut : le plus rapide installé)')
+    add_filter_arguments(parser)
+    add_metrics_arguments(parser)
+
+    args = parser.parse_args()
+    profile = PROFILES[args.profile] if args.profile else None
+    filters = filters_from_args(args)
+    if args.precision is not None:
+        print(f"Coordonnées arrondies à {args.precision} décimales "
+              f"(erreur max {max_error_bound(args.precision):.2f} m)")
+
+    with metrics_from_args(args, "create_geojson") as metrics:
+        with metrics.stage("connect"):
+            conn = connect()
+            cursor = conn.cursor()
+
+            # 2. Obtenir la liste de toutes les tables de la base de données
+            tables = list_tables(cursor)
+        print(f"Nombre de tables trouvées: {len(tables)}")
+
+        # Créer le dossier "data" pour stocker les fichiers GeoJSON si nécessaire
+        output_dir = args.output_dir
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+            print(f"Dossier '{output_dir}' créé.")
+
+        # 3. Boucler sur chaque table
+        for table_name in tables:
+            print(f"Traitement de la table: {table_name}")
+            try:
+                count = export_table(cursor, table_name, output_dir, args.batch_size, profile,
+                                     args.precision, args.columnar, metrics, args.indent,
+                                     args.serializer, filters, args.seq)
+                metrics.event("table_exported", table=table_name, features=count)
+            except Exception as e:
+                print(f"  Erreur lors du traitement de la table {table_name}: {str(e)}")
+                metrics.event("table_failed", table=table_name, error=str(e))
+                continue
+
+    print(f"Export GeoJSON et compression terminés pour toutes les tables dans le dossier '{output_dir}'.")
+
 
-print("Export GeoJSON et compression terminés pour toutes les tables dans le dossier 'data'.")
+if __name__ == "__main__":
+    main()
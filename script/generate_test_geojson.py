@@ -1,6 +1,72 @@
 import json
+import gzip
+import zlib
+import time
+import struct
 import random
 import os
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from catalog import update_catalog
+from geojson_stream import feature_separator
+
+# Répartition des types d'obstacles observée dans les données réelles
+# (LabelAtlas, type, poids)
+BARRIER_LABELS = [
+    ('WEIR', 'weir', 58412),
+    ('DAM', 'dam', 46531),
+    ('OTHER', 'other', 13413),
+    ('RAMP/BED SILL', 'ramp', 13101),
+    ('CULVERT', 'culvert', 12068),
+    ('UNKNOWN', 'other', 9084),
+    ('SLUICE', 'sluice', 3899),
+    ('FORD', 'ford', 724),
+]
+
+# Classes de hauteur (HClass, hauteur min, hauteur max, poids)
+HEIGHT_CLASSES = [
+    ('NA', None, None, 94258),
+    ('0.5 to 1', 0.5, 1, 20600),
+    ('1 to 2', 1, 2, 15071),
+    ('<0.5', 0.05, 0.5, 11531),
+    ('2 to 5', 2, 5, 10026),
+    ('5 to 10', 5, 10, 2516),
+    ('>15', 15, 120, 2375),
+    ('10 to 15', 10, 15, 855),
+]
+
+# Emprises approximatives (min_lon, min_lat, max_lon, max_lat) des pays simulés
+COUNTRY_BOUNDS = {
+    'ITALY': (6.6, 36.6, 18.5, 47.1),
+    'SPAIN': (-9.3, 36.0, 3.3, 43.8),
+    'AUSTRIA': (9.5, 46.4, 17.2, 49.0),
+    'SWEDEN': (11.0, 55.3, 24.2, 69.1),
+    'POLAND': (14.1, 49.0, 24.2, 54.9),
+    'FRANCE': (-4.8, 42.3, 8.2, 51.1),
+    'GERMANY': (5.9, 47.3, 15.0, 55.1),
+}
+
+# Gabarit d'une feature, identique à la sortie de json.dumps sur les
+# features exportées de SQL Server
+FEATURE_TEMPLATE = (
+    '{"type": "Feature", "geometry": {"type": "Point", "coordinates": [%s, %s]}, '
+    '"properties": {"GUID": "{%s}", "BasinName": "%s", "RiverName": "%s", "DBName": "%s", '
+    '"Longitude_WGS84": "%s", "Latitude_WGS84": "%s", "LabelAtlas": "%s", "Country": "%s", '
+    '"ZHYD": "%s", "Outlet": "%s", "HClass": "%s", "Height": "%s", "type": "%s", '
+    '"basin_id": "%s", "ID": "%s", "n": "%d", "point": %s}}'
+)
+
+# Début et fin de la collection (sortie compacte de FeatureCollectionWriter)
+FEATURE_COLLECTION_HEADER = '{"type": "FeatureCollection", "features": ['
+FEATURE_COLLECTION_FOOTER = ']}'
+
+# Nombre de features générées par tâche (un membre gzip par tâche)
+SHARD_SIZE = 100000
+
+# En-tête de la géométrie SQL Server sérialisée (SRID 4326, version 1, point)
+_GEOGRAPHY_HEADER = b'\xe6\x10\x00\x00\x01\x0c'
 
 def generate_test_geojson(filename, feature_count=100, region=None):
     """
@@ -60,47 +126,9 @@ def generate_test_geojson(filename, feature_count=100, region=None):
     
     return filename
 
-def update_catalog(new_file):
-    """Met à jour le catalogue avec le nouveau fichier"""
-    catalog_path = "metadata/catalog.json"
-    
-    # Lire le catalogue existant
-    with open(catalog_path, 'r', encoding='utf-8') as f:
-        catalog = json.load(f)
-    
-    # Déterminer la catégorie
-    if '/types/' in new_file:
-        category = 'types'
-    elif '/countries/' in new_file:
-        category = 'countries'
-    elif '/regions/' in new_file:
-        category = 'regions'
-    else:
-        category = None
-    
-    # Ajouter le fichier au catalogue
-    if category:
-        # Retirer le préfixe "data/" pour le stockage dans le catalogue
-        file_path = new_file
-        if file_path.startswith('data/'):
-            file_path = file_path[5:]
-        
-        # Vérifier si le fichier existe déjà
-        if file_path not in catalog['data_categories'][category]['files']:
-            catalog['data_categories'][category]['files'].append(file_path)
-    
-    # Mettre à jour la date
-    catalog['last_updated'] = datetime.now().isoformat()
-    
-    # Sauvegarder le catalogue
-    with open(catalog_path, 'w', encoding='utf-8') as f:
-        json.dump(catalog, f, indent=2)
-    
-    print(f"Catalogue mis à jour avec {new_file}")
-
 def generate_sample_files():
     """Génère quelques fichiers GeoJSON d'exemple"""
-    from datetime import datetime
+    generated = []
     
     # Générer un exemple par pays
     countries = [
@@ -111,16 +139,14 @@ def generate_sample_files():
     
     for country, region in countries:
         filename = f"data/countries/{country}.geojson"
-        generate_test_geojson(filename, feature_count=200, region=region)
-        update_catalog(filename)
+        generated.append(generate_test_geojson(filename, feature_count=200, region=region))
     
     # Générer un exemple par type
     barrier_types = ['dam', 'weir', 'sluice', 'lock']
     
     for barrier_type in barrier_types:
         filename = f"data/types/{barrier_type}.geojson"
-        generate_test_geojson(filename, feature_count=150)
-        update_catalog(filename)
+        generated.append(generate_test_geojson(filename, feature_count=150))
     
     # Générer un exemple par région
     regions = [
@@ -130,10 +156,183 @@ def generate_sample_files():
     
     for region_name, bounds in regions:
         filename = f"data/regions/{region_name}.geojson"
-        generate_test_geojson(filename, feature_count=300, region=bounds)
-        update_catalog(filename)
+        generated.append(generate_test_geojson(filename, feature_count=300, region=bounds))
+    
+    # Une seule écriture du catalogue pour tous les fichiers
+    update_catalog(generated)
     
     print("Génération des fichiers d'exemple terminée!")
 
+def _guid(bits):
+    """GUID en majuscules à partir d'un entier de 128 bits"""
+    text = '%032X' % bits
+    return f"{text[:8]}-{text[8:12]}-{text[12:16]}-{text[16:20]}-{text[20:]}"
+
+def _make_basins(rng, bounds, count, distribution):
+    """
+    Bassins simulés : centre, dispersion (degrés), poids et codes
+    
+    En distribution groupée, les poids suivent une loi de Pareto (quelques
+    grands bassins concentrent la plupart des obstacles).
+    """
+    min_lon, min_lat, max_lon, max_lat = bounds
+    basins = []
+    for i in range(count):
+        basins.append({
+            "lon": rng.uniform(min_lon, max_lon),
+            "lat": rng.uniform(min_lat, max_lat),
+            "sigma": rng.uniform(0.05, 0.5),
+            "weight": rng.paretovariate(1.2) if distribution == "clustered" else 1.0,
+            "name": f"BASIN {i:04d}",
+            "river": f"RIVER {i:04d}",
+            "zhyd": f"C03{i:07d}",
+            "basin_id": f"C02{i:07d}",
+            "outlet": f"CSO{i:07d}",
+        })
+    return basins
+
+def _generate_shard(params, basin_list, shard, start, count, batch_size, compresslevel):
+    """
+    Génère les features [start, start + count) d'un fichier, compressées en
+    un membre gzip autonome
+    
+    Chaque tranche a son propre générateur (graine, numéro de tranche) : le
+    résultat ne dépend pas du nombre de processus.
+    """
+    seed, country, bounds, distribution = params
+    rng = random.Random(f"{seed}-{shard}")
+    min_lon, min_lat, max_lon, max_lat = bounds
+    basin_weights = [basin["weight"] for basin in basin_list]
+    label_weights = [weight for _, _, weight in BARRIER_LABELS]
+    height_weights = [weight for _, _, _, weight in HEIGHT_CLASSES]
+    db_name = f"AMBER_{country.replace(' ', '_')}_SYNTHETIC"
+    separator = feature_separator()
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    chunks = []
+    
+    written = 0
+    while written < count:
+        n = min(batch_size, count - written)
+        basin_ids = rng.choices(basin_list, weights=basin_weights, k=n)
+        labels = rng.choices(BARRIER_LABELS, weights=label_weights, k=n)
+        heights = rng.choices(HEIGHT_CLASSES, weights=height_weights, k=n)
+        gauss = rng.gauss
+        if distribution == "clustered":
+            lons = [min(max_lon, max(min_lon, b["lon"] + gauss(0, b["sigma"]))) for b in basin_ids]
+            lats = [min(max_lat, max(min_lat, b["lat"] + gauss(0, b["sigma"]))) for b in basin_ids]
+        else:
+            lons = [rng.uniform(min_lon, max_lon) for _ in range(n)]
+            lats = [rng.uniform(min_lat, max_lat) for _ in range(n)]
+        guids = [_guid(rng.getrandbits(128)) for _ in range(n)]
+        
+        rows = []
+        for i in range(n):
+            lon = round(lons[i], 6)
+            lat = round(lats[i], 6)
+            basin = basin_ids[i]
+            label, barrier_type, _ = labels[i]
+            hclass, low, high, _ = heights[i]
+            height = 'NA' if low is None else '%g' % round(rng.uniform(low, high), 2)
+            # Représentation texte des octets, comme dans l'export SQL Server
+            point = json.dumps(str(_GEOGRAPHY_HEADER + struct.pack('<dd', lat, lon)))
+            rows.append(FEATURE_TEMPLATE % (
+                lon, lat, guids[i], basin["name"], basin["river"], db_name,
+                lon, lat, label, country, basin["zhyd"], basin["outlet"], hclass, height,
+                barrier_type, basin["basin_id"], guids[i], start + written + i, point))
+        # Les tranches après la première commencent par le séparateur
+        text = separator.join(rows)
+        if start + written:
+            text = separator + text
+        chunks.append(compressor.compress(text.encode('utf-8')))
+        written += n
+    chunks.append(compressor.flush())
+    return b''.join(chunks)
+
+def generate_large_geojson(filename, feature_count=1000000, seed=0, country='ITALY', region=None,
+                           distribution="clustered", basins=200, workers=1, shard_size=SHARD_SIZE,
+                           batch_size=10000, compresslevel=6):
+    """
+    Génère un grand fichier GeoJSON gzip reproductible au schéma des données réelles
+    
+    Les colonnes sont tirées par lots (random.choices sur tout le lot) puis
+    les features sont formatées par gabarit. Le fichier est découpé en
+    tranches de shard_size features, générées en parallèle et compressées
+    chacune en un membre gzip : les membres sont concaténés dans l'ordre
+    (un fichier gzip valide) sans jamais tenir le fichier entier en mémoire.
+    
+    Args:
+        filename: Fichier .geojson.gz à créer
+        feature_count: Nombre de features
+        seed: Graine du générateur (même graine, même fichier)
+        country: Pays simulé (voir COUNTRY_BOUNDS)
+        region: Emprise (min_lon, min_lat, max_lon, max_lat), par défaut celle du pays
+        distribution: "clustered" (points groupés autour des bassins) ou "uniform"
+        basins: Nombre de bassins simulés
+        workers: Nombre de processus
+        shard_size: Nombre de features par tranche
+        batch_size: Nombre de features générées par lot
+        compresslevel: Niveau de compression gzip
+    
+    Returns:
+        Nombre de features écrites
+    """
+    bounds = region or COUNTRY_BOUNDS.get(country, (-10, 35, 30, 70))
+    basin_list = _make_basins(random.Random(seed), bounds, basins, distribution)
+    params = (seed, country, bounds, distribution)
+    shards = [(i, start, min(shard_size, feature_count - start))
+              for i, start in enumerate(range(0, feature_count, shard_size))]
+    
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    tmp_path = f"{filename}.tmp"
+    # En-têtes gzip sans date : le fichier est identique octet pour octet d'une exécution à l'autre
+    with open(tmp_path, 'wb') as out:
+        out.write(gzip.compress(FEATURE_COLLECTION_HEADER.encode('utf-8'), compresslevel, mtime=0))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Au plus 2 tranches d'avance par processus
+            pending = deque()
+            for shard, start, count in shards:
+                pending.append(executor.submit(_generate_shard, params, basin_list, shard, start,
+                                               count, batch_size, compresslevel))
+                if len(pending) >= 2 * workers:
+                    out.write(pending.popleft().result())
+            while pending:
+                out.write(pending.popleft().result())
+        out.write(gzip.compress(FEATURE_COLLECTION_FOOTER.encode('utf-8'), compresslevel, mtime=0))
+    os.replace(tmp_path, filename)
+    return feature_count
+
+def main():
+    parser = argparse.ArgumentParser(description='Générer des fichiers GeoJSON de test')
+    parser.add_argument('--large', '-l', metavar='FICHIER',
+                        help="Générer un grand fichier .geojson.gz au schéma réel (sinon : fichiers d'exemple)")
+    parser.add_argument('--count', '-n', type=int, default=1000000,
+                        help='Nombre de features du grand fichier (défaut : 1000000)')
+    parser.add_argument('--seed', '-s', type=int, default=0,
+                        help='Graine du générateur (défaut : 0)')
+    parser.add_argument('--country', '-c', default='ITALY', choices=list(COUNTRY_BOUNDS),
+                        help='Pays simulé (défaut : ITALY)')
+    parser.add_argument('--distribution', '-d', default='clustered', choices=['clustered', 'uniform'],
+                        help='Répartition spatiale des points (défaut : clustered)')
+    parser.add_argument('--basins', type=int, default=200,
+                        help='Nombre de bassins simulés (défaut : 200)')
+    parser.add_argument('--workers', '-w', type=int, default=os.cpu_count(),
+                        help='Nombre de processus (défaut : nombre de CPU)')
+    parser.add_argument('--compresslevel', type=int, default=6,
+                        help='Niveau de compression gzip (défaut : 6)')
+    
+    args = parser.parse_args()
+    
+    if not args.large:
+        generate_sample_files()
+        return
+    
+    start = time.perf_counter()
+    count = generate_large_geojson(args.large, args.count, args.seed, args.country,
+                                   distribution=args.distribution, basins=args.basins,
+                                   workers=args.workers, compresslevel=args.compresslevel)
+    elapsed = time.perf_counter() - start
+    print(f"Fichier créé : {args.large} avec {count} features en {elapsed:.1f} s "
+          f"({count / elapsed:,.0f} features/s, {os.path.getsize(args.large) / 1024 / 1024:.1f} MB)")
+
 if __name__ == "__main__":
-    generate_sample_files()
\ No newline at end of file
+    main()
\ No newline at end of file
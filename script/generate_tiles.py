@@ -0,0 +1,279 @@
+import os
+import math
+import gzip
+import json
+import time
+import argparse
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+from geojson_stream import iter_features
+from property_schema import get_profile, guess_category, normalize_properties
+
+# Limite de latitude de la projection Web Mercator
+MAX_LATITUDE = 85.05112878
+
+DEFAULT_MIN_ZOOM = 0
+DEFAULT_MAX_ZOOM = 14
+
+# Taille d'une cellule de regroupement, en pixels d'une tuile de 256 px
+DEFAULT_CLUSTER_RADIUS = 32
+
+# Propriété dont les effectifs sont détaillés dans les groupes
+CLUSTER_COUNT_PROPERTY = "LabelAtlas"
+
+
+def lonlat_to_tile(lon, lat, zoom):
+    """Position (x, y) fractionnaire d'un point dans la grille de tuiles d'un zoom"""
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    n = 2 ** zoom
+    x = (lon + 180.0) / 360.0 * n
+    lat_rad = math.radians(lat)
+    y = (1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n
+    return min(max(x, 0.0), n - 1e-9), min(max(y, 0.0), n - 1e-9)
+
+
+def tile_bounds(x, y, zoom):
+    """Emprise [ouest, sud, est, nord] d'une tuile"""
+    n = 2 ** zoom
+
+    def tile_lat(ty):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return [x / n * 360.0 - 180.0, tile_lat(y + 1), (x + 1) / n * 360.0 - 180.0, tile_lat(y)]
+
+
+@lru_cache(maxsize=2)
+def load_points(file_path):
+    """
+    Charge les points d'un fichier (mis en cache dans chaque processus, qui
+    traite plusieurs zooms du même fichier)
+
+    Le profil de propriétés de la catégorie est appliqué pour que les
+    tuiles ne portent pas les colonnes redondantes.
+
+    Returns:
+        Liste de features ponctuelles
+    """
+    profile = get_profile(guess_category(file_path))
+    if file_path.endswith('.gz'):
+        source = gzip.open(file_path, 'rt', encoding='utf-8')
+    else:
+        source = open(file_path, 'r', encoding='utf-8')
+    points = []
+    with source:
+        for feature in iter_features(source):
+            if (feature.get("geometry") or {}).get("type") != "Point":
+                continue
+            feature["properties"] = normalize_properties(feature.get("properties") or {}, profile)
+            points.append(feature)
+    return points
+
+
+def _cluster_feature(features):
+    """Feature représentant un groupe de points"""
+    lon = sum(f["geometry"]["coordinates"][0] for f in features) / len(features)
+    lat = sum(f["geometry"]["coordinates"][1] for f in features) / len(features)
+    counts = {}
+    for feature in features:
+        key = (feature.get("properties") or {}).get(CLUSTER_COUNT_PROPERTY)
+        counts[key] = counts.get(key, 0) + 1
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [round(lon, 6), round(lat, 6)]},
+        "properties": {
+            "cluster": True,
+            "point_count": len(features),
+            "counts": counts
+        }
+    }
+
+
+def build_zoom(file_path, output_dir, zoom, max_zoom, cluster_radius=DEFAULT_CLUSTER_RADIUS,
+               write_gzip=False):
+    """
+    Écrit toutes les tuiles d'un fichier pour un niveau de zoom
+
+    En dessous du zoom maximal, les points d'une même cellule de
+    cluster_radius pixels sont fusionnés en un groupe ; au zoom maximal,
+    toutes les features sont écrites telles quelles.
+
+    Returns:
+        Dictionnaire (zoom, tiles, bytes)
+    """
+    features = load_points(file_path)
+    cells_per_tile = max(1, 256 // cluster_radius)
+    clustered = zoom < max_zoom
+
+    # Répartir les points par tuile (et par cellule si regroupement)
+    tiles = {}
+    for feature in features:
+        lon, lat = feature["geometry"]["coordinates"][:2]
+        x, y = lonlat_to_tile(lon, lat, zoom)
+        tile = (int(x), int(y))
+        if clustered:
+            cell = (int((x - tile[0]) * cells_per_tile), int((y - tile[1]) * cells_per_tile))
+            tiles.setdefault(tile, {}).setdefault(cell, []).append(feature)
+        else:
+            tiles.setdefault(tile, []).append(feature)
+
+    total_bytes = 0
+    for (x, y), content in tiles.items():
+        if clustered:
+            tile_features = [group[0] if len(group) == 1 else _cluster_feature(group)
+                             for group in content.values()]
+        else:
+            tile_features = content
+
+        tile_dir = os.path.join(output_dir, str(zoom), str(x))
+        os.makedirs(tile_dir, exist_ok=True)
+        data = json.dumps({"type": "FeatureCollection", "features": tile_features},
+                          ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        tile_path = os.path.join(tile_dir, f"{y}.geojson")
+        with open(tile_path, 'wb') as f:
+            f.write(data)
+        if write_gzip:
+            with gzip.open(f"{tile_path}.gz", 'wb') as f:
+                f.write(data)
+        total_bytes += len(data)
+
+    return {"zoom": zoom, "tiles": len(tiles), "bytes": total_bytes}
+
+
+def dataset_name(file_path):
+    """Nom du jeu de données d'un fichier (sans extension)"""
+    name = os.path.basename(file_path)
+    for extension in ('.gz', '.geojson'):
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+    return name
+
+
+def write_tilejson(output_dir, relative_dir, file_path, min_zoom, max_zoom, base_url=None):
+    """
+    Écrit le descripteur tiles.json (format TileJSON) d'une pyramide
+
+    Sans base_url, le modèle d'URL est relatif au descripteur (rangé dans le
+    dossier de la pyramide) ; sinon il est absolu :
+    <base_url>/<relative_dir>/{z}/{x}/{y}.geojson.
+    """
+    template = "{z}/{x}/{y}.geojson"
+    if base_url:
+        template = f"{base_url.rstrip('/')}/{relative_dir}/{template}"
+    features = load_points(file_path)
+    lons = [f["geometry"]["coordinates"][0] for f in features]
+    lats = [f["geometry"]["coordinates"][1] for f in features]
+    tilejson = {
+        "tilejson": "3.0.0",
+        "name": dataset_name(file_path),
+        "tiles": [template],
+        "minzoom": min_zoom,
+        "maxzoom": max_zoom,
+        "bounds": [min(lons), min(lats), max(lons), max(lats)] if features else None,
+        "features": len(features)
+    }
+    with open(os.path.join(output_dir, "tiles.json"), 'w', encoding='utf-8') as f:
+        json.dump(tilejson, f, indent=2)
+
+
+def generate_tiles(data_dir="data", tiles_dir="tiles", categories=('countries', 'types'),
+                   min_zoom=DEFAULT_MIN_ZOOM, max_zoom=DEFAULT_MAX_ZOOM,
+                   cluster_radius=DEFAULT_CLUSTER_RADIUS, workers=None, write_gzip=False,
+                   base_url=None):
+    """
+    Génère les pyramides de tuiles z/x/y de tous les fichiers des catégories
+
+    Chaque couple (fichier, zoom) est une tâche du pool de processus. Le
+    descripteur tiles.json d'un fichier dont un zoom a échoué n'est pas
+    publié (l'ancien est supprimé) : il annoncerait des tuiles absentes.
+    base_url rend absolu le modèle d'URL des descripteurs (voir write_tilejson).
+
+    Returns:
+        Liste des dossiers de pyramides générées (sans les pyramides incomplètes)
+    """
+    # Trouver les fichiers sources (le .geojson est préféré au .geojson.gz)
+    sources = {}
+    for category in categories:
+        category_dir = os.path.join(data_dir, category)
+        if not os.path.isdir(category_dir):
+            continue
+        for file in sorted(os.listdir(category_dir)):
+            if file.endswith('.geojson') or file.endswith('.geojson.gz'):
+                key = (category, dataset_name(file))
+                if key not in sources or file.endswith('.geojson'):
+                    sources[key] = os.path.join(category_dir, file)
+
+    print(f"Trouvé {len(sources)} fichiers, zooms {min_zoom} à {max_zoom}")
+    start = time.perf_counter()
+
+    outputs = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for (category, name), file_path in sources.items():
+            output_dir = os.path.join(tiles_dir, category, name)
+            outputs[output_dir] = (category, name, file_path)
+            # Les zooms élevés (plus coûteux) sont soumis en premier
+            for zoom in range(max_zoom, min_zoom - 1, -1):
+                futures.append((file_path, executor.submit(
+                    build_zoom, file_path, output_dir, zoom, max_zoom, cluster_radius, write_gzip)))
+
+        totals = {}
+        failed = set()
+        for file_path, future in futures:
+            try:
+                stats = future.result()
+            except Exception as e:
+                print(f"Erreur lors du découpage de {file_path}: {e}")
+                failed.add(file_path)
+                continue
+            tiles, size = totals.get(file_path, (0, 0))
+            totals[file_path] = (tiles + stats["tiles"], size + stats["bytes"])
+
+    for output_dir, (category, name, file_path) in outputs.items():
+        if file_path in failed:
+            tilejson_path = os.path.join(output_dir, "tiles.json")
+            if os.path.exists(tilejson_path):
+                os.remove(tilejson_path)
+            print(f"  {output_dir}: incomplet, tiles.json non publié")
+            continue
+        write_tilejson(output_dir, f"{category}/{name}", file_path, min_zoom, max_zoom, base_url)
+        tiles, size = totals.get(file_path, (0, 0))
+        average = size / tiles / 1024 if tiles else 0
+        print(f"  {output_dir}: {tiles} tuiles, {size / 1024:.1f} KB (moyenne {average:.1f} KB)")
+
+    print(f"Génération des tuiles terminée en {time.perf_counter() - start:.2f} s")
+    return [output_dir for output_dir, (_, _, file_path) in outputs.items() if file_path not in failed]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Générer les tuiles z/x/y des fichiers GeoJSON')
+    parser.add_argument('--data-dir', '-d', default='data',
+                        help='Répertoire des données (défaut : data)')
+    parser.add_argument('--output-dir', '-o', default='tiles',
+                        help='Répertoire des tuiles (défaut : tiles)')
+    parser.add_argument('--categories', '-c', nargs='+', default=['countries', 'types'],
+                        choices=['types', 'countries', 'regions'],
+                        help='Catégories à découper')
+    parser.add_argument('--min-zoom', type=int, default=DEFAULT_MIN_ZOOM,
+                        help='Zoom minimal')
+    parser.add_argument('--max-zoom', '-z', type=int, default=DEFAULT_MAX_ZOOM,
+                        help='Zoom maximal (features complètes, sans regroupement)')
+    parser.add_argument('--cluster-radius', '-r', type=int, default=DEFAULT_CLUSTER_RADIUS,
+                        help='Taille des cellules de regroupement en pixels')
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                        help='Nombre de processus (défaut : nombre de CPU)')
+    parser.add_argument('--gzip', action='store_true',
+                        help='Écrire aussi une version .gz de chaque tuile')
+    parser.add_argument('--base-url', '-u',
+                        help='URL du dossier des tuiles, pour des modèles d\'URL absolus dans '
+                             'tiles.json (défaut : modèle relatif au descripteur)')
+
+    args = parser.parse_args()
+
+    generate_tiles(args.data_dir, args.output_dir, args.categories, args.min_zoom,
+                   args.max_zoom, args.cluster_radius, args.workers, args.gzip,
+                   args.base_url)
+
+
+if __name__ == "__main__":
+    main()
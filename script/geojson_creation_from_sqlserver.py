@@ -1,65 +1,161 @@
 import pyodbc
-import geojson
-import gzip
-import json
-import decimal
-from decimal import Decimal
+import argparse
+
+from geojson_stream import (DEFAULT_BATCH_SIZE, SERIALIZERS, fetch_in_batches, json_value,
+                            write_geojson_files)
+from metrics import NO_METRICS, add_metrics_arguments, metrics_from_args
+from query_planner import add_filter_arguments, build_select, filters_from_args
+from geojson_seq import open_seq, seq_paths_for
+
+# Décimales conservées par défaut, comme geojson.Point utilisé auparavant
+# pour construire les features ; une précision demandée la remplace
+GEOJSON_PRECISION = 6
 
 # 1. Connexion SQL Server (modifie selon ton serveur)
 conn_str = (
-    r'DRIVER={SQL Server};'  
-    r'SERVER=.;'   
-    r'DATABASE=AMBER_202412_website;'   
+    r'DRIVER={SQL Server};'
+    r'SERVER=.;'
+    r'DATABASE=AMBER_202412_website;'
     r'Trusted_Connection=yes;'  # Pour l'authentification Windows
 )
 
-conn = pyodbc.connect(conn_str)
-cursor = conn.cursor()
-
-# 2. Requête pour récupérer les points
-cursor.execute("""
-    SELECT id, latitude, longitude, LabelAtlas, country
-    FROM atlas
-    WHERE latitude IS NOT NULL AND longitude IS NOT NULL
-""")
-
-features = []
-
-# 3. Construire les features GeoJSON
-for row in cursor.fetchall():
-    id_, lat, lon, typ, country = row
-    point = geojson.Point((lon, lat))  # longitude, latitude
-    properties = {
-        "id": id_,
-        "type": typ,
-        "country": country
-    }
-    feature = geojson.Feature(geometry=point, properties=properties)
-    features.append(feature)
-
-# 4. Créer la FeatureCollection
-feature_collection = {
-    "type": "FeatureCollection",
-    "features": features
-}
-
-# 5. Écrire dans un fichier GeoJSON non compressé
-output_file = "atlas.geojson"
-with open(output_file, 'w', encoding='utf-8') as f:
-    # Option 1: Utiliser default
-    json.dump(feature_collection, f, ensure_ascii=False, indent=2, 
-              default=lambda o: float(o) if isinstance(o, Decimal) else str(o))
-    
-    # OU Option 2: Utiliser un encodeur personnalisé
-    class DecimalEncoder(json.JSONEncoder):
-        def default(self, obj):
-            if isinstance(obj, Decimal):
-                return float(obj)
-            return super(DecimalEncoder, self).default(obj)
-    json.dump(feature_collection, f, ensure_ascii=False, indent=2, cls=DecimalEncoder)
-
-# 6. Écrire le même fichier compressé en gzip
-with gzip.open("atlas.geojson.gz", "wt", encoding="utf-8") as f:
-    geojson.dump(feature_collection, f, ensure_ascii=False, cls=DecimalEncoder)
-
-print("Export GeoJSON et compression terminés.")
+# Colonnes lues dans la table atlas (le point binaire n'est pas transféré)
+ATLAS_COLUMNS = ("id", "latitude", "longitude", "LabelAtlas", "country")
+ATLAS_FILTER_COLUMNS = {"type": "LabelAtlas", "country": "country"}
+
+
+def build_atlas_query(filters=None):
+    """
+    Requête paramétrée de la table atlas : coordonnées valides et filtres
+    (emprise, types, pays, intervalle d'identifiants) évalués par le serveur
+
+    Returns:
+        Tuple (requête, paramètres) à passer à cursor.execute
+    """
+    return build_select("atlas", ATLAS_COLUMNS, "latitude", "longitude", filters,
+                        ATLAS_FILTER_COLUMNS, "id")
+
+
+def iter_atlas_features(cursor, batch_size=DEFAULT_BATCH_SIZE, precision=None, metrics=NO_METRICS,
+                        filters=None):
+    """
+    Génère les features GeoJSON de la table atlas, lot par lot
+
+    Args:
+        cursor: Curseur pyodbc
+        batch_size: Nombre de lignes récupérées par fetchmany
+        precision: Nombre de décimales des coordonnées (None : 6 décimales, comme geojson.Point)
+        metrics: Mesures (étapes "query" et "fetch"), voir metrics.Metrics
+        filters: Filtres évalués par le serveur (voir query_planner.build_where)
+    """
+    if precision is None:
+        precision = GEOJSON_PRECISION
+
+    # 2. Requête pour récupérer les points (coordonnées validées par le serveur)
+    with metrics.stage("query"):
+        cursor.execute(*build_atlas_query(filters))
+
+    # 3. Construire les features GeoJSON : dictionnaires construits
+    # directement depuis la ligne, sans objets geojson intermédiaires
+    for id_, lat, lon, typ, country in fetch_in_batches(cursor, batch_size, metrics):
+        # Decimal converti ici plutôt que par le sérialiseur
+        lat = float(lat)
+        lon = float(lon)
+        yield {
+            "type": "Feature",
+            "geometry": {"type": "Point",  # longitude, latitude
+                         "coordinates": [round(lon, precision), round(lat, precision)]},
+            "properties": {"id": json_value(id_), "type": typ, "country": country}
+        }
+
+
+def export_atlas(cursor, output_file="atlas.geojson", batch_size=DEFAULT_BATCH_SIZE,
+                 precision=None, metrics=NO_METRICS, indent=None, serializer=None, filters=None,
+                 seq=False):
+    """
+    Exporte la table atlas en GeoJSON et en GeoJSON gzip en une seule passe
+
+    Les features sont écrites au fur et à mesure dans les deux fichiers :
+    la mémoire utilisée ne dépend pas du nombre de lignes. Les étapes sont
+    mesurées dans metrics (voir geojson_stream.write_geojson_files). Le
+    fichier .geojson est compact sauf si une indentation est demandée. Avec
+    seq, le fichier par blocs .geojsonl.gz et son index sont écrits dans la
+    même passe (voir geojson_seq).
+
+    Returns:
+        Nombre de features exportées
+    """
+    compressed_file = f"{output_file}.gz"
+
+    # 4-6. Écrire le fichier non compressé et le fichier gzip en parallèle
+    features = iter_atlas_features(cursor, batch_size, precision, metrics, filters)
+    if not seq:
+        return write_geojson_files(features, output_file, compressed_file, metrics, indent,
+                                   serializer)
+    with open_seq(*seq_paths_for(output_file)) as seq_writer:
+        return write_geojson_files(features, output_file, compressed_file, metrics, indent,
+                                   serializer, seq_writer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exporter la table atlas en GeoJSON')
+    parser.add_argument('--output', '-o', default='atlas.geojson',
+                        help='Fichier GeoJSON de sortie')
+    parser.add_argument('--batch-size', '-b', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='Nombre de lignes récupérées par lot (fetchmany)')
+    parser.add_argument('--manifest', '-m',
+                        help="Manifeste d'export : les fichiers ne sont réécrits que si leur contenu a changé")
+    parser.add_argument('--precision', type=int,
+                        help='Nombre de décimales des coordonnées (défaut : 6)')
+    parser.add_argument('--indent', type=int,
+                        help='Indentation du fichier .geojson (défaut : compact)')
+    parser.add_argument('--serializer', '-s', choices=list(SERIALIZERS),
+                        help='Sérialiseur JSON (défaut : le plus rapide installé)')
+    parser.add_argument('--seq', action='store_true',
+                        help='Écrire aussi les features par lignes en blocs gzip indexés (.geojsonl.gz)')
+    add_filter_arguments(parser)
+    add_metrics_arguments(parser)
+
+    args = parser.parse_args()
+    if args.manifest and args.seq:
+        parser.error("--seq n'est pas disponible avec --manifest")
+    filters = filters_from_args(args)
+
+    with metrics_from_args(args, "geojson_creation_from_sqlserver") as metrics:
+        with metrics.stage("connect"):
+            conn = pyodbc.connect(conn_str)
+            cursor = conn.cursor()
+
+        if args.manifest:
+            from incremental_export import export_options, load_manifest, save_manifest, write_if_changed
+
+            manifest = load_manifest(args.manifest)
+            tables = manifest.setdefault("tables", {})
+            previous = tables.get("atlas")
+            options = export_options(None, args.precision, args.indent, args.serializer)
+            if previous and previous.get("options") != options:
+                # Fichiers produits avec d'autres options : réécrits même si
+                # le contenu compact est identique
+                previous = {"rows": previous.get("rows", {}), "features": previous.get("features")}
+            features = iter_atlas_features(cursor, args.batch_size, args.precision, metrics,
+                                           filters)
+            entry, stats = write_if_changed(metrics.timed_iter(features, "build"),
+                                            lambda feature: feature["properties"]["id"],
+                                            args.output, f"{args.output}.gz", previous,
+                                            args.indent, args.serializer)
+            entry["options"] = options
+            tables["atlas"] = entry
+            save_manifest(manifest, args.manifest)
+            count = entry["features"]
+            if not stats["written"]:
+                print("Contenu identique au précédent export, fichiers conservés.")
+        else:
+            count = export_atlas(cursor, args.output, args.batch_size, args.precision, metrics,
+                                 args.indent, args.serializer, filters, args.seq)
+        metrics.event("table_exported", table="atlas", features=count)
+    print(f"{count} features exportées.")
+    print("Export GeoJSON et compression terminés.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+import os
+import gzip
+import json
+import mmap
+import time
+import zlib
+import argparse
+import urllib.request
+from contextlib import contextmanager
+
+from geojson_stream import encode_feature, iter_features
+
+# Features une par ligne (GeoJSON délimité par des retours à la ligne),
+# compressées par blocs gzip indépendants
+SEQ_EXTENSION = '.geojsonl.gz'
+
+# Index JSON des blocs (position et taille de chaque membre gzip)
+INDEX_EXTENSION = '.geojsonl.idx'
+
+# Taille visée (non compressée) d'un bloc : un bloc est la plus petite unité
+# téléchargée et décompressée par un lecteur
+DEFAULT_BLOCK_SIZE = 256 * 1024
+
+# Champs de chaque bloc de l'index, dans l'ordre
+BLOCK_FIELDS = ["offset", "length", "first", "count", "min_x", "min_y", "max_x", "max_y"]
+
+
+def seq_paths_for(file_path):
+    """
+    Chemins du fichier par blocs et de son index pour un GeoJSON ou une URL
+    (data/x.geojson.gz -> data/x.geojsonl.gz, data/x.geojsonl.idx)
+    """
+    name = file_path
+    for extension in ('.gz', '.geojsonl', '.geojson'):
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+    return name + SEQ_EXTENSION, name + INDEX_EXTENSION
+
+
+class SeqWriter:
+    """
+    Écrit des features une par ligne, par blocs gzip indépendants
+
+    Chaque bloc est un membre gzip complet contenant des lignes entières :
+    il peut être téléchargé (requête HTTP Range) et décompressé seul. Le
+    fichier complet reste un gzip valide (membres concaténés) que gzip.open
+    ou zcat lisent d'un bout à l'autre. L'index (voir index) donne la
+    position, le nombre de features et l'emprise de chaque bloc.
+
+    Args:
+        fileobj: Fichier binaire ouvert en écriture
+        block_size: Taille visée d'un bloc avant compression
+        compresslevel: Niveau de compression gzip
+    """
+
+    def __init__(self, fileobj, block_size=DEFAULT_BLOCK_SIZE, compresslevel=9):
+        self.fileobj = fileobj
+        self.block_size = block_size
+        self.compresslevel = compresslevel
+        self.count = 0
+        self.size = 0
+        self.blocks = []
+        self._lines = []
+        self._pending = 0
+        self._bbox = None
+        self._bbox_known = True
+
+    def write(self, feature):
+        """Ajoute une feature"""
+        self.write_encoded(encode_feature(feature), feature)
+
+    def write_encoded(self, text, feature=None):
+        """
+        Ajoute une feature déjà encodée (texte compact, sans retour à la ligne)
+
+        Args:
+            text: Feature encodée par encode_feature sans indentation
+            feature: Feature d'origine, pour l'emprise du bloc (inconnue
+                si absente)
+        """
+        self._lines.append(text)
+        self._pending += len(text) + 1
+        self.count += 1
+        self._extend_bbox(feature)
+        if self._pending >= self.block_size:
+            self._flush()
+
+    def _extend_bbox(self, feature):
+        geometry = feature.get("geometry") if feature is not None else None
+        if geometry is None or geometry.get("type") != "Point":
+            # Une géométrie nulle n'agrandit pas l'emprise ; un autre type la rend inconnue
+            if feature is None or geometry is not None:
+                self._bbox_known = False
+            return
+        x, y = geometry["coordinates"][:2]
+        if self._bbox is None:
+            self._bbox = [x, y, x, y]
+        else:
+            bbox = self._bbox
+            bbox[0], bbox[1] = min(bbox[0], x), min(bbox[1], y)
+            bbox[2], bbox[3] = max(bbox[2], x), max(bbox[3], y)
+
+    def _flush(self):
+        if not self._lines:
+            return
+        data = ('\n'.join(self._lines) + '\n').encode('utf-8')
+        # En-tête gzip sans date : deux exports du même contenu sont identiques
+        compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        block = compressor.compress(data) + compressor.flush()
+        self.fileobj.write(block)
+
+        bbox = self._bbox if self._bbox_known and self._bbox else [None] * 4
+        self.blocks.append([self.size, len(block), self.count - len(self._lines), len(self._lines)]
+                           + bbox)
+        self.size += len(block)
+        self._lines = []
+        self._pending = 0
+        self._bbox = None
+        self._bbox_known = True
+
+    def close(self):
+        """Écrit le dernier bloc (le fichier reste ouvert)"""
+        self._flush()
+
+    def index(self):
+        """Index des blocs écrits (dictionnaire sérialisable en JSON)"""
+        return {
+            "version": 1,
+            "features": self.count,
+            "size": self.size,
+            "fields": BLOCK_FIELDS,
+            "blocks": self.blocks
+        }
+
+
+@contextmanager
+def open_seq(output_file, index_file=None, block_size=DEFAULT_BLOCK_SIZE, compresslevel=9):
+    """
+    Ouvre un SeqWriter sur un fichier .geojsonl.gz
+
+    Le fichier et son index sont écrits dans des fichiers temporaires puis
+    renommés à la sortie du bloc with (l'index en dernier) : un lecteur ne
+    voit jamais un index décrivant un autre fichier. En cas d'erreur, les
+    fichiers temporaires sont supprimés.
+    """
+    if index_file is None:
+        index_file = seq_paths_for(output_file)[1]
+    with open(f"{output_file}.tmp", 'wb') as f:
+        writer = SeqWriter(f, block_size, compresslevel)
+        try:
+            yield writer
+            writer.close()
+        except BaseException:
+            f.close()
+            os.remove(f"{output_file}.tmp")
+            raise
+    with open(f"{index_file}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(writer.index(), f, separators=(',', ':'))
+    os.replace(f"{output_file}.tmp", output_file)
+    os.replace(f"{index_file}.tmp", index_file)
+
+
+def write_seq(features, output_file, index_file=None, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Écrit des features dans un fichier .geojsonl.gz et son index
+
+    Returns:
+        Nombre de features écrites
+    """
+    with open_seq(output_file, index_file, block_size) as writer:
+        for feature in features:
+            writer.write(feature)
+    return writer.count
+
+
+def _spatial_order(features):
+    """
+    Features triées le long de la courbe de Hilbert (spatial_index.hilbert_sort),
+    celles sans géométrie ponctuelle en dernier
+    """
+    # Import local : spatial_index importe compress_geojson_file, qui importe ce module
+    from spatial_index import hilbert_sort
+
+    points, others = [], []
+    for feature in features:
+        geometry = feature.get("geometry") or {}
+        (points if geometry.get("type") == "Point" else others).append(feature)
+    return hilbert_sort(points) + others
+
+
+def convert_file(source, destination=None, block_size=DEFAULT_BLOCK_SIZE, sort=True):
+    """
+    Convertit un fichier .geojson ou .geojson.gz en fichier par blocs
+
+    Avec sort, les features sont triées le long de la courbe de Hilbert
+    avant d'être découpées en blocs : chaque bloc couvre alors une petite
+    emprise et SeqReader.blocks_in_bbox (ou loadGeoJSONSeq avec bbox) ne
+    télécharge que les blocs utiles. Le fichier est alors chargé en mémoire.
+    Sans tri, les blocs suivent l'ordre du fichier source et n'écartent
+    presque rien, sauf si la source est déjà triée (voir spatial_index).
+
+    Returns:
+        Dictionnaire (path, index, features, blocks, size)
+    """
+    if destination is None:
+        destination = seq_paths_for(source)[0]
+    index_file = seq_paths_for(destination)[1]
+    if source.endswith('.gz'):
+        f = gzip.open(source, 'rt', encoding='utf-8')
+    else:
+        f = open(source, 'r', encoding='utf-8')
+    with f:
+        features = iter_features(f)
+        if sort:
+            features = _spatial_order(features)
+        with open_seq(destination, index_file, block_size) as writer:
+            for feature in features:
+                writer.write(feature)
+    return {
+        "path": destination,
+        "index": index_file,
+        "features": writer.count,
+        "blocks": len(writer.blocks),
+        "size": writer.size
+    }
+
+
+def _is_url(location):
+    return location.startswith(('http://', 'https://'))
+
+
+def _http_get(url, headers=None):
+    request = urllib.request.Request(url, headers=headers or {})
+    with urllib.request.urlopen(request) as response:
+        return response.status, response.read()
+
+
+def load_index(location):
+    """Lit un index de blocs (chemin local ou URL)"""
+    if _is_url(location):
+        return json.loads(_http_get(location)[1])
+    with open(location, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class SeqReader:
+    """
+    Lecteur d'un fichier par blocs, local (projeté en mémoire) ou distant
+    (un bloc par requête HTTP Range)
+
+    Seul le bloc en cours de décodage est en mémoire : le premier bloc est
+    affiché sans attendre le reste du fichier::
+
+        with SeqReader("https://.../data/countries/tbFRANCE.geojsonl.gz") as reader:
+            for block in reader.blocks_in_bbox(-5, 41, 10, 51):
+                draw(reader.block(block))
+
+    Args:
+        location: Chemin ou URL du fichier .geojsonl.gz
+        index: Index déjà chargé, chemin ou URL de l'index (défaut : à côté
+            du fichier, voir seq_paths_for)
+    """
+
+    def __init__(self, location, index=None):
+        self.location = location
+        if index is None:
+            index = seq_paths_for(location)[1]
+        self.index = index if isinstance(index, dict) else load_index(index)
+        self.features = self.index["features"]
+        fields = self.index.get("fields", BLOCK_FIELDS)
+        self.blocks = [dict(zip(fields, block)) for block in self.index["blocks"]]
+        self._mmap = None
+        if not _is_url(location):
+            with open(location, 'rb') as f:
+                if os.fstat(f.fileno()).st_size:
+                    self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        """Libère la projection du fichier local"""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def read_raw(self, block):
+        """Octets compressés d'un bloc (un membre gzip)"""
+        info = self.blocks[block]
+        offset, length = info["offset"], info["length"]
+        if self._mmap is not None:
+            return self._mmap[offset:offset + length]
+        status, data = _http_get(self.location, {"Range": f"bytes={offset}-{offset + length - 1}"})
+        if status != 206:
+            raise ValueError(f"Le serveur ne gère pas les requêtes Range : {self.location}")
+        return data
+
+    def lines(self, block):
+        """Lignes JSON (texte) d'un bloc"""
+        # split et non splitlines : les chaînes JSON peuvent contenir U+2028, \x85...
+        return gzip.decompress(self.read_raw(block)).decode('utf-8').split('\n')
+
+    def block(self, block):
+        """Features d'un bloc"""
+        return [json.loads(line) for line in self.lines(block) if line]
+
+    def blocks_in_bbox(self, min_x, min_y, max_x, max_y):
+        """Blocs pouvant contenir des features dans une emprise (emprise inconnue : inclus)"""
+        return [i for i, block in enumerate(self.blocks)
+                if block.get("min_x") is None
+                or not (block["min_x"] > max_x or block["min_y"] > max_y
+                        or block["max_x"] < min_x or block["max_y"] < min_y)]
+
+    def iter_features(self, blocks=None):
+        """Features une par une, bloc par bloc (tous les blocs par défaut)"""
+        if blocks is None:
+            blocks = range(len(self.blocks))
+        for block in blocks:
+            yield from self.block(block)
+
+
+def benchmark(file_path, repeat=3):
+    """
+    Compare le temps jusqu'à la première feature d'un .geojson.gz et de son
+    fichier par blocs, ainsi que le temps de lecture complète
+
+    Returns:
+        Dictionnaire des tailles (octets) et des meilleurs temps (secondes)
+    """
+    seq_file, index_file = seq_paths_for(file_path)
+
+    def best(function):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def geojson_first():
+        # json.load doit décoder le document entier avant la première feature
+        with gzip.open(file_path, 'rt', encoding='utf-8') as f:
+            json.load(f)["features"][:1]
+
+    def geojson_stream_first():
+        with gzip.open(file_path, 'rt', encoding='utf-8') as f:
+            next(iter_features(f), None)
+
+    def geojson_stream_all():
+        with gzip.open(file_path, 'rt', encoding='utf-8') as f:
+            for _ in iter_features(f):
+                pass
+
+    def seq_first():
+        with SeqReader(seq_file, index_file) as reader:
+            if reader.blocks:
+                reader.block(0)[:1]
+
+    def seq_all():
+        with SeqReader(seq_file, index_file) as reader:
+            for _ in reader.iter_features():
+                pass
+
+    index = load_index(index_file)
+    first_block = index["blocks"][0][1] if index["blocks"] else 0
+    return {
+        "geojson_gz_size": os.path.getsize(file_path),
+        "seq_size": os.path.getsize(seq_file),
+        "index_size": os.path.getsize(index_file),
+        # Octets à télécharger avant de pouvoir afficher la première feature
+        "seq_first_bytes": os.path.getsize(index_file) + first_block,
+        "blocks": len(index["blocks"]),
+        "geojson_gz_first": best(geojson_first),
+        "geojson_gz_stream_first": best(geojson_stream_first),
+        "seq_first": best(seq_first),
+        "geojson_gz_stream_all": best(geojson_stream_all),
+        "seq_all": best(seq_all)
+    }
+
+
+def print_benchmark(file_path, stats):
+    """Affiche le résultat de benchmark pour un fichier"""
+    print(f"  Taille : .geojson.gz {stats['geojson_gz_size'] / 1024:.1f} KB, "
+          f".geojsonl.gz {stats['seq_size'] / 1024:.1f} KB ({stats['blocks']} blocs), "
+          f"index {stats['index_size'] / 1024:.1f} KB")
+    print(f"  Octets avant la première feature : {stats['geojson_gz_size'] / 1024:.1f} KB "
+          f"-> {stats['seq_first_bytes'] / 1024:.1f} KB")
+    print(f"  Première feature, json.load           : {stats['geojson_gz_first'] * 1000:.1f} ms")
+    print(f"  Première feature, iter_features       : {stats['geojson_gz_stream_first'] * 1000:.1f} ms")
+    print(f"  Première feature, blocs               : {stats['seq_first'] * 1000:.1f} ms")
+    print(f"  Lecture complète, iter_features       : {stats['geojson_gz_stream_all'] * 1000:.1f} ms")
+    print(f"  Lecture complète, blocs               : {stats['seq_all'] * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convertir les GeoJSON en features par lignes, par blocs gzip indexés')
+    parser.add_argument('--file', '-f', help='Fichier .geojson ou .geojson.gz à convertir')
+    parser.add_argument('--directory', '-d', default='data',
+                        help='Répertoire à convertir (défaut : data)')
+    parser.add_argument('--block-size', '-s', type=int, default=DEFAULT_BLOCK_SIZE,
+                        help='Taille visée des blocs avant compression (octets)')
+    parser.add_argument('--benchmark', '-b', action='store_true',
+                        help='Comparer le temps jusqu\'à la première feature au .geojson.gz')
+    parser.add_argument('--no-sort', action='store_true',
+                        help="Garder l'ordre du fichier source (sans tri spatial, les blocs "
+                             "n'écartent presque rien dans une recherche par emprise)")
+
+    args = parser.parse_args()
+
+    if args.file:
+        files = [args.file]
+    else:
+        files = [os.path.join(root, name)
+                 for root, _, names in os.walk(args.directory)
+                 for name in sorted(names) if name.endswith('.geojson.gz')]
+
+    for file_path in files:
+        try:
+            info = convert_file(file_path, block_size=args.block_size, sort=not args.no_sort)
+        except Exception as e:
+            print(f"Erreur lors de la conversion de {file_path}: {e}")
+            continue
+        print(f"{file_path} -> {info['path']} ({info['features']} features, {info['blocks']} blocs, "
+              f"{os.path.getsize(file_path) / 1024:.1f} KB -> {info['size'] / 1024:.1f} KB)")
+        if args.benchmark and file_path.endswith('.gz'):
+            print_benchmark(file_path, benchmark(file_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+import os
+import gzip
+import codecs
+import json
+import shutil
+from decimal import Decimal
+
+from metrics import NO_METRICS
+
+# Encodeur JSON rapide optionnel : la bibliothèque standard est utilisée
+# s'il n'est pas installé
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Nombre de lignes récupérées à chaque appel de fetchmany
+DEFAULT_BATCH_SIZE = 5000
+
+
+def json_value(value):
+    """
+    Convertit une valeur lue en base en valeur JSON native
+
+    Appelée pendant la conversion des lignes, pour que les sérialiseurs
+    n'aient aucun type particulier à traiter : Decimal devient float et les
+    binaires sont écrits en hexadécimal.
+    """
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    return value
+
+
+def _default(obj):
+    # Filet de sécurité pour les valeurs non converties par json_value
+    converted = json_value(obj)
+    if converted is obj:
+        raise TypeError(f"Type non sérialisable en JSON : {type(obj).__name__}")
+    return converted
+
+
+class JSONSerializer:
+    """Sérialiseur de la bibliothèque standard (json)"""
+
+    name = "json"
+
+    def dumps(self, obj, indent=None):
+        """Texte JSON, compact sans indentation"""
+        if indent is None:
+            return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=_default)
+        return json.dumps(obj, indent=indent, ensure_ascii=False, default=_default)
+
+
+class OrjsonSerializer:
+    """
+    Sérialiseur orjson (encodeur natif, plusieurs fois plus rapide)
+
+    orjson ne sait indenter que de 2 espaces : les autres indentations sont
+    confiées à la bibliothèque standard.
+    """
+
+    name = "orjson"
+
+    def __init__(self):
+        self._fallback = JSONSerializer()
+
+    def dumps(self, obj, indent=None):
+        """Texte JSON, compact sans indentation"""
+        if indent is None:
+            return orjson.dumps(obj, default=_default).decode('utf-8')
+        if indent == 2:
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_INDENT_2).decode('utf-8')
+        return self._fallback.dumps(obj, indent)
+
+
+# Sérialiseurs disponibles, le plus rapide en dernier
+SERIALIZERS = {"json": JSONSerializer}
+if orjson is not None:
+    SERIALIZERS["orjson"] = OrjsonSerializer
+
+DEFAULT_SERIALIZER = list(SERIALIZERS)[-1]
+
+_serializers = {}
+
+
+def get_serializer(serializer=None):
+    """
+    Sérialiseur à utiliser
+
+    Args:
+        serializer: Nom (voir SERIALIZERS), instance déjà construite ou None
+            pour le plus rapide des sérialiseurs installés
+
+    Raises:
+        ValueError: si le sérialiseur demandé n'est pas installé
+    """
+    if serializer is None:
+        serializer = DEFAULT_SERIALIZER
+    if not isinstance(serializer, str):
+        return serializer
+    if serializer not in _serializers:
+        if serializer not in SERIALIZERS:
+            raise ValueError(f"Sérialiseur non disponible : {serializer} "
+                             f"(disponibles : {', '.join(SERIALIZERS)})")
+        _serializers[serializer] = SERIALIZERS[serializer]()
+    return _serializers[serializer]
+
+
+def fetch_in_batches(cursor, batch_size=DEFAULT_BATCH_SIZE, metrics=NO_METRICS):
+    """
+    Parcourt les lignes d'un curseur DB-API par lots avec fetchmany
+
+    Contrairement à fetchall(), seul le lot courant est gardé en mémoire.
+
+    Args:
+        cursor: Curseur sur lequel une requête a été exécutée
+        batch_size: Nombre de lignes par appel à fetchmany
+        metrics: Mesures (étape "fetch"), voir metrics.Metrics
+    """
+    while True:
+        with metrics.stage("fetch") as stage:
+            rows = cursor.fetchmany(batch_size)
+            stage.add(rows=len(rows))
+        if not rows:
+            break
+        for row in rows:
+            yield row
+
+
+# En-tête et fin d'une FeatureCollection compacte
+COLLECTION_HEADER = '{"type":"FeatureCollection","features":['
+COLLECTION_FOOTER = ']}'
+
+
+def encode_feature(feature, indent=None, serializer=None):
+    """
+    Sérialise une feature telle qu'elle apparaît dans une FeatureCollection
+
+    Sans indentation le texte est compact. Avec une indentation, il est
+    décalé de deux niveaux pour s'insérer dans la liste "features" de la
+    collection.
+
+    Args:
+        feature: Feature (dictionnaire de valeurs JSON natives, voir json_value)
+        indent: Indentation (None : texte compact)
+        serializer: Sérialiseur (voir get_serializer)
+    """
+    text = get_serializer(serializer).dumps(feature, indent)
+    if indent is not None:
+        text = text.replace('\n', '\n' + ' ' * (indent * 2))
+    return text
+
+
+def feature_separator(indent=None):
+    """Séparateur placé entre deux features encodées par encode_feature"""
+    if indent is None:
+        return ','
+    return ',\n' + ' ' * (indent * 2)
+
+
+class FeatureCollectionWriter:
+    """
+    Écrit une FeatureCollection GeoJSON feature par feature
+
+    Le texte produit est identique à celui du sérialiseur sur la collection
+    complète, mais aucune liste de features n'est construite en mémoire.
+
+    Args:
+        fileobj: Fichier texte ouvert en écriture
+        indent: Indentation (None pour une sortie compacte sur une seule ligne)
+        serializer: Sérialiseur des features (voir get_serializer)
+        members: Autres membres de la collection (name, crs, bbox...), écrits
+            avant "features"
+    """
+
+    def __init__(self, fileobj, indent=None, serializer=None, members=None):
+        self.fileobj = fileobj
+        self.indent = indent
+        self.serializer = get_serializer(serializer)
+        self.count = 0
+        self._separator = feature_separator(indent)
+
+        members = {key: value for key, value in (members or {}).items()
+                   if key not in ("type", "features")}
+        if indent is None:
+            self._header = COLLECTION_HEADER
+            if members:
+                self._header = '{"type":"FeatureCollection",' + ''.join(
+                    json.dumps(key, ensure_ascii=False) + ':'
+                    + json.dumps(value, ensure_ascii=False, separators=(',', ':')) + ','
+                    for key, value in members.items()) + '"features":['
+            self._footer = COLLECTION_FOOTER
+            self._first_prefix = ''
+        else:
+            pad = ' ' * indent
+            self._header = '{\n' + pad + '"type": "FeatureCollection",\n' + ''.join(
+                pad + json.dumps(key, ensure_ascii=False) + ': '
+                + json.dumps(value, ensure_ascii=False, indent=indent).replace('\n', '\n' + pad) + ',\n'
+                for key, value in members.items()) + pad + '"features": ['
+            self._footer = '\n' + pad + ']\n}'
+            self._first_prefix = '\n' + pad * 2
+
+        self.fileobj.write(self._header)
+
+    def write(self, feature):
+        """Ajoute une feature à la collection"""
+        self.write_encoded(encode_feature(feature, self.indent, self.serializer))
+
+    def write_encoded(self, text, count=1):
+        """
+        Ajoute des features déjà encodées
+
+        Args:
+            text: Features encodées par encode_feature, jointes avec
+                feature_separator (même indentation que le writer)
+            count: Nombre de features contenues dans text
+        """
+        if not count:
+            return
+        self.fileobj.write(self._separator if self.count else self._first_prefix)
+        self.fileobj.write(text)
+        self.count += count
+
+    def copy_encoded(self, source, count):
+        """
+        Ajoute des features déjà encodées lues dans un fichier texte
+
+        Args:
+            source: Fichier texte ouvert en lecture, contenant des features
+                encodées et jointes comme pour write_encoded
+            count: Nombre de features contenues dans le fichier
+        """
+        if not count:
+            return
+        self.fileobj.write(self._separator if self.count else self._first_prefix)
+        shutil.copyfileobj(source, self.fileobj)
+        self.count += count
+
+    def close(self):
+        """Termine la collection (le fichier reste ouvert)"""
+        if self.count or self.indent is None:
+            self.fileobj.write(self._footer)
+        else:
+            self.fileobj.write(']\n}')
+
+
+def write_geojson_files(features, output_file, compressed_file, metrics=NO_METRICS,
+                        indent=None, serializer=None, seq_writer=None):
+    """
+    Écrit les features en une seule passe dans le fichier GeoJSON et dans sa
+    version compressée en gzip
+
+    Le fichier .gz est toujours compact. Sans indentation, chaque feature
+    n'est encodée qu'une fois pour les deux fichiers. Le texte compact est
+    aussi transmis à seq_writer (fichier par blocs, voir geojson_seq).
+
+    Avec des mesures, le temps de production des features ("build"), leur
+    encodage JSON ("encode"), l'écriture du fichier non compressé ("write")
+    et la compression ("gzip") sont chronométrés séparément.
+
+    Args:
+        features: Features à écrire
+        output_file: Fichier .geojson
+        compressed_file: Fichier .geojson.gz
+        metrics: Mesures (voir metrics.Metrics)
+        indent: Indentation du fichier .geojson (None : compact)
+        serializer: Sérialiseur (voir get_serializer)
+        seq_writer: geojson_seq.SeqWriter alimenté en même temps (étape "seq")
+
+    Returns:
+        Nombre de features écrites
+    """
+    serializer = get_serializer(serializer)
+    with open(output_file, 'w', encoding='utf-8') as f, \
+            gzip.open(compressed_file, "wt", encoding="utf-8") as gz:
+        writer = FeatureCollectionWriter(f, indent, serializer)
+        gz_writer = FeatureCollectionWriter(gz, serializer=serializer)
+        for feature in metrics.timed_iter(features, "build"):
+            with metrics.stage("encode") as stage:
+                compact = encode_feature(feature, serializer=serializer)
+                if indent is None:
+                    text = compact
+                    stage.add(rows=1, bytes_out=len(compact))
+                else:
+                    text = encode_feature(feature, indent, serializer)
+                    stage.add(rows=1, bytes_out=len(text) + len(compact))
+            with metrics.stage("write") as stage:
+                writer.write_encoded(text)
+                stage.add(bytes_in=len(text))
+            with metrics.stage("gzip") as stage:
+                gz_writer.write_encoded(compact)
+                stage.add(bytes_in=len(compact))
+            if seq_writer is not None:
+                with metrics.stage("seq") as stage:
+                    seq_writer.write_encoded(compact, feature)
+                    stage.add(bytes_in=len(compact))
+        with metrics.stage("write"):
+            writer.close()
+        with metrics.stage("gzip"):
+            gz_writer.close()
+    # Tailles finales (les tailles d'entrée sont comptées en caractères)
+    with metrics.stage("write") as stage:
+        stage.add(bytes_out=os.path.getsize(output_file))
+    with metrics.stage("gzip") as stage:
+        stage.add(bytes_out=os.path.getsize(compressed_file))
+    return writer.count
+
+
+class _JSONStream:
+    """Tampon de lecture pour décoder un document JSON valeur par valeur"""
+
+    def __init__(self, fileobj, chunk_size):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        # Fichier binaire : un caractère multi-octets peut être coupé entre
+        # deux lectures
+        self.text_decoder = None
+
+    def _fill(self):
+        chunk = self.fileobj.read(self.chunk_size)
+        if not chunk:
+            if self.text_decoder is not None:
+                # Erreur si le fichier se termine au milieu d'un caractère
+                self.text_decoder.decode(b'', final=True)
+            return False
+        if isinstance(chunk, bytes):
+            if self.text_decoder is None:
+                self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+            chunk = self.text_decoder.decode(chunk)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Retourne le prochain caractère significatif sans le consommer"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"JSON invalide : '{char}' attendu")
+        self.pos += 1
+
+    def value(self):
+        """Décode la valeur JSON suivante"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # Un nombre en fin de tampon peut être incomplet
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_features(fileobj, chunk_size=1024 * 1024, members=None):
+    """
+    Lit les features d'une FeatureCollection une par une
+
+    Le document n'est pas chargé en entier : seuls la feature en cours de
+    décodage et un bloc de lecture sont gardés en mémoire. Les autres
+    membres de la collection sont ignorés, ou rangés dans members.
+
+    Args:
+        fileobj: Fichier ouvert en lecture (texte ou binaire UTF-8)
+        chunk_size: Taille des blocs lus
+        members: Dictionnaire complété par les autres membres (type, name,
+            crs, bbox...) ; ceux placés après "features" n'y sont qu'une fois
+            toutes les features lues
+    """
+    stream = _JSONStream(fileobj, chunk_size)
+    stream.expect('{')
+    while stream.peek() != '}':
+        key = stream.value()
+        stream.expect(':')
+        if key == 'features':
+            stream.expect('[')
+            while stream.peek() != ']':
+                yield stream.value()
+                if stream.peek() == ',':
+                    stream.pos += 1
+            stream.pos += 1
+        else:
+            value = stream.value()
+            if members is not None:
+                members[key] = value
+        if stream.peek() == ',':
+            stream.pos += 1
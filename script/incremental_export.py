@@ -0,0 +1,298 @@
+import os
+import gzip
+import json
+import hashlib
+import argparse
+from datetime import datetime
+
+import create_geojson
+from property_schema import PROFILES
+from query_planner import quote_identifier
+from geojson_stream import (DEFAULT_BATCH_SIZE, SERIALIZERS, FeatureCollectionWriter,
+                            encode_feature, get_serializer)
+
+# Colonnes reconnues comme marqueurs de modification (rowversion, date de mise à jour)
+MARKER_COLUMNS = ('rowversion', 'row_version', 'updated_at', 'updatedat', 'last_modified',
+                  'lastmodified', 'modified_at', 'date_modification', 'date_maj')
+
+DEFAULT_MANIFEST = "metadata/export_manifest.json"
+
+
+def load_manifest(manifest_path):
+    """Charge le manifeste d'export (vide s'il n'existe pas encore)"""
+    if not os.path.isfile(manifest_path):
+        return {"tables": {}}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, manifest_path):
+    """Sauvegarde le manifeste via un fichier temporaire renommé"""
+    manifest_dir = os.path.dirname(manifest_path)
+    if manifest_dir:
+        os.makedirs(manifest_dir, exist_ok=True)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def find_marker_column(columns):
+    """Retourne la colonne rowversion / date de mise à jour de la table, ou None"""
+    for col in columns:
+        if col.lower() in MARKER_COLUMNS:
+            return col
+    return None
+
+
+def _marker_value(value):
+    """Rend une valeur de marqueur (bytes rowversion, datetime...) sérialisable"""
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value).hex()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def table_fingerprint(cursor, table_name, marker_col):
+    """
+    Empreinte légère d'une table : nombre de lignes et marqueur maximal
+
+    Une seule requête d'agrégat, sans transférer les lignes.
+    """
+    cursor.execute(f"SELECT COUNT(*), MAX({quote_identifier(marker_col)}) "
+                   f"FROM {quote_identifier(table_name)}")
+    count, max_marker = cursor.fetchone()
+    return [count, _marker_value(max_marker)]
+
+
+def export_options(profile=None, precision=None, indent=None, serializer=None):
+    """
+    Options d'export qui changent le contenu des fichiers, enregistrées dans
+    le manifeste : un export avec d'autres options réécrit les fichiers même
+    si la table n'a pas changé
+    """
+    profile_name = None
+    if profile is not None:
+        profile_name = next((name for name, value in PROFILES.items() if value is profile), None)
+        if profile_name is None:
+            text = json.dumps(profile, sort_keys=True, default=str)
+            profile_name = hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+    return {
+        "profile": profile_name,
+        "precision": precision,
+        "indent": indent,
+        "serializer": get_serializer(serializer).name
+    }
+
+
+class _HashingWriter:
+    """Fichier texte qui calcule le SHA-256 de ce qui y est écrit"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.sha256 = hashlib.sha256()
+
+    def write(self, text):
+        self.sha256.update(text.encode('utf-8'))
+        return self.fileobj.write(text)
+
+
+def write_if_changed(features, feature_id, output_file, compressed_file, previous=None,
+                     indent=None, serializer=None):
+    """
+    Écrit les features dans des fichiers temporaires et ne remplace les
+    fichiers publiés que si leur contenu a changé
+
+    Args:
+        features: Itérable de features GeoJSON
+        feature_id: Fonction retournant l'identifiant d'une feature
+        output_file: Fichier .geojson publié
+        compressed_file: Fichier .geojson.gz publié
+        previous: Entrée du manifeste lors du précédent export (ou None)
+        indent: Indentation du fichier .geojson (None : compact)
+        serializer: Sérialiseur (voir geojson_stream.get_serializer)
+
+    Returns:
+        Tuple (nouvelle entrée du manifeste, statistiques du différentiel)
+    """
+    previous = previous or {}
+    serializer = get_serializer(serializer)
+    previous_rows = previous.get("rows", {})
+    rows = {}
+    added = modified = 0
+
+    tmp_output = f"{output_file}.tmp"
+    tmp_compressed = f"{compressed_file}.tmp"
+
+    with open(tmp_output, 'w', encoding='utf-8') as f, \
+            gzip.open(tmp_compressed, "wt", encoding="utf-8") as gz:
+        hashing = _HashingWriter(gz)
+        writer = FeatureCollectionWriter(f, indent, serializer)
+        gz_writer = FeatureCollectionWriter(hashing, serializer=serializer)
+        for feature in features:
+            text = encode_feature(feature, serializer=serializer)
+            if indent is None:
+                writer.write_encoded(text)
+            else:
+                writer.write(feature)
+            gz_writer.write_encoded(text)
+
+            # Empreinte courte de la ligne, indexée par son identifiant
+            row_id = str(feature_id(feature))
+            row_hash = hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+            old_hash = previous_rows.get(row_id)
+            if old_hash is None:
+                added += 1
+            elif old_hash != row_hash:
+                modified += 1
+            rows[row_id] = row_hash
+        writer.close()
+        gz_writer.close()
+
+    content_sha256 = hashing.sha256.hexdigest()
+    removed = sum(1 for row_id in previous_rows if row_id not in rows)
+
+    unchanged = (content_sha256 == previous.get("content_sha256")
+                 and os.path.isfile(output_file) and os.path.isfile(compressed_file))
+    # Une table vidée publie une collection vide à la place de l'ancien contenu
+    written = not unchanged and bool(writer.count or previous.get("features"))
+    if written:
+        os.replace(tmp_output, output_file)
+        os.replace(tmp_compressed, compressed_file)
+    else:
+        # Contenu identique (ou table toujours vide) : les fichiers publiés
+        # ne sont pas réécrits
+        os.remove(tmp_output)
+        os.remove(tmp_compressed)
+
+    entry = {
+        "features": writer.count,
+        "content_sha256": content_sha256,
+        "exported_at": datetime.now().isoformat(),
+        "rows": rows
+    }
+    stats = {
+        "added": added,
+        "modified": modified,
+        "removed": removed,
+        "written": written
+    }
+    return entry, stats
+
+
+def export_table_incremental(cursor, table_name, manifest, output_dir="data",
+                             batch_size=DEFAULT_BATCH_SIZE, profile=None, precision=None,
+                             indent=None, serializer=None):
+    """
+    Exporte une table seulement si elle a changé depuis le dernier export
+
+    Si la table possède une colonne rowversion / date de mise à jour, une
+    requête d'agrégat suffit à détecter qu'elle n'a pas changé. Sinon les
+    lignes sont relues et comparées à leurs empreintes du manifeste, et les
+    fichiers ne sont réécrits que si le contenu diffère. Un changement
+    d'options (voir export_options) force la réécriture.
+
+    Returns:
+        Statistiques du différentiel, ou None si la table est ignorée
+    """
+    tables = manifest.setdefault("tables", {})
+    previous = tables.get(table_name)
+    options = export_options(profile, precision, indent, serializer)
+    if previous and previous.get("options") != options:
+        # Fichiers produits avec d'autres options : seules les empreintes des
+        # lignes sont gardées, pour le différentiel
+        previous = {"rows": previous.get("rows", {}), "features": previous.get("features")}
+
+    columns = create_geojson.get_table_columns(cursor, table_name)
+    plan = create_geojson.plan_table(table_name, columns, profile, precision)
+    if plan is None:
+        print(f"  La table {table_name} ne semble pas contenir de coordonnées géographiques. Ignorée.")
+        return None
+
+    output_file = os.path.join(output_dir, f"{table_name}.geojson")
+    compressed_file = os.path.join(output_dir, f"{table_name}.geojson.gz")
+
+    marker_col = find_marker_column(columns)
+    fingerprint = None
+    if marker_col:
+        fingerprint = table_fingerprint(cursor, table_name, marker_col)
+        if (previous and previous.get("fingerprint") == fingerprint
+                and os.path.isfile(compressed_file)):
+            print(f"  {table_name}: inchangée depuis le dernier export ({marker_col}).")
+            return {"added": 0, "modified": 0, "removed": 0, "written": False}
+
+    id_col = plan["id_col"]
+    # Le profil peut supprimer l'identifiant au profit de la colonne dont il est la copie
+    fallback_col = (profile or {}).get("duplicates", {}).get(id_col)
+
+    def feature_id(feature):
+        properties = feature["properties"]
+        return properties.get(id_col, properties.get(fallback_col))
+
+    features = create_geojson.iter_table_features(cursor, table_name, columns, plan, batch_size)
+    entry, stats = write_if_changed(features, feature_id, output_file, compressed_file, previous,
+                                    indent, serializer)
+    entry["fingerprint"] = fingerprint
+    entry["options"] = options
+    tables[table_name] = entry
+
+    if stats["written"]:
+        print(f"  {table_name}: {stats['added']} ajoutées, {stats['modified']} modifiées, "
+              f"{stats['removed']} supprimées. Fichiers réécrits.")
+    else:
+        print(f"  {table_name}: contenu identique, fichiers conservés.")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export GeoJSON incrémental des tables SQL Server')
+    parser.add_argument('--output-dir', '-o', default='data',
+                        help='Dossier de sortie des fichiers GeoJSON')
+    parser.add_argument('--manifest', '-m', default=DEFAULT_MANIFEST,
+                        help="Manifeste des empreintes du précédent export")
+    parser.add_argument('--batch-size', '-b', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='Nombre de lignes récupérées par lot (fetchmany)')
+    parser.add_argument('--tables', '-t', nargs='+',
+                        help='Tables à exporter (défaut : toutes)')
+    parser.add_argument('--profile', '-p', choices=list(PROFILES),
+                        help='Profil de propriétés : types natifs, colonnes redondantes supprimées')
+    parser.add_argument('--precision', type=int,
+                        help='Nombre de décimales des coordonnées (défaut : 6)')
+    parser.add_argument('--indent', type=int,
+                        help='Indentation des fichiers .geojson (défaut : compact)')
+    parser.add_argument('--serializer', '-s', choices=list(SERIALIZERS),
+                        help='Sérialiseur JSON (défaut : le plus rapide installé)')
+
+    args = parser.parse_args()
+    profile = PROFILES[args.profile] if args.profile else None
+
+    manifest = load_manifest(args.manifest)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    conn = create_geojson.connect()
+    cursor = conn.cursor()
+    tables = args.tables or create_geojson.list_tables(cursor)
+    print(f"Nombre de tables trouvées: {len(tables)}")
+
+    written = 0
+    for table_name in tables:
+        print(f"Traitement de la table: {table_name}")
+        try:
+            stats = export_table_incremental(cursor, table_name, manifest, args.output_dir,
+                                             args.batch_size, profile, args.precision,
+                                             args.indent, args.serializer)
+        except Exception as e:
+            print(f"  Erreur lors du traitement de la table {table_name}: {str(e)}")
+            continue
+        if stats and stats["written"]:
+            written += 1
+
+    save_manifest(manifest, args.manifest)
+    print(f"Export incrémental terminé : {written} tables réécrites sur {len(tables)}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import sys
+import random
+import socket
+import asyncio
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+from urllib.parse import urlsplit
+
+DEFAULT_CONCURRENCY = 32
+DEFAULT_DURATION = 10.0
+
+
+def percentile(values, fraction):
+    """Valeur au rang fraction (0 à 1) d'une liste triée"""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(fraction * (len(values) - 1)))))
+    return values[index]
+
+
+def list_paths(catalog_path, categories=("countries",)):
+    """Chemins d'URL des fichiers du catalogue (data/<catégorie>/<nom>.geojson)"""
+    with open(catalog_path, 'r', encoding='utf-8') as f:
+        catalog = json.load(f)
+    paths = []
+    for category in categories:
+        for file_path in catalog["data_categories"].get(category, {}).get("files", []):
+            paths.append(f"/data/{file_path}")
+    return paths
+
+
+async def _read_response(reader):
+    """Lit une réponse HTTP/1.1 ; retourne (status, octets du corps, fermeture demandée)"""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ')[1])
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    size = 0
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            length = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(length + 2)
+            size += length
+            if not length:
+                break
+    elif 'content-length' in headers:
+        size = int(headers['content-length'])
+        await reader.readexactly(size)
+    return status, size, headers.get('connection', '').lower() == 'close'
+
+
+async def _client(host, port, targets, request_headers, deadline, max_requests, results, rng):
+    """Une connexion keep-alive qui enchaîne les requêtes jusqu'à l'échéance"""
+    reader = writer = None
+    while time.perf_counter() < deadline and (max_requests is None or results["count"] < max_requests):
+        results["count"] += 1
+        path, extra = rng.choice(targets)
+        if writer is None:
+            reader, writer = await asyncio.open_connection(host, port, limit=1024 * 1024)
+        request = f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n{request_headers}{extra}\r\n"
+        start = time.perf_counter()
+        try:
+            writer.write(request.encode('latin-1'))
+            status, size, close = await _read_response(reader)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            results["errors"].append(str(e) or type(e).__name__)
+            writer.close()
+            writer = None
+            continue
+        results["latencies"].append(time.perf_counter() - start)
+        results["bytes"] += size
+        results["statuses"][status] = results["statuses"].get(status, 0) + 1
+        if close:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(url, paths, concurrency=DEFAULT_CONCURRENCY, duration=DEFAULT_DURATION,
+                   requests=None, accept_encoding="gzip", revalidate=False, seed=0):
+    """
+    Envoie des requêtes GET sur concurrency connexions keep-alive
+
+    Args:
+        url: URL du serveur (http://hôte:port)
+        paths: Chemins demandés (tirés au hasard)
+        concurrency: Nombre de connexions simultanées
+        duration: Durée du test (secondes)
+        requests: Nombre total de requêtes (None : limité par la durée)
+        accept_encoding: Valeur de Accept-Encoding ('' : aucun en-tête)
+        revalidate: Envoyer If-None-Match avec l'ETag de chaque fichier
+            (mesure les réponses 304)
+        seed: Graine du tirage des chemins
+
+    Returns:
+        Dictionnaire (requests, errors, seconds, requests_per_s, mb_per_s,
+        p50_ms, p90_ms, p99_ms, max_ms, statuses)
+    """
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    headers = ""
+    if accept_encoding:
+        headers += f"Accept-Encoding: {accept_encoding}\r\n"
+    targets = [(path, "") for path in paths]
+    if revalidate:
+        etags = await _fetch_etags(host, port, paths, headers)
+        targets = [(path, f"If-None-Match: {etags[path]}\r\n" if path in etags else "")
+                   for path in paths]
+
+    results = {"count": 0, "latencies": [], "bytes": 0, "errors": [], "statuses": {}}
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    deadline = start + duration if requests is None else float('inf')
+    await asyncio.gather(*(_client(host, port, targets, headers, deadline, requests, results,
+                                   random.Random(rng.random()))
+                           for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+
+    latencies = sorted(results["latencies"])
+    done = len(latencies)
+    return {
+        "requests": done,
+        "errors": len(results["errors"]),
+        "seconds": seconds,
+        "requests_per_s": done / seconds if seconds else 0,
+        "mb_per_s": results["bytes"] / seconds / 1024 / 1024 if seconds else 0,
+        "p50_ms": percentile(latencies, 0.50) * 1000 if done else None,
+        "p90_ms": percentile(latencies, 0.90) * 1000 if done else None,
+        "p99_ms": percentile(latencies, 0.99) * 1000 if done else None,
+        "max_ms": latencies[-1] * 1000 if done else None,
+        "statuses": {str(status): n for status, n in sorted(results["statuses"].items())}
+    }
+
+
+async def _fetch_etags(host, port, paths, headers):
+    """ETag de chaque chemin (requêtes HEAD)"""
+    reader, writer = await asyncio.open_connection(host, port)
+    etags = {}
+    try:
+        for path in paths:
+            writer.write(f"HEAD {path} HTTP/1.1\r\nHost: {host}:{port}\r\n{headers}\r\n".encode('latin-1'))
+            head = await reader.readuntil(b'\r\n\r\n')
+            for line in head.decode('latin-1').split('\r\n'):
+                name, _, value = line.partition(':')
+                if name.lower() == 'etag':
+                    etags[path] = value.strip()
+    finally:
+        writer.close()
+    return etags
+
+
+def start_local_server(root, timeout=10.0):
+    """
+    Démarre cdn_server dans un processus séparé (port libre)
+
+    Le serveur ne partage pas le GIL du générateur de charge : les mesures
+    sont celles du serveur seul.
+
+    Returns:
+        Tuple (URL, processus) ; le processus est à arrêter par l'appelant
+    """
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cdn_server.py")
+    process = subprocess.Popen([sys.executable, script, "--root", root, "--host", "127.0.0.1",
+                                "--port", str(port)], stdout=subprocess.DEVNULL)
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            break
+        except OSError:
+            if process.poll() is not None or time.perf_counter() > deadline:
+                process.kill()
+                raise RuntimeError(f"Le serveur local n'a pas démarré sur le port {port}")
+            time.sleep(0.05)
+    return f"http://127.0.0.1:{port}", process
+
+
+def print_result(name, result):
+    print(f"  {name:<24} {result['requests_per_s']:>9,.0f} req/s {result['mb_per_s']:>8.1f} MB/s "
+          f"p50 {result['p50_ms']:.2f} ms  p99 {result['p99_ms']:.2f} ms  max {result['max_ms']:.2f} ms"
+          f"  statuts {result['statuses']}" + (f"  erreurs {result['errors']}" if result['errors'] else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Test de charge du serveur du CDN (req/s, latence p99)')
+    parser.add_argument('--url', '-u',
+                        help='Serveur testé (défaut : cdn_server démarré dans un processus local sur --root)')
+    parser.add_argument('--root', '-r', default='.',
+                        help='Racine servie par le serveur local (contient data, metadata)')
+    parser.add_argument('--catalog', '-c',
+                        help='Catalogue listant les fichiers demandés '
+                             '(défaut : metadata/catalog.json sous --root)')
+    parser.add_argument('--categories', nargs='+', default=['countries'],
+                        help='Catégories des fichiers demandés (défaut : countries)')
+    parser.add_argument('--concurrency', '-n', type=int, default=DEFAULT_CONCURRENCY,
+                        help='Connexions simultanées')
+    parser.add_argument('--duration', '-d', type=float, default=DEFAULT_DURATION,
+                        help='Durée de chaque scénario (secondes)')
+    parser.add_argument('--output', '-o',
+                        help='Fichier JSON des résultats')
+
+    args = parser.parse_args()
+    if args.catalog is None:
+        args.catalog = os.path.join(args.root, "metadata", "catalog.json")
+
+    paths = list_paths(args.catalog, args.categories)
+    if not paths:
+        print(f"Aucun fichier dans {args.catalog}")
+        return
+    server = None
+    url = args.url
+    if url is None:
+        url, server = start_local_server(args.root)
+    print(f"{len(paths)} fichiers, {args.concurrency} connexions, {args.duration:g} s par scénario, {url}")
+
+    # Scénarios : variante précompressée négociée, décompression à la volée
+    # (client sans gzip) et revalidation (304)
+    scenarios = {
+        "gzip": {"accept_encoding": "gzip, br"},
+        "identity": {"accept_encoding": ""},
+        "revalidate_304": {"accept_encoding": "gzip, br", "revalidate": True},
+    }
+    results = {}
+    try:
+        for name, options in scenarios.items():
+            result = asyncio.run(run_load(url, paths, args.concurrency, args.duration, **options))
+            results[name] = result
+            print_result(name, result)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    if args.output:
+        report = {
+            "created": datetime.now().isoformat(),
+            "url": url,
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "concurrency": args.concurrency,
+            "files": len(paths),
+            "results": results
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
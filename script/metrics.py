@@ -0,0 +1,325 @@
+import os
+import sys
+import json
+import time
+import uuid
+import cProfile
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus en MB (None si indisponible)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Octets sous macOS, kilo-octets ailleurs
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+class StageStats:
+    """Compteurs d'une étape (temps exclusifs : les sous-étapes sont décomptées)"""
+
+    __slots__ = ("name", "calls", "wall", "cpu", "rows", "bytes_in", "bytes_out", "peak_memory",
+                 "_wall_start", "_cpu_start")
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.rows = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.peak_memory = 0
+        self._wall_start = 0.0
+        self._cpu_start = 0.0
+
+    def add(self, rows=0, bytes_in=0, bytes_out=0):
+        """Ajoute des lignes et des octets traités par l'étape"""
+        self.rows += rows
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+
+    def as_record(self):
+        wall = self.wall or 1e-9
+        return {
+            "stage": self.name,
+            "calls": self.calls,
+            "wall_s": round(self.wall, 6),
+            "cpu_s": round(self.cpu, 6),
+            "rows": self.rows,
+            "rows_per_s": round(self.rows / wall, 1) if self.rows else None,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "mb_per_s": round(max(self.bytes_in, self.bytes_out) / wall / 1024 / 1024, 3)
+            if self.bytes_in or self.bytes_out else None,
+            "peak_memory_mb": round(self.peak_memory / 1024 / 1024, 3) if self.peak_memory else None,
+        }
+
+
+class _NullStage:
+    """Étape sans mesure (instrumentation désactivée)"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def add(self, rows=0, bytes_in=0, bytes_out=0):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _StageScope:
+    def __init__(self, metrics, stats):
+        self.metrics = metrics
+        self.stats = stats
+
+    def __enter__(self):
+        self.metrics._enter(self.stats)
+        return self.stats
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics._exit(self.stats)
+        return False
+
+
+class Metrics:
+    """
+    Mesures par étape d'une exécution : temps réel et CPU, lignes et octets
+    traités, pic de mémoire
+
+    Les étapes s'imbriquent : le temps d'une étape ne compte pas celui de ses
+    sous-étapes (le temps de "build" n'inclut pas le "fetch" qu'il déclenche).
+    À la fermeture, un enregistrement JSON par étape et un résumé sont écrits
+    (une ligne JSON chacun) dans le fichier de mesures::
+
+        with Metrics("create_geojson", "metrics.jsonl") as metrics:
+            with metrics.stage("encode") as stage:
+                text = encode_feature(feature)
+                stage.add(rows=1, bytes_out=len(text))
+
+    Désactivées (enabled=False), les méthodes ne mesurent rien et leur coût
+    est négligeable : c'est l'instance NO_METRICS utilisée par défaut.
+
+    Args:
+        run_name: Nom de l'exécution (nom du script)
+        output: Fichier JSON lines complété à chaque exécution ('-' : stderr,
+            None : pas d'écriture)
+        profile: Fichier où écrire les statistiques cProfile (None : pas de profil)
+        trace_memory: Mesurer le pic de mémoire Python de chaque étape avec
+            tracemalloc (plus lent) ; sinon seul le pic de mémoire résidente
+            du processus est relevé
+        enabled: Activer les mesures
+    """
+
+    def __init__(self, run_name, output=None, profile=None, trace_memory=False, enabled=True):
+        self.run_name = run_name
+        self.output = output
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.enabled = enabled
+        self.run_id = uuid.uuid4().hex[:12]
+        self.stages = {}
+        self._stack = []
+        self._profiler = None
+        self._started = None
+        self._closed = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def start(self):
+        """Démarre le chronomètre global et, si demandés, cProfile et tracemalloc"""
+        if not self.enabled:
+            return
+        self._started = (time.perf_counter(), time.process_time())
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def _stats(self, name):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats(name)
+        return stats
+
+    def _enter(self, stats):
+        wall, cpu = time.perf_counter(), time.process_time()
+        if self._stack:
+            parent = self._stack[-1]
+            parent.wall += wall - parent._wall_start
+            parent.cpu += cpu - parent._cpu_start
+            if self.trace_memory:
+                parent.peak_memory = max(parent.peak_memory, tracemalloc.get_traced_memory()[1])
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        stats.calls += 1
+        stats._wall_start, stats._cpu_start = wall, cpu
+        self._stack.append(stats)
+
+    def _exit(self, stats):
+        wall, cpu = time.perf_counter(), time.process_time()
+        stats.wall += wall - stats._wall_start
+        stats.cpu += cpu - stats._cpu_start
+        self._stack.pop()
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            stats.peak_memory = max(stats.peak_memory, peak)
+        if self._stack:
+            parent = self._stack[-1]
+            parent._wall_start, parent._cpu_start = wall, cpu
+            if self.trace_memory:
+                # Le pic de la sous-étape fait aussi partie de celui du parent
+                parent.peak_memory = max(parent.peak_memory, peak)
+                tracemalloc.reset_peak()
+
+    def stage(self, name):
+        """Contexte mesurant une étape ; retourne les compteurs (méthode add)"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _StageScope(self, self._stats(name))
+
+    def timed_iter(self, iterable, name, count_rows=True):
+        """
+        Itère sur iterable en mesurant le temps de production de chaque
+        élément comme une étape (une ligne par élément si count_rows)
+        """
+        if not self.enabled:
+            return iterable
+        return self._timed_iter(iter(iterable), self._stats(name), count_rows)
+
+    def _timed_iter(self, iterator, stats, count_rows):
+        while True:
+            self._enter(stats)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._exit(stats)
+            if count_rows:
+                stats.rows += 1
+            yield item
+
+    def record(self, name, wall, cpu=0.0, rows=0, bytes_in=0, bytes_out=0, peak_memory=0):
+        """Ajoute à une étape des mesures faites ailleurs (processus worker)"""
+        if not self.enabled:
+            return
+        stats = self._stats(name)
+        stats.calls += 1
+        stats.wall += wall
+        stats.cpu += cpu
+        stats.add(rows, bytes_in, bytes_out)
+        stats.peak_memory = max(stats.peak_memory, peak_memory)
+
+    def event(self, event, **fields):
+        """Écrit immédiatement un événement structuré (une ligne JSON)"""
+        if not self.enabled:
+            return
+        self._write([dict(self._base_record(event), **fields)])
+
+    def _base_record(self, event):
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "run": self.run_name,
+            "run_id": self.run_id,
+            "pid": os.getpid(),
+            "event": event,
+        }
+
+    def records(self):
+        """Enregistrements des étapes suivis du résumé de l'exécution"""
+        records = [dict(self._base_record("stage"), **stats.as_record())
+                   for stats in self.stages.values()]
+        summary = self._base_record("summary")
+        if self._started:
+            summary["wall_s"] = round(time.perf_counter() - self._started[0], 6)
+            summary["cpu_s"] = round(time.process_time() - self._started[1], 6)
+        summary["peak_rss_mb"] = peak_rss_mb()
+        if tracemalloc.is_tracing():
+            summary["traced_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 3)
+        records.append(summary)
+        return records
+
+    def _write(self, records):
+        if self.output is None:
+            return
+        lines = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        if self.output == '-':
+            sys.stderr.write(lines)
+            return
+        os.makedirs(os.path.dirname(self.output) or '.', exist_ok=True)
+        with open(self.output, 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+    def report(self):
+        """Affiche le temps, le débit et les octets de chaque étape"""
+        if not self.stages:
+            return
+        print("Mesures par étape :")
+        for stats in sorted(self.stages.values(), key=lambda s: s.wall, reverse=True):
+            record = stats.as_record()
+            line = f"  {stats.name:<12} {stats.wall:>9.3f} s réel {stats.cpu:>9.3f} s CPU"
+            line += f" {record['rows_per_s']:>12,.0f} lignes/s" if record["rows_per_s"] else " " * 22
+            if record["mb_per_s"]:
+                line += f" {record['mb_per_s']:>8.1f} MB/s"
+            if record["peak_memory_mb"]:
+                line += f"  pic {record['peak_memory_mb']:.1f} MB"
+            print(line.rstrip())
+
+    def close(self):
+        """Arrête les mesures, écrit les enregistrements et le profil"""
+        if not self.enabled or self._closed:
+            return
+        self._closed = True
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.profile)
+        records = self.records()
+        self._write(records)
+        if self.trace_memory:
+            tracemalloc.stop()
+        self.report()
+        if self.output and self.output != '-':
+            print(f"Mesures écrites dans {self.output}")
+        if self.profile:
+            print(f"Profil cProfile écrit dans {self.profile}")
+
+
+# Instance désactivée utilisée quand aucune mesure n'est demandée
+NO_METRICS = Metrics("disabled", enabled=False)
+
+
+def add_metrics_arguments(parser):
+    """Ajoute les options --metrics, --profile-output et --trace-memory à un parser argparse"""
+    group = parser.add_argument_group('mesures')
+    group.add_argument('--metrics', metavar='FICHIER',
+                       help="Écrire les mesures par étape (JSON lines) dans ce fichier ('-' : stderr)")
+    group.add_argument('--profile-output', metavar='FICHIER',
+                       help="Profiler l'exécution avec cProfile et écrire les statistiques dans ce fichier")
+    group.add_argument('--trace-memory', action='store_true',
+                       help='Mesurer le pic de mémoire de chaque étape avec tracemalloc (plus lent)')
+    return group
+
+
+def metrics_from_args(args, run_name):
+    """Instance Metrics correspondant aux options de add_metrics_arguments"""
+    enabled = bool(args.metrics or args.profile_output or args.trace_memory)
+    return Metrics(run_name, args.metrics, args.profile_output, args.trace_memory, enabled)
@@ -0,0 +1,371 @@
+import os
+import gzip
+import time
+import sqlite3
+import argparse
+from collections import deque
+from contextlib import closing, nullcontext
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import create_geojson
+from property_schema import PROFILES
+from coordinate_precision import max_error_bound
+from query_planner import add_filter_arguments, filters_from_args, id_shards
+from geojson_stream import (DEFAULT_BATCH_SIZE, SERIALIZERS, FeatureCollectionWriter,
+                            encode_feature, feature_separator)
+
+
+def encode_rows(rows, columns, plan, indent=None, serializer=None):
+    """
+    Convertit un lot de lignes en features et les sérialise
+
+    Exécutée dans un processus du pool : c'est la partie coûteuse en CPU.
+
+    Args:
+        indent: Indentation du fichier .geojson (None : compact, le texte
+            n'est alors encodé qu'une fois)
+        serializer: Nom du sérialiseur (voir geojson_stream.SERIALIZERS)
+
+    Returns:
+        Tuple (nombre de features, texte du .geojson, texte compact du .gz)
+    """
+    indented = []
+    compact = []
+    convert = create_geojson.row_converter(columns, plan, check_ranges=False)
+    for row in rows:
+        feature = convert(row)
+        if feature is None:
+            continue
+        compact.append(encode_feature(feature, serializer=serializer))
+        if indent is not None:
+            indented.append(encode_feature(feature, indent, serializer))
+    text = feature_separator().join(compact)
+    if indent is None:
+        return len(compact), text, text
+    return len(compact), feature_separator(indent).join(indented), text
+
+
+def export_table_parallel(connection_factory, process_pool, table_name, output_dir,
+                          batch_size=DEFAULT_BATCH_SIZE, max_pending=4, profile=None,
+                          precision=None, indent=None, serializer=None, filters=None, shards=1):
+    """
+    Exporte une table sur sa propre connexion : les lignes sont lues par lots
+    dans le thread courant et converties en GeoJSON par le pool de processus
+
+    Avec plusieurs shards, la table est découpée en intervalles de sa colonne
+    d'identifiant (query_planner.id_shards) lus en même temps sur autant de
+    connexions ; les parties sont ensuite assemblées dans l'ordre des
+    identifiants. La connexion de planification est fermée avant que celles
+    des shards soient ouvertes : au plus shards connexions sont ouvertes.
+
+    Args:
+        connection_factory: Fonction sans argument retournant une connexion DB-API
+        process_pool: ProcessPoolExecutor qui sérialise les lots
+        table_name: Nom de la table
+        output_dir: Dossier de sortie
+        batch_size: Nombre de lignes par lot
+        max_pending: Nombre maximal de lots en cours de conversion par
+            connexion (borne la mémoire utilisée)
+        profile: Profil de propriétés (voir property_schema.PROFILES)
+        precision: Nombre de décimales des coordonnées (None : 6 décimales, comme geojson.Point)
+        indent: Indentation du fichier .geojson (None : compact)
+        serializer: Nom du sérialiseur (voir geojson_stream.SERIALIZERS)
+        filters: Filtres évalués par le serveur (voir query_planner.build_where)
+        shards: Nombre d'intervalles d'identifiants lus en parallèle
+
+    Returns:
+        Dictionnaire de statistiques (features, secondes) ou None si la
+        table est ignorée
+    """
+    start = time.perf_counter()
+    with closing(connection_factory()) as connection:
+        cursor = connection.cursor()
+        columns = create_geojson.get_table_columns(cursor, table_name)
+        plan = create_geojson.plan_table(table_name, columns, profile, precision)
+        if plan is None:
+            print(f"  La table {table_name} ne semble pas contenir de coordonnées géographiques. Ignorée.")
+            return None
+
+        ranges = [(None, None)]
+        if shards > 1:
+            ranges = id_shards(cursor, table_name, plan["id_col"], shards)
+        if len(ranges) == 1:
+            count = _export_table(cursor, process_pool, table_name, plan, output_dir, batch_size,
+                                  max_pending, indent, serializer, filters)
+    if len(ranges) > 1:
+        count = _export_sharded(connection_factory, process_pool, table_name, plan, ranges,
+                                output_dir, batch_size, max_pending, indent, serializer, filters)
+
+    seconds = time.perf_counter() - start
+    if not count:
+        print(f"  Aucune feature valide n'a pu être créée pour {table_name}.")
+        return None
+
+    print(f"  {table_name}: {count} features en {seconds:.2f} s"
+          + (f" ({len(ranges)} shards)" if len(ranges) > 1 else ""))
+    return {"features": count, "seconds": seconds}
+
+
+def _encode_query(cursor, process_pool, table_name, plan, filters, batch_size, max_pending,
+                  indent, serializer, write):
+    """
+    Exécute la requête d'une table, fait encoder les lots par le pool et
+    appelle write(nombre, texte du .geojson, texte compact) dans l'ordre de
+    lecture
+    """
+    cursor.execute(*create_geojson.build_table_query(table_name, plan, filters))
+    pending = deque()
+
+    def write_next():
+        write(*pending.popleft().result())
+
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        # Les lignes pyodbc sont converties en tuples pour être picklables
+        rows = [tuple(row) for row in rows]
+        pending.append(process_pool.submit(encode_rows, rows, plan["columns"], plan, indent,
+                                           serializer))
+        # Écrire les lots dans l'ordre de lecture
+        while len(pending) >= max_pending:
+            write_next()
+
+    while pending:
+        write_next()
+
+
+def _export_table(cursor, process_pool, table_name, plan, output_dir, batch_size, max_pending,
+                  indent, serializer, filters):
+    output_file = os.path.join(output_dir, f"{table_name}.geojson")
+    compressed_file = os.path.join(output_dir, f"{table_name}.geojson.gz")
+
+    with open(output_file, 'w', encoding='utf-8') as f, \
+            gzip.open(compressed_file, "wt", encoding="utf-8") as gz:
+        writer = FeatureCollectionWriter(f, indent)
+        gz_writer = FeatureCollectionWriter(gz)
+
+        def write(count, text, compact):
+            writer.write_encoded(text, count)
+            gz_writer.write_encoded(compact, count)
+
+        _encode_query(cursor, process_pool, table_name, plan, filters, batch_size, max_pending,
+                      indent, serializer, write)
+        writer.close()
+        gz_writer.close()
+
+    if not writer.count:
+        os.remove(output_file)
+        os.remove(compressed_file)
+    return writer.count
+
+
+def _intersect(range_a, range_b):
+    """Intersection de deux intervalles [début, fin[ (None : borne ouverte)"""
+    starts = [bound for bound in (range_a[0], range_b[0]) if bound is not None]
+    ends = [bound for bound in (range_a[1], range_b[1]) if bound is not None]
+    start = max(starts) if starts else None
+    end = min(ends) if ends else None
+    if start is not None and end is not None and start >= end:
+        return None
+    return start, end
+
+
+def _export_shard(connection_factory, process_pool, table_name, plan, filters, parts, batch_size,
+                  max_pending, indent, serializer):
+    """
+    Exporte un intervalle d'identifiants dans des fichiers partiels (features
+    encodées sans en-tête de collection)
+
+    Returns:
+        Nombre de features écrites
+    """
+    text_part, compact_part = parts
+    count = 0
+    with closing(connection_factory()) as connection, \
+            open(text_part, 'w', encoding='utf-8') as f, \
+            open(compact_part, 'w', encoding='utf-8') if compact_part else nullcontext() as compact_f:
+
+        def write(n, text, compact):
+            nonlocal count
+            if not n:
+                return
+            if count:
+                f.write(feature_separator(indent))
+                if compact_f:
+                    compact_f.write(feature_separator())
+            f.write(text)
+            if compact_f:
+                compact_f.write(compact)
+            count += n
+
+        _encode_query(connection.cursor(), process_pool, table_name, plan, filters, batch_size,
+                      max_pending, indent, serializer, write)
+    return count
+
+
+def _export_sharded(connection_factory, process_pool, table_name, plan, ranges, output_dir,
+                    batch_size, max_pending, indent, serializer, filters):
+    output_file = os.path.join(output_dir, f"{table_name}.geojson")
+    compressed_file = os.path.join(output_dir, f"{table_name}.geojson.gz")
+
+    # Intervalles des shards restreints à celui éventuellement demandé
+    user_range = (filters or {}).get("id_range") or (None, None)
+    shard_filters = []
+    for shard in ranges:
+        id_range = _intersect(shard, user_range)
+        if id_range is not None:
+            shard_filters.append(dict(filters or {}, id_range=id_range))
+
+    # Sans indentation, le texte du .geojson est aussi celui du .gz
+    parts = [(f"{output_file}.part{i}", f"{compressed_file}.part{i}" if indent is not None else None)
+             for i in range(len(shard_filters))]
+    try:
+        with ThreadPoolExecutor(max_workers=len(shard_filters) or 1) as threads:
+            futures = [threads.submit(_export_shard, connection_factory, process_pool, table_name,
+                                      plan, shard, part, batch_size, max_pending, indent, serializer)
+                       for shard, part in zip(shard_filters, parts)]
+            counts = [future.result() for future in futures]
+
+        if not sum(counts):
+            return 0
+
+        # Assemblage dans l'ordre des identifiants
+        with open(output_file, 'w', encoding='utf-8') as f, \
+                gzip.open(compressed_file, "wt", encoding="utf-8") as gz:
+            writer = FeatureCollectionWriter(f, indent)
+            gz_writer = FeatureCollectionWriter(gz)
+            for count, (text_part, compact_part) in zip(counts, parts):
+                with open(text_part, 'r', encoding='utf-8') as src:
+                    writer.copy_encoded(src, count)
+                with open(compact_part or text_part, 'r', encoding='utf-8') as src:
+                    gz_writer.copy_encoded(src, count)
+            writer.close()
+            gz_writer.close()
+        return writer.count
+    finally:
+        for part in parts:
+            for path in part:
+                if path and os.path.exists(path):
+                    os.remove(path)
+
+
+def export_tables_parallel(connection_factory, tables, output_dir="data", connections=4,
+                           workers=None, batch_size=DEFAULT_BATCH_SIZE, profile=None,
+                           precision=None, indent=None, serializer=None, filters=None, shards=1):
+    """
+    Exporte plusieurs tables en parallèle
+
+    Args:
+        connection_factory: Fonction sans argument retournant une connexion DB-API
+        tables: Liste des tables à exporter
+        output_dir: Dossier de sortie
+        connections: Nombre maximal de connexions ouvertes en même temps ;
+            avec des shards, connections // shards tables sont exportées en
+            même temps (au moins une, shards étant alors ramené à connections)
+        workers: Nombre de processus de sérialisation (défaut : nombre de CPU)
+        batch_size: Nombre de lignes par lot
+        profile: Profil de propriétés (voir property_schema.PROFILES)
+        precision: Nombre de décimales des coordonnées (None : 6 décimales, comme geojson.Point)
+        indent: Indentation des fichiers .geojson (None : compact)
+        serializer: Nom du sérialiseur (voir geojson_stream.SERIALIZERS)
+        filters: Filtres évalués par le serveur (voir query_planner.build_where)
+        shards: Nombre d'intervalles d'identifiants lus en parallèle par
+            table (chacun sur sa propre connexion)
+
+    Returns:
+        Dictionnaire {table: statistiques} des tables exportées
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    timings = {}
+    start = time.perf_counter()
+
+    # Le nombre de threads borne le nombre de connexions ouvertes en même
+    # temps : chaque table en ouvre une, ou une par shard
+    shards = max(1, min(shards, connections))
+    with ProcessPoolExecutor(max_workers=workers) as process_pool, \
+            ThreadPoolExecutor(max_workers=max(1, connections // shards)) as threads:
+        futures = {
+            threads.submit(export_table_parallel, connection_factory, process_pool,
+                           table_name, output_dir, batch_size,
+                           profile=profile, precision=precision, indent=indent,
+                           serializer=serializer, filters=filters, shards=shards): table_name
+            for table_name in tables
+        }
+        for future, table_name in futures.items():
+            try:
+                stats = future.result()
+            except Exception as e:
+                print(f"  Erreur lors du traitement de la table {table_name}: {str(e)}")
+                continue
+            if stats is not None:
+                timings[table_name] = stats
+
+    total = time.perf_counter() - start
+    total_features = sum(stats["features"] for stats in timings.values())
+    print(f"Export parallèle terminé : {len(timings)} tables, {total_features} features en {total:.2f} s")
+    for table_name, stats in sorted(timings.items(), key=lambda item: -item[1]["seconds"]):
+        print(f"  {table_name:<40} {stats['features']:>10} features {stats['seconds']:>8.2f} s")
+
+    return timings
+
+
+def list_sqlite_tables(connection):
+    """Liste les tables d'une base sqlite (pas d'INFORMATION_SCHEMA)"""
+    cursor = connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Exporter les tables en GeoJSON en parallèle')
+    parser.add_argument('--output-dir', '-o', default='data',
+                        help='Dossier de sortie des fichiers GeoJSON')
+    parser.add_argument('--connections', '-c', type=int, default=4,
+                        help='Nombre maximal de connexions simultanées (shards compris)')
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                        help='Nombre de processus de sérialisation (défaut : nombre de CPU)')
+    parser.add_argument('--batch-size', '-b', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='Nombre de lignes par lot')
+    parser.add_argument('--tables', '-t', nargs='+',
+                        help='Tables à exporter (défaut : toutes)')
+    parser.add_argument('--sqlite',
+                        help='Base sqlite locale à utiliser à la place de SQL Server')
+    parser.add_argument('--profile', '-p', choices=list(PROFILES),
+                        help='Profil de propriétés : types natifs, colonnes redondantes supprimées')
+    parser.add_argument('--precision', type=int,
+                        help='Nombre de décimales des coordonnées (défaut : 6)')
+    parser.add_argument('--indent', type=int,
+                        help='Indentation des fichiers .geojson (défaut : compact)')
+    parser.add_argument('--serializer', '-s', choices=list(SERIALIZERS),
+                        help='Sérialiseur JSON (défaut : le plus rapide installé)')
+    parser.add_argument('--shards', type=int, default=1,
+                        help="Intervalles d'identifiants lus en parallèle par table (défaut : 1)")
+    add_filter_arguments(parser)
+
+    args = parser.parse_args()
+    if args.precision is not None:
+        print(f"Coordonnées arrondies à {args.precision} décimales "
+              f"(erreur max {max_error_bound(args.precision):.2f} m)")
+
+    if args.sqlite:
+        connection_factory = partial(sqlite3.connect, args.sqlite)
+        list_tables = list_sqlite_tables
+    else:
+        connection_factory = create_geojson.connect
+        list_tables = lambda connection: create_geojson.list_tables(connection.cursor())
+
+    tables = args.tables
+    if not tables:
+        with closing(connection_factory()) as connection:
+            tables = list_tables(connection)
+    print(f"Nombre de tables trouvées: {len(tables)}")
+
+    export_tables_parallel(connection_factory, tables, args.output_dir, args.connections,
+                           args.workers, args.batch_size,
+                           PROFILES[args.profile] if args.profile else None, args.precision,
+                           args.indent, args.serializer, filters_from_args(args), args.shards)
+
+
+if __name__ == "__main__":
+    main()
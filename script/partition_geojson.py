@@ -0,0 +1,158 @@
+import os
+import gzip
+import time
+import argparse
+
+from catalog import update_catalog
+from geojson_stream import FeatureCollectionWriter, encode_feature, iter_features
+from query_planner import FILTER_COLUMNS
+from region_index import iter_assigned, load_regions
+
+# Catégories découpées par attribut : propriétés lues (la première présente
+# est utilisée), les mêmes que celles des filtres de l'export
+PARTITIONS = {
+    "countries": FILTER_COLUMNS["country"],
+    "types": FILTER_COLUMNS["type"],
+}
+
+# Niveau gzip des partitions : compress_geojson_file.py produit ensuite les
+# variantes servies au niveau maximal
+DEFAULT_COMPRESSLEVEL = 6
+
+
+def partition_name(category, value):
+    """
+    Nom de fichier d'une partition, sur le modèle des tables exportées
+    (tbITALY, tbBOSNIA_AND_HERZEGOVINA, tbford) et des régions (europe)
+    """
+    value = str(value).strip().replace(' ', '_').replace('/', '_')
+    if category == "countries":
+        return f"tb{value.upper()}"
+    if category == "regions":
+        return value.lower()
+    return f"tb{value.lower()}"
+
+
+class PartitionWriters:
+    """Fichiers de sortie ouverts à la première feature de chaque partition"""
+
+    def __init__(self, output_dir, compresslevel=DEFAULT_COMPRESSLEVEL):
+        self.output_dir = output_dir
+        self.compresslevel = compresslevel
+        self.outputs = {}
+
+    def write(self, category, name, text):
+        """Écrit une feature déjà encodée (encode_feature) dans une partition"""
+        key = (category, name)
+        if key not in self.outputs:
+            category_dir = os.path.join(self.output_dir, category)
+            os.makedirs(category_dir, exist_ok=True)
+            path = os.path.join(category_dir, f"{name}.geojson.gz")
+            out = gzip.open(f"{path}.tmp", 'wt', encoding='utf-8', compresslevel=self.compresslevel)
+            self.outputs[key] = (path, out, FeatureCollectionWriter(out))
+        self.outputs[key][2].write_encoded(text)
+
+    def close(self, commit=True):
+        """Ferme les fichiers ; avec commit, remplace les fichiers existants"""
+        counts = {}
+        for (category, name), (path, out, writer) in self.outputs.items():
+            if commit:
+                writer.close()
+            out.close()
+            if commit:
+                os.replace(f"{path}.tmp", path)
+                counts[path] = writer.count
+            else:
+                os.remove(f"{path}.tmp")
+        return counts
+
+
+def partition_file(source, output_dir="data", categories=tuple(PARTITIONS), regions=None,
+                   compresslevel=DEFAULT_COMPRESSLEVEL, workers=None):
+    """
+    Découpe une FeatureCollection maîtresse en fichiers par pays, par type et
+    par région, en une seule lecture
+
+    Chaque feature est écrite au fil de l'eau dans toutes les partitions
+    auxquelles elle appartient ; elle n'est encodée qu'une fois et la
+    mémoire utilisée ne dépend pas de la taille de la source.
+
+    Args:
+        source: Fichier .geojson ou .geojson.gz maître
+        output_dir: Répertoire des données (data/<catégorie>/<nom>.geojson.gz)
+        categories: Catégories découpées par attribut (voir PARTITIONS)
+        regions: Régions retournées par region_index.load_regions (None : pas
+            de découpage par région) ; l'affectation des points est faite par
+            un pool de workers processus
+        compresslevel: Niveau de compression gzip des fichiers écrits
+        workers: Nombre de processus d'affectation aux régions
+
+    Returns:
+        Dictionnaire {fichier écrit: nombre de features}
+    """
+    if source.endswith('.gz'):
+        f = gzip.open(source, 'rt', encoding='utf-8')
+    else:
+        f = open(source, 'r', encoding='utf-8')
+
+    writers = PartitionWriters(output_dir, compresslevel)
+    try:
+        with f:
+            features = iter_features(f)
+            if regions:
+                assigned = iter_assigned(features, regions, workers)
+            else:
+                assigned = ((feature, ()) for feature in features)
+            for feature, region_names in assigned:
+                properties = feature.get("properties") or {}
+                text = encode_feature(feature)
+                for category in categories:
+                    value = next((properties[col] for col in PARTITIONS[category]
+                                  if properties.get(col) not in (None, '')), None)
+                    if value is not None:
+                        writers.write(category, partition_name(category, value), text)
+                for name in region_names:
+                    writers.write("regions", partition_name("regions", name), text)
+    except BaseException:
+        writers.close(commit=False)
+        raise
+    return writers.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Découper une FeatureCollection par pays, type et région')
+    parser.add_argument('source', help='Fichier .geojson ou .geojson.gz maître')
+    parser.add_argument('--output-dir', '-o', default='data',
+                        help='Répertoire des données (défaut : data)')
+    parser.add_argument('--categories', '-c', nargs='*', default=list(PARTITIONS),
+                        choices=list(PARTITIONS),
+                        help='Catégories découpées par attribut')
+    parser.add_argument('--regions', '-r',
+                        help='FeatureCollection des polygones de régions')
+    parser.add_argument('--region-name', default='name',
+                        help='Propriété portant le nom des régions (défaut : name)')
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                        help="Processus d'affectation aux régions (défaut : nombre de CPU)")
+    parser.add_argument('--compresslevel', type=int, default=DEFAULT_COMPRESSLEVEL,
+                        help=f'Niveau gzip des fichiers écrits (défaut : {DEFAULT_COMPRESSLEVEL})')
+    parser.add_argument('--catalog',
+                        help='Catalogue à mettre à jour avec les fichiers écrits')
+
+    args = parser.parse_args()
+
+    regions = load_regions(args.regions, args.region_name) if args.regions else None
+    start = time.perf_counter()
+    counts = partition_file(args.source, args.output_dir, args.categories, regions,
+                            args.compresslevel, args.workers)
+    elapsed = time.perf_counter() - start
+
+    for path, count in sorted(counts.items()):
+        print(f"  {path}: {count} features")
+    print(f"{len(counts)} fichiers écrits en {elapsed:.2f} s")
+
+    if args.catalog:
+        update_catalog(list(counts), args.catalog)
+
+
+if __name__ == "__main__":
+    main()
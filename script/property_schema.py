@@ -0,0 +1,364 @@
+import os
+import re
+import gzip
+import math
+import argparse
+from datetime import date, datetime
+from decimal import Decimal
+
+from geojson_stream import FeatureCollectionWriter, iter_features
+
+# Valeurs traitées comme absentes dans les colonnes numériques
+NULL_VALUES = ('NA', 'N/A', '', 'None', 'NULL', 'null')
+
+# Colonnes supprimées dans tous les profils :
+# - Longitude_WGS84 / Latitude_WGS84 répètent la géométrie
+# - point est la géométrie SQL Server binaire (WKB) convertie en texte
+BASE_DROP = ('Longitude_WGS84', 'Latitude_WGS84', 'point')
+
+# Colonnes supprimées seulement si la colonne dont elles sont la copie est
+# présente : ID est le GUID sans accolades
+BASE_DUPLICATES = {"ID": "GUID"}
+
+# Types déclarés des colonnes connues (les autres sont inférés ou gardés en texte)
+BASE_TYPES = {
+    "Height": "float",
+    "n": "int",
+}
+
+# Profils par catégorie : colonnes supprimées et types déclarés
+PROFILES = {
+    "countries": {
+        # Le pays est déjà donné par le nom du fichier
+        "drop": BASE_DROP + ('Country',),
+        "duplicates": BASE_DUPLICATES,
+        "types": BASE_TYPES,
+    },
+    "types": {
+        # Le type en minuscules est déjà donné par le nom du fichier (et LabelAtlas)
+        "drop": BASE_DROP + ('type',),
+        "duplicates": BASE_DUPLICATES,
+        "types": BASE_TYPES,
+    },
+    "regions": {
+        "drop": BASE_DROP,
+        "duplicates": BASE_DUPLICATES,
+        "types": BASE_TYPES,
+    },
+    "default": {
+        "drop": BASE_DROP,
+        "duplicates": BASE_DUPLICATES,
+        "types": BASE_TYPES,
+    },
+}
+
+
+def get_profile(category=None):
+    """Retourne le profil d'une catégorie (profil par défaut si inconnue)"""
+    return PROFILES.get(category, PROFILES["default"])
+
+
+def guess_category(file_path):
+    """Déduit la catégorie d'un fichier de son chemin (data/<catégorie>/...)"""
+    parts = os.path.normpath(file_path).split(os.sep)
+    for category in ('types', 'countries', 'regions'):
+        if category in parts:
+            return category
+    return None
+
+
+def country_from_path(file_path):
+    """
+    Pays d'un fichier par pays (data/countries/tb<PAYS>.geojson), tel
+    qu'écrit dans la propriété Country ("tbBOSNIA_AND_HERZEGOVINA" :
+    "BOSNIA AND HERZEGOVINA"), ou None pour un autre fichier
+    """
+    if guess_category(file_path) != 'countries':
+        return None
+    name = os.path.basename(file_path).split('.geojson')[0]
+    if len(name) <= 2 or name[:2].lower() != 'tb':
+        return None
+    return name[2:].replace('_', ' ').upper()
+
+
+def _parse_bool(value):
+    lowered = value.lower()
+    if lowered in ('true', '1', 'yes', 'oui'):
+        return True
+    if lowered in ('false', '0', 'no', 'non'):
+        return False
+    raise ValueError(value)
+
+
+def _parse_int(value):
+    number = int(value)
+    # Garder en texte les codes à zéros initiaux ("0123")
+    if str(number) != value.strip():
+        raise ValueError(value)
+    return number
+
+
+# Nombre décimal écrit simplement : ni nan/inf, ni séparateurs "_", ni
+# zéros initiaux ("0123", "007.5")
+_FLOAT = re.compile(r'^[+-]?(?:(?:0|[1-9]\d*)(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?$')
+
+
+def _parse_float(value):
+    if not _FLOAT.match(value):
+        raise ValueError(value)
+    number = float(value)
+    # Un dépassement ("1e999") donne l'infini, qui n'est pas du JSON valide
+    if not math.isfinite(number):
+        raise ValueError(value)
+    return number
+
+
+_PARSERS = {
+    "int": _parse_int,
+    "float": _parse_float,
+    "bool": _parse_bool,
+}
+
+
+def convert_value(value, kind=None):
+    """
+    Convertit une valeur (SQL ou texte) vers son type JSON natif
+
+    Args:
+        value: Valeur de la colonne
+        kind: Type déclaré ("int", "float", "bool", "str") ou None pour
+            garder le type natif de la valeur
+
+    Returns:
+        La valeur convertie, None pour une valeur absente
+
+    Raises:
+        ValueError: si la valeur ne correspond pas au type déclaré
+    """
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        value = float(value) if kind != "int" else int(value)
+    elif isinstance(value, (datetime, date)):
+        return value.isoformat()
+
+    if kind is None:
+        return value if isinstance(value, (bool, int, float, str)) else str(value)
+    if kind == "str":
+        return str(value)
+
+    if isinstance(value, str):
+        if value.strip() in NULL_VALUES:
+            return None
+        return _PARSERS[kind](value.strip())
+    if kind == "float":
+        return float(value)
+    if kind == "int":
+        return int(value)
+    return bool(value)
+
+
+def is_binary(value):
+    """Indique si une valeur est binaire (ou la représentation texte de bytes)"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return True
+    return isinstance(value, str) and value[:2] in ("b'", 'b"')
+
+
+def infer_column_types(features):
+    """
+    Infère le type de chaque colonne texte à partir des features
+
+    Une colonne est typée int, float ou bool si toutes ses valeurs non
+    absentes s'y convertissent, sinon elle reste en texte. Une colonne dont
+    toutes les valeurs texte sont absentes ("NA"...) reste aussi en texte :
+    sans échantillon, rien ne justifie de la vider. Les colonnes sans aucune
+    valeur texte (déjà typées) ne sont pas listées.
+
+    Returns:
+        Dictionnaire {colonne: type}
+    """
+    candidates = {}
+    sampled = set()
+    for feature in features:
+        for col, value in (feature.get("properties") or {}).items():
+            if not isinstance(value, str):
+                continue
+            kinds = candidates.setdefault(col, ["int", "float", "bool"])
+            if not kinds or value.strip() in NULL_VALUES:
+                continue
+            sampled.add(col)
+            for kind in list(kinds):
+                try:
+                    _PARSERS[kind](value.strip())
+                except ValueError:
+                    kinds.remove(kind)
+    return {col: (kinds[0] if kinds and col in sampled else "str")
+            for col, kinds in candidates.items()}
+
+
+def _open_geojson(file_path):
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'rt', encoding='utf-8')
+    return open(file_path, 'r', encoding='utf-8')
+
+
+def infer_files_types(files):
+    """
+    Infère le type des colonnes sur l'ensemble de plusieurs fichiers
+
+    Les fichiers d'une même catégorie reçoivent ainsi le même schéma, quelle
+    que soit la taille de chacun (voir infer_column_types).
+    """
+    def features():
+        for file_path in files:
+            with _open_geojson(file_path) as f:
+                yield from iter_features(f)
+
+    return infer_column_types(features())
+
+
+def normalize_properties(properties, profile, column_types=None):
+    """
+    Applique un profil aux propriétés d'une feature
+
+    Les colonnes du profil "drop", les copies listées dans "duplicates" et
+    les valeurs binaires sont supprimées, les autres sont converties vers
+    leur type déclaré ou inféré. Une valeur non convertible est gardée
+    telle quelle.
+    """
+    declared = profile.get("types", {})
+    drop = profile.get("drop", ())
+    duplicates = profile.get("duplicates", {})
+    result = {}
+    for col, value in properties.items():
+        if col in drop or is_binary(value):
+            continue
+        if col in duplicates and duplicates[col] in properties:
+            continue
+        kind = declared.get(col) or (column_types or {}).get(col)
+        try:
+            result[col] = convert_value(value, kind)
+        except ValueError:
+            result[col] = value
+    return result
+
+
+def normalize_file(source, destination=None, profile=None, infer=True, column_types=None):
+    """
+    Réécrit un fichier .geojson(.gz) avec des propriétés typées et compactées
+
+    Le fichier est lu en streaming (deux passes si les types sont inférés
+    sur ce seul fichier).
+
+    Args:
+        source: Fichier .geojson ou .geojson.gz
+        destination: Fichier de sortie (défaut : remplace la source)
+        profile: Profil à appliquer (défaut : selon la catégorie du chemin)
+        infer: Inférer le type des colonnes non déclarées
+        column_types: Types déjà inférés (voir infer_files_types) ; évite
+            l'inférence sur ce seul fichier
+
+    Returns:
+        Dictionnaire (source, features, original_size, normalized_size)
+    """
+    if profile is None:
+        profile = get_profile(guess_category(source))
+    if destination is None:
+        destination = source
+
+    def open_source():
+        return _open_geojson(source)
+
+    if not infer:
+        column_types = None
+    elif column_types is None:
+        with open_source() as f:
+            column_types = infer_column_types(iter_features(f))
+
+    tmp_path = f"{destination}.tmp"
+    if destination.endswith('.gz'):
+        out = gzip.open(tmp_path, 'wt', encoding='utf-8')
+    else:
+        out = open(tmp_path, 'w', encoding='utf-8')
+    with open_source() as f, out:
+        writer = FeatureCollectionWriter(out)
+        for feature in iter_features(f):
+            feature["properties"] = normalize_properties(feature.get("properties") or {},
+                                                         profile, column_types)
+            writer.write(feature)
+        writer.close()
+
+    original_size = os.path.getsize(source)
+    os.replace(tmp_path, destination)
+
+    return {
+        "source": source,
+        "features": writer.count,
+        "original_size": original_size,
+        "normalized_size": os.path.getsize(destination)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Typer et compacter les propriétés des GeoJSON')
+    parser.add_argument('--file', '-f', help='Fichier .geojson ou .geojson.gz à normaliser')
+    parser.add_argument('--directory', '-d', default='data',
+                        help='Répertoire à parcourir (défaut : data)')
+    parser.add_argument('--output-dir', '-o',
+                        help='Dossier de sortie (défaut : remplace les fichiers)')
+    parser.add_argument('--profile', '-p', choices=list(PROFILES),
+                        help='Profil à appliquer (défaut : selon la catégorie du fichier)')
+    parser.add_argument('--no-infer', action='store_true',
+                        help="Ne pas inférer le type des colonnes non déclarées")
+
+    args = parser.parse_args()
+
+    if args.file:
+        files = [args.file]
+    else:
+        files = [os.path.join(root, file)
+                 for root, _, names in os.walk(args.directory)
+                 for file in sorted(names) if file.endswith(('.geojson', '.geojson.gz'))]
+
+    # Un seul schéma par catégorie, inféré sur tous ses fichiers
+    groups = {}
+    for file_path in files:
+        groups.setdefault(args.profile or guess_category(file_path), []).append(file_path)
+    category_types = {}
+    if not args.no_infer and not args.file:
+        for category, group in groups.items():
+            try:
+                category_types[category] = infer_files_types(group)
+            except Exception as e:
+                print(f"Erreur lors de l'inférence des types ({category or 'sans catégorie'}): {e}")
+                return
+
+    total_before = total_after = 0
+    for file_path in files:
+        destination = None
+        if args.output_dir:
+            relative = os.path.relpath(file_path, args.directory if not args.file else os.path.dirname(file_path))
+            destination = os.path.join(args.output_dir, relative)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+        profile = get_profile(args.profile) if args.profile else None
+        try:
+            stats = normalize_file(file_path, destination, profile, not args.no_infer,
+                                   category_types.get(args.profile or guess_category(file_path)))
+        except Exception as e:
+            print(f"Erreur lors de la normalisation de {file_path}: {e}")
+            continue
+        saved = stats["original_size"] - stats["normalized_size"]
+        percent = saved / stats["original_size"] * 100 if stats["original_size"] else 0
+        print(f"{file_path}: {stats['original_size'] / 1024:.1f} KB -> "
+              f"{stats['normalized_size'] / 1024:.1f} KB ({saved / 1024:.1f} KB économisés, {percent:.1f}%)")
+        total_before += stats["original_size"]
+        total_after += stats["normalized_size"]
+
+    if total_before:
+        print(f"Total : {(total_before - total_after) / 1024:.1f} KB économisés "
+              f"({(1 - total_after / total_before) * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import math
+from decimal import Decimal
+
+# Colonnes sur lesquelles portent les filtres par type et par pays (la
+# première présente dans la table est utilisée)
+FILTER_COLUMNS = {
+    "type": ("type", "LabelAtlas"),
+    "country": ("Country", "country"),
+}
+
+# Types des identifiants dont les valeurs MIN/MAX permettent un découpage
+# en intervalles
+_NUMERIC_TYPES = (int, float, Decimal)
+
+
+def quote_identifier(name):
+    """Nom de table ou de colonne entre crochets (les ] sont doublés)"""
+    return "[" + str(name).replace("]", "]]") + "]"
+
+
+def find_filter_columns(columns):
+    """
+    Colonnes utilisées par les filtres type et country d'une table
+
+    Returns:
+        Dictionnaire {filtre: colonne ou None}
+    """
+    lower = {col.lower(): col for col in columns}
+    found = {}
+    for name, candidates in FILTER_COLUMNS.items():
+        found[name] = next((col for col in candidates if col in columns), None)
+        if found[name] is None:
+            found[name] = next((lower[col.lower()] for col in candidates if col.lower() in lower),
+                               None)
+    return found
+
+
+def project_columns(columns, lat_col, lon_col, profile=None):
+    """
+    Colonnes à lire pour une table
+
+    Sans profil, toutes les colonnes sont lues. Avec un profil, les colonnes
+    qu'il supprime (drop, copies listées dans duplicates) ne sont pas
+    demandées au serveur : elles ne transitent plus sur le réseau.
+
+    Returns:
+        Liste des colonnes du SELECT, coordonnées en tête
+    """
+    properties = [col for col in columns if col not in (lat_col, lon_col)]
+    if profile is not None:
+        drop = profile.get("drop", ())
+        duplicates = profile.get("duplicates", {})
+        properties = [col for col in properties
+                      if col not in drop
+                      and not (col in duplicates and duplicates[col] in properties)]
+    return [lat_col, lon_col] + properties
+
+
+def build_where(lat_col, lon_col, filters=None, filter_columns=None, id_col=None):
+    """
+    Clause WHERE paramétrée : coordonnées présentes et valides, emprise,
+    types, pays et intervalle d'identifiants
+
+    Args:
+        lat_col: Colonne de latitude
+        lon_col: Colonne de longitude
+        filters: Dictionnaire des filtres (tous optionnels) :
+            bbox (ouest, sud, est, nord), types (liste), countries (liste),
+            id_range (début inclus, fin exclue ; None pour une borne ouverte)
+        filter_columns: Colonnes des filtres type et country (voir
+            find_filter_columns)
+        id_col: Colonne de l'identifiant (filtre id_range)
+
+    Returns:
+        Tuple (texte de la clause sans le mot WHERE, liste des paramètres)
+
+    Raises:
+        ValueError: si un filtre porte sur une colonne absente de la table
+    """
+    filters = filters or {}
+    filter_columns = filter_columns or {}
+    lat = quote_identifier(lat_col)
+    lon = quote_identifier(lon_col)
+
+    bbox = filters.get("bbox")
+    if bbox is not None:
+        west, south, east, north = bbox
+        south, north = max(south, -90), min(north, 90)
+        west, east = max(west, -180), min(east, 180)
+    else:
+        west, south, east, north = -180, -90, 180, 90
+
+    conditions = [f"{lat} IS NOT NULL", f"{lon} IS NOT NULL",
+                  f"{lat} BETWEEN ? AND ?", f"{lon} BETWEEN ? AND ?"]
+    params = [south, north, west, east]
+
+    for name, key in (("type", "types"), ("country", "countries")):
+        values = filters.get(key)
+        if not values:
+            continue
+        column = filter_columns.get(name)
+        if column is None:
+            raise ValueError(f"Filtre {key} impossible : aucune colonne {' / '.join(FILTER_COLUMNS[name])}")
+        conditions.append(f"{quote_identifier(column)} IN ({', '.join('?' * len(values))})")
+        params.extend(values)
+
+    id_range = filters.get("id_range")
+    if id_range is not None:
+        if id_col is None:
+            raise ValueError("Filtre id_range impossible : aucune colonne d'identifiant")
+        start, end = id_range
+        if start is not None:
+            conditions.append(f"{quote_identifier(id_col)} >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append(f"{quote_identifier(id_col)} < ?")
+            params.append(end)
+
+    return " AND ".join(conditions), params
+
+
+def build_select(table_name, select_columns, lat_col, lon_col, filters=None, filter_columns=None,
+                 id_col=None):
+    """
+    Requête SELECT paramétrée d'une table (les noms sont entre crochets, les
+    valeurs passées en paramètres ?)
+
+    Avec id_col, les lignes sont triées par identifiant : l'export en
+    intervalles d'identifiants (id_shards) produit alors le même fichier
+    que l'export d'une seule requête.
+
+    Returns:
+        Tuple (requête, paramètres) à passer à cursor.execute
+    """
+    where, params = build_where(lat_col, lon_col, filters, filter_columns, id_col)
+    cols = ", ".join(quote_identifier(col) for col in select_columns)
+    query = f"SELECT {cols} FROM {quote_identifier(table_name)} WHERE {where}"
+    if id_col is not None:
+        query += f" ORDER BY {quote_identifier(id_col)}"
+    return query, params
+
+
+def _plain_number(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def id_shards(cursor, table_name, id_col, shards):
+    """
+    Découpe une table en intervalles d'identifiants de tailles égales
+
+    Une seule requête d'agrégat (MIN, MAX) est exécutée. Les intervalles
+    sont contigus et couvrent toute la table : le premier et le dernier
+    sont ouverts, pour ne perdre aucune ligne ajoutée entre-temps.
+
+    Returns:
+        Liste de (début inclus, fin exclue) à passer dans le filtre
+        id_range ; [(None, None)] si la colonne n'est pas numérique ou si
+        la table est vide
+    """
+    id_ = quote_identifier(id_col)
+    cursor.execute(f"SELECT MIN({id_}), MAX({id_}) FROM {quote_identifier(table_name)}")
+    low, high = cursor.fetchone()
+    if shards <= 1 or not isinstance(low, _NUMERIC_TYPES) or not isinstance(high, _NUMERIC_TYPES):
+        return [(None, None)]
+    if isinstance(low, bool) or low >= high:
+        return [(None, None)]
+    # numeric(p, 0) est lu en Decimal
+    low, high = _plain_number(low), _plain_number(high)
+
+    step = (high - low) / shards
+    if isinstance(low, int) and isinstance(high, int):
+        step = max(1, math.ceil((high - low + 1) / shards))
+    bounds = [low + step * i for i in range(1, shards)]
+    bounds = sorted(set(b for b in bounds if low < b <= high))
+    starts = [None] + bounds
+    ends = bounds + [None]
+    return list(zip(starts, ends))
+
+
+def _bound(text):
+    """Borne d'intervalle lue en ligne de commande ('-' : borne ouverte)"""
+    if text == '-':
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def add_filter_arguments(parser):
+    """Ajoute les options de filtrage côté serveur à un parser argparse"""
+    group = parser.add_argument_group('filtres (évalués par le serveur)')
+    group.add_argument('--bbox', type=float, nargs=4, metavar=('OUEST', 'SUD', 'EST', 'NORD'),
+                       help='Emprise des points exportés')
+    group.add_argument('--types', nargs='+', metavar='TYPE',
+                       help=f"Types exportés (colonne {' / '.join(FILTER_COLUMNS['type'])})")
+    group.add_argument('--countries', nargs='+', metavar='PAYS',
+                       help=f"Pays exportés (colonne {' / '.join(FILTER_COLUMNS['country'])})")
+    group.add_argument('--id-range', type=_bound, nargs=2, metavar=('DEBUT', 'FIN'),
+                       help="Intervalle d'identifiants [DEBUT, FIN[ ('-' : borne ouverte)")
+    return group
+
+
+def filters_from_args(args):
+    """Dictionnaire des filtres correspondant aux options de add_filter_arguments"""
+    filters = {
+        "bbox": args.bbox,
+        "types": args.types,
+        "countries": args.countries,
+        "id_range": tuple(args.id_range) if args.id_range else None,
+    }
+    return {key: value for key, value in filters.items() if value}
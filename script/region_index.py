@@ -0,0 +1,359 @@
+import os
+import gzip
+import json
+import math
+import bisect
+import time
+import random
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from geojson_stream import iter_features
+
+# Nombre de cellules par côté de la grille d'un polygone préparé
+DEFAULT_GRID_SIZE = 64
+
+# Nombre de cellules par côté de la grille de sélection des régions candidates
+REGION_GRID_SIZE = 256
+
+# Nombre de points envoyés à un processus à la fois
+DEFAULT_BATCH_SIZE = 50000
+
+# État des cellules d'une grille préparée
+OUTSIDE, INSIDE, BOUNDARY = 0, 1, 2
+
+
+def _polygon_bbox(polygons):
+    xs = [position[0] for polygon in polygons for ring in polygon for position in ring]
+    ys = [position[1] for polygon in polygons for ring in polygon for position in ring]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def load_regions(regions_file, name_property="name"):
+    """
+    Lit les polygones des régions
+
+    Returns:
+        Liste de (nom, emprise, polygones) où polygones est une liste de
+        Polygon GeoJSON (anneau extérieur puis trous)
+    """
+    with open(regions_file, 'r', encoding='utf-8') as f:
+        collection = json.load(f)
+    regions = []
+    for feature in collection.get("features", []):
+        geometry = feature.get("geometry") or {}
+        if geometry.get("type") == "Polygon":
+            polygons = [geometry["coordinates"]]
+        elif geometry.get("type") == "MultiPolygon":
+            polygons = geometry["coordinates"]
+        else:
+            continue
+        name = (feature.get("properties") or {}).get(name_property)
+        if name is None:
+            continue
+        regions.append((str(name), _polygon_bbox(polygons), polygons))
+    return regions
+
+
+def _in_ring(x, y, ring):
+    """Test du point dans un anneau par lancer de rayon"""
+    inside = False
+    x1, y1 = ring[-1][:2]
+    for x2, y2 in (position[:2] for position in ring):
+        if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
+
+
+def point_in_polygons(x, y, polygons):
+    """Indique si un point est dans l'un des polygones (trous exclus)"""
+    for polygon in polygons:
+        if _in_ring(x, y, polygon[0]) and not any(_in_ring(x, y, hole) for hole in polygon[1:]):
+            return True
+    return False
+
+
+def find_regions(regions, x, y):
+    """Noms des régions contenant un point (test direct de chaque polygone)"""
+    return [name for name, (min_x, min_y, max_x, max_y), polygons in regions
+            if min_x <= x <= max_x and min_y <= y <= max_y and point_in_polygons(x, y, polygons)]
+
+
+class PreparedPolygon:
+    """
+    Polygone (ou multipolygone) préparé pour des tests d'appartenance rapides
+
+    L'emprise est découpée en grid_size x grid_size cellules. Les cellules
+    traversées par aucune arête sont entièrement dedans ou dehors : le test
+    se résume à une lecture. Pour une cellule de bord, le rayon de _in_ring
+    est lancé sur les seules arêtes de la ligne de cellules, triées pour
+    s'arrêter à la première arête entièrement à gauche du point : un point
+    situé exactement sur une arête suit ainsi la même règle que
+    point_in_polygons (bords gauche et bas dedans, droit et haut dehors).
+    """
+
+    def __init__(self, polygons, grid_size=DEFAULT_GRID_SIZE):
+        self.bbox = _polygon_bbox(polygons)
+        self.grid_size = grid_size
+        min_x, min_y, max_x, max_y = self.bbox
+        self.cell_w = (max_x - min_x) / grid_size or 1e-12
+        self.cell_h = (max_y - min_y) / grid_size or 1e-12
+
+        edges = []
+        for polygon in polygons:
+            for ring in polygon:
+                for (ax, ay), (bx, by) in zip((p[:2] for p in ring[-1:] + ring[:-1]), (p[:2] for p in ring)):
+                    if (ax, ay) != (bx, by):
+                        edges.append((ax, ay, bx, by))
+
+        # Cellules de bord (emprise de l'arête, approximation conservatrice) et
+        # arêtes de chaque ligne de cellules, de la plus à droite à la plus à gauche
+        boundary = set()
+        self.rows = [[] for _ in range(grid_size)]
+        for edge in edges:
+            col0, row0 = self._cell(min(edge[0], edge[2]), min(edge[1], edge[3]))
+            col1, row1 = self._cell(max(edge[0], edge[2]), max(edge[1], edge[3]))
+            for row in range(row0, row1 + 1):
+                self.rows[row].append((max(edge[0], edge[2]),) + edge)
+                for col in range(col0, col1 + 1):
+                    boundary.add(row * grid_size + col)
+        for row_edges in self.rows:
+            row_edges.sort(reverse=True)
+
+        # Intersections de chaque ligne de centres de cellules avec les arêtes
+        # (balayage : l'appartenance d'un centre est la parité des
+        # intersections situées à sa gauche)
+        crossings = [[] for _ in range(grid_size)]
+        for ax, ay, bx, by in edges:
+            row0 = max(0, int((min(ay, by) - min_y) / self.cell_h - 0.5))
+            row1 = min(grid_size - 1, int((max(ay, by) - min_y) / self.cell_h + 0.5))
+            for row in range(row0, row1 + 1):
+                cy = min_y + (row + 0.5) * self.cell_h
+                if (ay > cy) != (by > cy):
+                    crossings[row].append((bx - ax) * (cy - ay) / (by - ay) + ax)
+
+        # État de chaque cellule
+        self.states = bytearray(grid_size * grid_size)
+        for row in range(grid_size):
+            xs = sorted(crossings[row])
+            for col in range(grid_size):
+                cell = row * grid_size + col
+                cx, _ = self._center(col, row)
+                inside = bisect.bisect_left(xs, cx) % 2 == 1
+                if cell in boundary:
+                    self.states[cell] = BOUNDARY
+                elif inside:
+                    self.states[cell] = INSIDE
+
+    def _cell(self, x, y):
+        col = min(self.grid_size - 1, max(0, int((x - self.bbox[0]) / self.cell_w)))
+        row = min(self.grid_size - 1, max(0, int((y - self.bbox[1]) / self.cell_h)))
+        return col, row
+
+    def _center(self, col, row):
+        return self.bbox[0] + (col + 0.5) * self.cell_w, self.bbox[1] + (row + 0.5) * self.cell_h
+
+    def contains(self, x, y):
+        """Indique si le point (x, y) est dans le polygone"""
+        min_x, min_y, max_x, max_y = self.bbox
+        if not (min_x <= x <= max_x and min_y <= y <= max_y):
+            return False
+        col, row = self._cell(x, y)
+        cell = row * self.grid_size + col
+        state = self.states[cell]
+        if state != BOUNDARY:
+            return state == INSIDE
+        # Même calcul que _in_ring, arête par arête, pour un résultat identique
+        inside = False
+        for right, ax, ay, bx, by in self.rows[row]:
+            if right <= x:
+                break
+            if (ay > y) != (by > y) and x < (bx - ax) * (y - ay) / (by - ay) + ax:
+                inside = not inside
+        return inside
+
+
+class RegionIndex:
+    """
+    Index des régions : grille de sélection des régions candidates puis
+    polygones préparés
+    """
+
+    def __init__(self, regions, grid_size=DEFAULT_GRID_SIZE):
+        self.names = [name for name, _, _ in regions]
+        self.polygons = [PreparedPolygon(polygons, grid_size) for _, _, polygons in regions]
+        if not regions:
+            self.bbox = (0.0, 0.0, 0.0, 0.0)
+            self.cells = {}
+            return
+        bboxes = [bbox for _, bbox, _ in regions]
+        self.bbox = (min(b[0] for b in bboxes), min(b[1] for b in bboxes),
+                     max(b[2] for b in bboxes), max(b[3] for b in bboxes))
+        self.cell_w = (self.bbox[2] - self.bbox[0]) / REGION_GRID_SIZE or 1e-12
+        self.cell_h = (self.bbox[3] - self.bbox[1]) / REGION_GRID_SIZE or 1e-12
+        self.cells = {}
+        for i, (min_x, min_y, max_x, max_y) in enumerate(bboxes):
+            col0, row0 = self._cell(min_x, min_y)
+            col1, row1 = self._cell(max_x, max_y)
+            for row in range(row0, row1 + 1):
+                for col in range(col0, col1 + 1):
+                    self.cells.setdefault(row * REGION_GRID_SIZE + col, []).append(i)
+
+    def _cell(self, x, y):
+        col = min(REGION_GRID_SIZE - 1, max(0, int((x - self.bbox[0]) / self.cell_w)))
+        row = min(REGION_GRID_SIZE - 1, max(0, int((y - self.bbox[1]) / self.cell_h)))
+        return col, row
+
+    def find(self, x, y):
+        """Noms des régions contenant un point"""
+        if not (self.bbox[0] <= x <= self.bbox[2] and self.bbox[1] <= y <= self.bbox[3]):
+            return []
+        col, row = self._cell(x, y)
+        return [self.names[i] for i in self.cells.get(row * REGION_GRID_SIZE + col, ())
+                if self.polygons[i].contains(x, y)]
+
+    def assign(self, xs, ys):
+        """Régions de chaque point d'un lot (listes de longitudes et latitudes)"""
+        find = self.find
+        return [find(x, y) for x, y in zip(xs, ys)]
+
+
+# Index de chaque processus du pool, construit une fois par processus
+_worker_index = None
+
+
+def _init_worker(regions, grid_size):
+    global _worker_index
+    _worker_index = RegionIndex(regions, grid_size)
+
+
+def _assign_batch(xs, ys):
+    return _worker_index.assign(xs, ys)
+
+
+def iter_assigned(features, regions, workers=None, batch_size=DEFAULT_BATCH_SIZE,
+                  grid_size=DEFAULT_GRID_SIZE):
+    """
+    Associe à chaque feature ponctuelle la liste des régions qui la contiennent
+
+    Les features sont lues par lots ; les coordonnées de chaque lot sont
+    envoyées au pool de processus (qui a construit son propre index) tandis
+    que les lots suivants sont lus.
+
+    Yields:
+        (feature, noms des régions)
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(regions, grid_size)) as executor:
+        max_pending = (workers or os.cpu_count() or 1) * 2
+        pending = deque()
+
+        def submit(batch):
+            xs = []
+            ys = []
+            for feature in batch:
+                geometry = feature.get("geometry") or {}
+                if geometry.get("type") == "Point":
+                    xs.append(geometry["coordinates"][0])
+                    ys.append(geometry["coordinates"][1])
+                else:
+                    xs.append(math.nan)
+                    ys.append(math.nan)
+            pending.append((batch, executor.submit(_assign_batch, xs, ys)))
+
+        batch = []
+        for feature in features:
+            batch.append(feature)
+            if len(batch) >= batch_size:
+                submit(batch)
+                batch = []
+                while len(pending) >= max_pending:
+                    done, future = pending.popleft()
+                    yield from zip(done, future.result())
+        if batch:
+            submit(batch)
+        while pending:
+            done, future = pending.popleft()
+            yield from zip(done, future.result())
+
+
+def benchmark(regions, points, workers=None, grid_size=DEFAULT_GRID_SIZE):
+    """
+    Compare le test direct des polygones, l'index et l'index en parallèle
+
+    Returns:
+        Dictionnaire des débits (points par seconde) et du temps de préparation
+    """
+    xs = [x for x, _ in points]
+    ys = [y for _, y in points]
+
+    start = time.perf_counter()
+    naive = [find_regions(regions, x, y) for x, y in points]
+    naive_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = RegionIndex(regions, grid_size)
+    prepare_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = index.assign(xs, ys)
+    index_time = time.perf_counter() - start
+
+    features = ({"geometry": {"type": "Point", "coordinates": point}} for point in points)
+    start = time.perf_counter()
+    parallel = [names for _, names in iter_assigned(features, regions, workers, grid_size=grid_size)]
+    parallel_time = time.perf_counter() - start
+
+    differences = sum(a != b for a, b in zip(naive, indexed))
+    if parallel != indexed:
+        raise AssertionError("Résultats différents entre l'index et l'index en parallèle")
+
+    return {
+        "points": len(points),
+        "prepare_s": prepare_time,
+        "naive_pts_s": len(points) / naive_time,
+        "index_pts_s": len(points) / index_time,
+        "parallel_pts_s": len(points) / parallel_time,
+        "differences": differences
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesurer l'affectation des points aux régions")
+    parser.add_argument('source', help='Fichier .geojson ou .geojson.gz de points')
+    parser.add_argument('--regions', '-r', required=True,
+                        help='FeatureCollection des polygones de régions')
+    parser.add_argument('--region-name', default='name',
+                        help='Propriété portant le nom des régions (défaut : name)')
+    parser.add_argument('--points', '-n', type=int, default=100000,
+                        help='Nombre de points de la source utilisés (défaut : 100000)')
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                        help='Nombre de processus (défaut : nombre de CPU)')
+    parser.add_argument('--grid-size', '-g', type=int, default=DEFAULT_GRID_SIZE,
+                        help='Cellules par côté de la grille de chaque polygone')
+
+    args = parser.parse_args()
+
+    regions = load_regions(args.regions, args.region_name)
+    if args.source.endswith('.gz'):
+        f = gzip.open(args.source, 'rt', encoding='utf-8')
+    else:
+        f = open(args.source, 'r', encoding='utf-8')
+    with f:
+        points = [tuple(feature["geometry"]["coordinates"][:2]) for feature in iter_features(f)
+                  if (feature.get("geometry") or {}).get("type") == "Point"]
+    points = random.Random(0).sample(points, min(args.points, len(points)))
+
+    stats = benchmark(regions, points, args.workers, args.grid_size)
+    print(f"{len(regions)} régions, {stats['points']} points, "
+          f"index préparé en {stats['prepare_s'] * 1000:.1f} ms")
+    print(f"  Test direct         : {stats['naive_pts_s']:>12,.0f} points/s")
+    print(f"  Index               : {stats['index_pts_s']:>12,.0f} points/s")
+    print(f"  Index en parallèle  : {stats['parallel_pts_s']:>12,.0f} points/s")
+    print(f"  Différences         : {stats['differences']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+import os
+import gzip
+import math
+import time
+import heapq
+import random
+import struct
+import argparse
+from array import array
+
+from build_catalog import refresh_dataset
+from catalog import DEFAULT_CATALOG
+from compress_geojson_file import CODECS, available_codecs, write_variants
+from geojson_stream import FeatureCollectionWriter, iter_features
+
+# En-tête du fichier d'index : signature, nombre de points, taille des nœuds, nombre de niveaux
+INDEX_MAGIC = b'CDNIDX\x01\x00'
+HEADER = struct.Struct('<8sIHH')
+
+DEFAULT_NODE_SIZE = 16
+
+# Mètres par degré de latitude
+METERS_PER_DEGREE = 111320.0
+
+# Résolution de la grille de Hilbert (16 bits par axe)
+HILBERT_MAX = (1 << 16) - 1
+
+
+def hilbert(x, y):
+    """Rang d'une cellule (x, y) de la grille 2^16 x 2^16 sur la courbe de Hilbert"""
+    a = x ^ y
+    b = 0xFFFF ^ a
+    c = 0xFFFF ^ (x | y)
+    d = x & (y ^ 0xFFFF)
+
+    A = a | (b >> 1)
+    B = (a >> 1) ^ a
+    C = ((c >> 1) ^ (b & (d >> 1))) ^ c
+    D = ((a & (c >> 1)) ^ (d >> 1)) ^ d
+
+    a = A
+    b = B
+    c = C
+    d = D
+    A = (a & (a >> 2)) ^ (b & (b >> 2))
+    B = (a & (b >> 2)) ^ (b & ((a ^ b) >> 2))
+    C ^= (a & (c >> 2)) ^ (b & (d >> 2))
+    D ^= (b & (c >> 2)) ^ ((a ^ b) & (d >> 2))
+
+    a = A
+    b = B
+    c = C
+    d = D
+    A = (a & (a >> 4)) ^ (b & (b >> 4))
+    B = (a & (b >> 4)) ^ (b & ((a ^ b) >> 4))
+    C ^= (a & (c >> 4)) ^ (b & (d >> 4))
+    D ^= (b & (c >> 4)) ^ ((a ^ b) & (d >> 4))
+
+    a = A
+    b = B
+    c = C
+    d = D
+    C ^= (a & (c >> 8)) ^ (b & (d >> 8))
+    D ^= (b & (c >> 8)) ^ ((a ^ b) & (d >> 8))
+
+    a = C ^ (C >> 1)
+    b = D ^ (D >> 1)
+
+    i0 = x ^ y
+    i1 = b | (0xFFFF ^ (i0 | a))
+
+    i0 = (i0 | (i0 << 8)) & 0x00FF00FF
+    i0 = (i0 | (i0 << 4)) & 0x0F0F0F0F
+    i0 = (i0 | (i0 << 2)) & 0x33333333
+    i0 = (i0 | (i0 << 1)) & 0x55555555
+
+    i1 = (i1 | (i1 << 8)) & 0x00FF00FF
+    i1 = (i1 | (i1 << 4)) & 0x0F0F0F0F
+    i1 = (i1 | (i1 << 2)) & 0x33333333
+    i1 = (i1 | (i1 << 1)) & 0x55555555
+
+    return (i1 << 1) | i0
+
+
+def hilbert_sort(features):
+    """Trie les features ponctuelles le long de la courbe de Hilbert (sur place)"""
+    if not features:
+        return features
+    xs = [f["geometry"]["coordinates"][0] for f in features]
+    ys = [f["geometry"]["coordinates"][1] for f in features]
+    min_x, max_x = min(xs), max(xs)
+    min_y, max_y = min(ys), max(ys)
+    width = (max_x - min_x) or 1.0
+    height = (max_y - min_y) or 1.0
+
+    def key(feature):
+        x, y = feature["geometry"]["coordinates"][:2]
+        return hilbert(int(HILBERT_MAX * (x - min_x) / width),
+                       int(HILBERT_MAX * (y - min_y) / height))
+
+    features.sort(key=key)
+    return features
+
+
+def pack_index(points, node_size=DEFAULT_NODE_SIZE):
+    """
+    Construit un R-tree compact (packed) sur des points déjà triés
+
+    Chaque nœud d'un niveau englobe node_size éléments consécutifs du niveau
+    inférieur : seules les emprises sont stockées, sans pointeurs.
+
+    Args:
+        points: Liste de (x, y) dans l'ordre des features
+        node_size: Nombre d'enfants par nœud
+
+    Returns:
+        Octets du fichier d'index
+    """
+    leaves = array('d')
+    for x, y in points:
+        leaves.append(x)
+        leaves.append(y)
+
+    levels = []
+    # Emprises du premier niveau de nœuds, calculées depuis les points
+    boxes = array('d')
+    for start in range(0, len(points), node_size):
+        group = points[start:start + node_size]
+        boxes.extend((min(p[0] for p in group), min(p[1] for p in group),
+                      max(p[0] for p in group), max(p[1] for p in group)))
+    if points:
+        levels.append(boxes)
+    # Niveaux supérieurs jusqu'à la racine (un seul nœud)
+    while levels and len(levels[-1]) > 4:
+        lower = levels[-1]
+        count = len(lower) // 4
+        boxes = array('d')
+        for start in range(0, count, node_size):
+            end = min(start + node_size, count)
+            boxes.extend((min(lower[i * 4] for i in range(start, end)),
+                          min(lower[i * 4 + 1] for i in range(start, end)),
+                          max(lower[i * 4 + 2] for i in range(start, end)),
+                          max(lower[i * 4 + 3] for i in range(start, end))))
+        levels.append(boxes)
+
+    header = HEADER.pack(INDEX_MAGIC, len(points), node_size, len(levels))
+    sizes = array('I', [len(level) // 4 for level in levels])
+    return header + sizes.tobytes() + leaves.tobytes() + b''.join(level.tobytes() for level in levels)
+
+
+class SpatialIndex:
+    """
+    Index spatial d'un fichier GeoJSON trié, lu depuis son fichier .idx
+
+    Les tableaux sont des vues sur les octets du fichier (sans copie). Les
+    résultats sont des rangs de features dans le fichier trié.
+    """
+
+    def __init__(self, data):
+        magic, self.count, self.node_size, num_levels = HEADER.unpack_from(data, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError("Fichier d'index invalide")
+        view = memoryview(data)
+        offset = HEADER.size
+        sizes = view[offset:offset + 4 * num_levels].cast('I')
+        offset += 4 * num_levels
+        self.points = view[offset:offset + 16 * self.count].cast('d')
+        offset += 16 * self.count
+        self.levels = []
+        for size in sizes:
+            self.levels.append(view[offset:offset + 32 * size].cast('d'))
+            offset += 32 * size
+
+    @classmethod
+    def load(cls, index_path):
+        """Charge un fichier .idx"""
+        with open(index_path, 'rb') as f:
+            return cls(f.read())
+
+    def _children(self, level, node):
+        """Intervalle des enfants d'un nœud dans le niveau inférieur (ou des points)"""
+        below = self.count if level == 0 else len(self.levels[level - 1]) // 4
+        start = node * self.node_size
+        return start, min(start + self.node_size, below)
+
+    def query_bbox(self, min_x, min_y, max_x, max_y):
+        """Rangs des points contenus dans l'emprise, triés"""
+        if not self.levels:
+            return []
+        results = []
+        points = self.points
+        top = len(self.levels) - 1
+        stack = [(top, node) for node in range(len(self.levels[top]) // 4)]
+        while stack:
+            level, node = stack.pop()
+            boxes = self.levels[level]
+            i = node * 4
+            if boxes[i] > max_x or boxes[i + 1] > max_y or boxes[i + 2] < min_x or boxes[i + 3] < min_y:
+                continue
+            start, end = self._children(level, node)
+            if level == 0:
+                for index in range(start, end):
+                    x = points[index * 2]
+                    y = points[index * 2 + 1]
+                    if min_x <= x <= max_x and min_y <= y <= max_y:
+                        results.append(index)
+            else:
+                stack.extend((level - 1, child) for child in range(start, end))
+        results.sort()
+        return results
+
+    def nearest(self, lon, lat, k=1):
+        """
+        Les k points les plus proches d'une position
+
+        Returns:
+            Liste de (rang, distance en mètres), du plus proche au plus lointain
+        """
+        if not self.levels:
+            return []
+        scale = math.cos(math.radians(lat))
+        points = self.points
+
+        def box_distance(boxes, i):
+            dx = max(boxes[i] - lon, 0.0, lon - boxes[i + 2]) * scale
+            dy = max(boxes[i + 1] - lat, 0.0, lat - boxes[i + 3])
+            return dx * dx + dy * dy
+
+        top = len(self.levels) - 1
+        # File de priorité : (distance², est_un_point, niveau, rang)
+        queue = [(box_distance(self.levels[top], node * 4), 1, top, node)
+                 for node in range(len(self.levels[top]) // 4)]
+        heapq.heapify(queue)
+        results = []
+        while queue and len(results) < k:
+            distance, is_node, level, item = heapq.heappop(queue)
+            if not is_node:
+                results.append((item, math.sqrt(distance) * METERS_PER_DEGREE))
+                continue
+            start, end = self._children(level, item)
+            if level == 0:
+                for index in range(start, end):
+                    dx = (points[index * 2] - lon) * scale
+                    dy = points[index * 2 + 1] - lat
+                    heapq.heappush(queue, (dx * dx + dy * dy, 0, 0, index))
+            else:
+                boxes = self.levels[level - 1]
+                for child in range(start, end):
+                    heapq.heappush(queue, (box_distance(boxes, child * 4), 1, level - 1, child))
+        return results
+
+
+def index_path_for(file_path):
+    """Chemin du fichier d'index d'un GeoJSON (data/x.geojson.gz -> data/x.geojson.idx)"""
+    base_path = file_path[:-3] if file_path.endswith('.gz') else file_path
+    return f"{base_path}.idx"
+
+
+def _read_features(file_path, members=None):
+    if file_path.endswith('.gz'):
+        source = gzip.open(file_path, 'rt', encoding='utf-8')
+    else:
+        source = open(file_path, 'r', encoding='utf-8')
+    with source:
+        return list(iter_features(source, members=members))
+
+
+def _write_features(features, file_path, tmp_path, members=None):
+    """Écrit la collection de file_path dans tmp_path (compressée si file_path est un .gz)"""
+    if file_path.endswith('.gz'):
+        out = gzip.open(tmp_path, 'wt', encoding='utf-8')
+    else:
+        out = open(tmp_path, 'w', encoding='utf-8')
+    with out:
+        writer = FeatureCollectionWriter(out, members=members)
+        for feature in features:
+            writer.write(feature)
+        writer.close()
+
+
+def build_index(file_path, node_size=DEFAULT_NODE_SIZE, catalog_path=None):
+    """
+    Trie les features d'un fichier selon la courbe de Hilbert, réécrit le
+    fichier (et son jumeau .geojson / .geojson.gz s'il existe) puis écrit
+    l'index .idx à côté
+
+    Seules les features ponctuelles sont indexées ; les autres sont placées
+    à la fin du fichier. Les autres membres de la collection (name, crs,
+    bbox...) sont conservés. Les rangs de l'index désignent l'ordre des
+    features dans toutes les variantes : les variantes .br et .zst
+    existantes sont régénérées (supprimées si leur codec n'est pas
+    installé) et, avec catalog_path, l'entrée du catalogue (tailles et
+    SHA-256 des encodages, statistiques) est mise à jour. Tous les fichiers
+    sont d'abord écrits en .tmp, puis renommés ensemble : un lecteur ne voit
+    jamais l'index d'un ordre avec les features d'un autre.
+
+    Returns:
+        Chemin du fichier d'index
+    """
+    members = {}
+    features = _read_features(file_path, members)
+    points = [f for f in features if (f.get("geometry") or {}).get("type") == "Point"]
+    others = [f for f in features if (f.get("geometry") or {}).get("type") != "Point"]
+    hilbert_sort(points)
+
+    base_path = file_path[:-3] if file_path.endswith('.gz') else file_path
+    index_path = index_path_for(file_path)
+    stale = [codec for codec in ("br", "zstd") if os.path.isfile(base_path + CODECS[codec][0])]
+    codecs = [codec for codec in stale if codec in available_codecs()]
+
+    staged = []
+    try:
+        for path in (base_path, f"{base_path}.gz"):
+            if os.path.isfile(path):
+                staged.append((f"{path}.tmp", path))
+                _write_features(points + others, path, f"{path}.tmp", members)
+        if codecs:
+            # Variantes compressées depuis la nouvelle version (encore temporaire)
+            source = staged[0][0]
+            for info in write_variants(base_path, codecs, source=source, replace=False).values():
+                staged.append((f"{info['path']}.tmp", info["path"]))
+        data = pack_index([tuple(f["geometry"]["coordinates"][:2]) for f in points], node_size)
+        staged.append((f"{index_path}.tmp", index_path))
+        with open(f"{index_path}.tmp", 'wb') as f:
+            f.write(data)
+    except BaseException:
+        for tmp_path, _ in staged:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        raise
+    for tmp_path, path in staged:
+        os.replace(tmp_path, path)
+
+    for codec in stale:
+        if codec not in codecs:
+            print(f"Codec {codec} non installé : variante {base_path + CODECS[codec][0]} supprimée")
+            os.remove(base_path + CODECS[codec][0])
+    if catalog_path:
+        refresh_dataset(file_path, catalog_path)
+    return index_path
+
+
+def benchmark(file_path, queries=1000, k=10, seed=0):
+    """
+    Compare l'index à un parcours linéaire des coordonnées
+
+    Returns:
+        Dictionnaire des temps moyens par requête (en millisecondes)
+    """
+    index = SpatialIndex.load(index_path_for(file_path))
+    coordinates = [(index.points[i * 2], index.points[i * 2 + 1]) for i in range(index.count)]
+    if not coordinates:
+        return {}
+    rng = random.Random(seed)
+    min_x = min(x for x, _ in coordinates)
+    max_x = max(x for x, _ in coordinates)
+    min_y = min(y for _, y in coordinates)
+    max_y = max(y for _, y in coordinates)
+    # Emprises d'environ 1 % de la largeur du jeu de données
+    size_x = (max_x - min_x) / 100
+    size_y = (max_y - min_y) / 100
+    boxes = []
+    for _ in range(queries):
+        x = rng.uniform(min_x, max_x)
+        y = rng.uniform(min_y, max_y)
+        boxes.append((x, y, x + size_x, y + size_y))
+
+    start = time.perf_counter()
+    indexed = [index.query_bbox(*box) for box in boxes]
+    index_bbox = (time.perf_counter() - start) / queries * 1000
+
+    start = time.perf_counter()
+    linear = [[i for i, (x, y) in enumerate(coordinates) if bx0 <= x <= bx1 and by0 <= y <= by1]
+              for bx0, by0, bx1, by1 in boxes]
+    linear_bbox = (time.perf_counter() - start) / queries * 1000
+    if indexed != linear:
+        raise AssertionError("Résultats différents entre l'index et le parcours linéaire")
+
+    start = time.perf_counter()
+    for x0, y0, _, _ in boxes:
+        index.nearest(x0, y0, k)
+    index_nearest = (time.perf_counter() - start) / queries * 1000
+
+    start = time.perf_counter()
+    for x0, y0, _, _ in boxes:
+        scale = math.cos(math.radians(y0))
+        heapq.nsmallest(k, range(len(coordinates)),
+                        key=lambda i: ((coordinates[i][0] - x0) * scale) ** 2 + (coordinates[i][1] - y0) ** 2)
+    linear_nearest = (time.perf_counter() - start) / queries * 1000
+
+    return {
+        "features": index.count,
+        "bbox_index_ms": index_bbox,
+        "bbox_linear_ms": linear_bbox,
+        "nearest_index_ms": index_nearest,
+        "nearest_linear_ms": linear_nearest
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index spatial des fichiers GeoJSON")
+    parser.add_argument('--file', '-f', help='Fichier .geojson ou .geojson.gz')
+    parser.add_argument('--directory', '-d', default='data',
+                        help='Répertoire à indexer (défaut : data)')
+    parser.add_argument('--node-size', type=int, default=DEFAULT_NODE_SIZE,
+                        help="Nombre d'enfants par nœud de l'arbre")
+    parser.add_argument('--bbox', type=float, nargs=4, metavar=('OUEST', 'SUD', 'EST', 'NORD'),
+                        help="Interroger l'index d'un fichier sur une emprise")
+    parser.add_argument('--nearest', type=float, nargs=2, metavar=('LON', 'LAT'),
+                        help="Chercher les points les plus proches d'une position")
+    parser.add_argument('-k', type=int, default=5, help='Nombre de voisins')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Comparer l\'index à un parcours linéaire')
+    parser.add_argument('--catalog', '-c', default=DEFAULT_CATALOG,
+                        help='Catalogue dont les entrées des fichiers réordonnés sont mises à jour '
+                             f'(défaut : {DEFAULT_CATALOG}, s\'il existe)')
+
+    args = parser.parse_args()
+
+    if args.file and (args.bbox or args.nearest or args.benchmark):
+        index = SpatialIndex.load(index_path_for(args.file))
+        if args.bbox:
+            start = time.perf_counter()
+            results = index.query_bbox(*args.bbox)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"{len(results)} features dans l'emprise ({elapsed:.3f} ms) : {results[:20]}")
+        if args.nearest:
+            start = time.perf_counter()
+            results = index.nearest(args.nearest[0], args.nearest[1], args.k)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"{len(results)} plus proches voisins ({elapsed:.3f} ms) :")
+            for rank, distance in results:
+                print(f"  feature {rank} à {distance:.1f} m")
+        if args.benchmark:
+            stats = benchmark(args.file, k=args.k)
+            print(f"{stats['features']} features")
+            print(f"  Emprise : index {stats['bbox_index_ms']:.3f} ms, "
+                  f"parcours linéaire {stats['bbox_linear_ms']:.3f} ms")
+            print(f"  {args.k} plus proches : index {stats['nearest_index_ms']:.3f} ms, "
+                  f"parcours linéaire {stats['nearest_linear_ms']:.3f} ms")
+        return
+
+    if args.file:
+        files = [args.file]
+    else:
+        # Un seul fichier par jeu de données (le .geojson.gz est préféré)
+        files = {}
+        for root, _, names in os.walk(args.directory):
+            for name in names:
+                if name.endswith('.geojson') or name.endswith('.geojson.gz'):
+                    path = os.path.join(root, name)
+                    base_path = path[:-3] if path.endswith('.gz') else path
+                    if base_path not in files or path.endswith('.gz'):
+                        files[base_path] = path
+        files = sorted(files.values())
+
+    for file_path in files:
+        try:
+            index_path = build_index(file_path, args.node_size,
+                                     args.catalog if os.path.isfile(args.catalog) else None)
+        except Exception as e:
+            print(f"Erreur lors de l'indexation de {file_path}: {e}")
+            continue
+        print(f"Index créé : {index_path} ({os.path.getsize(index_path) / 1024:.1f} KB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import os
+import sys
+import gzip
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cdn_client import BarrierDataCDN, CDNIntegrityError, LRUCache  # noqa: E402
+
+
+def feature_collection(name, count):
+    features = [{"type": "Feature", "geometry": {"type": "Point", "coordinates": [i, i]},
+                 "properties": {"name": name}} for i in range(count)]
+    return json.dumps({"type": "FeatureCollection", "features": features}).encode('utf-8')
+
+
+class CDNHandler(BaseHTTPRequestHandler):
+    """Sert server.files avec ETag et 304 ; compte les GET par chemin"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+        time.sleep(server.delay)
+        body = server.files.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    files = {}
+    catalog = {"last_updated": "2026-01-01", "data_categories": {"countries": {"files": [], "encodings": {}}}}
+    for name, count in (("tbA", 50), ("tbB", 50)):
+        file_path = f"countries/{name}.geojson"
+        compressed = gzip.compress(feature_collection(name, count))
+        files[f"/data/{file_path}.gz"] = compressed
+        category = catalog["data_categories"]["countries"]
+        category["files"].append(file_path)
+        category["encodings"][file_path] = {"gzip": {"sha256": hashlib.sha256(compressed).hexdigest()}}
+    files["/metadata/catalog.json"] = json.dumps(catalog).encode('utf-8')
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), CDNHandler)
+    httpd.daemon_threads = True
+    httpd.files = files
+    httpd.requests = []
+    httpd.lock = threading.Lock()
+    httpd.delay = 0
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_concurrent_loads_share_one_request(server):
+    server.delay = 0.2
+    results = []
+    barrier = threading.Barrier(8)
+
+    with BarrierDataCDN(server.url) as cdn:
+        def load():
+            barrier.wait()
+            results.append(cdn.load_country("tbA"))
+
+        threads = [threading.Thread(target=load) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert server.requests == ["/data/countries/tbA.geojson.gz"]
+    assert len(results) == 8
+    assert all(result is results[0] for result in results)
+
+
+def test_second_client_revalidates_with_304(server, tmp_path):
+    with BarrierDataCDN(server.url, cache_dir=str(tmp_path)) as first:
+        expected = first.load_country("tbA")
+    with BarrierDataCDN(server.url, cache_dir=str(tmp_path)) as second:
+        assert second.load_country("tbA") == expected
+        assert second.not_modified == 1
+    assert server.requests == ["/data/countries/tbA.geojson.gz"] * 2
+
+
+def test_disk_cache_hit_sends_no_request(server, tmp_path):
+    with BarrierDataCDN(server.url, cache_dir=str(tmp_path)) as first:
+        assert first.initialize()
+        expected = first.load_country("tbA")
+    requests = len(server.requests)
+
+    with BarrierDataCDN(server.url, cache_dir=str(tmp_path)) as second:
+        second.metadata = first.metadata
+        assert second.load_country("tbA") == expected
+        assert second.requests == 0
+    assert len(server.requests) == requests
+
+
+def test_sha256_mismatch_is_not_cached(server, tmp_path):
+    with BarrierDataCDN(server.url, cache_dir=str(tmp_path)) as cdn:
+        with pytest.raises(CDNIntegrityError):
+            cdn.fetch("data/countries/tbA.geojson.gz", sha256="0" * 64)
+    assert not os.path.exists(tmp_path / "objects")
+
+
+def test_memory_cache_evicts_least_recently_used(server):
+    size = len(gzip.decompress(server.files["/data/countries/tbA.geojson.gz"]))
+
+    with BarrierDataCDN(server.url, max_memory_bytes=size + size // 2) as cdn:
+        cdn.load_country("tbA")
+        cdn.load_country("tbB")
+        assert len(cdn.memory) == 1
+        assert cdn.memory.size == size
+        cdn.load_country("tbA")
+
+    assert server.requests == ["/data/countries/tbA.geojson.gz", "/data/countries/tbB.geojson.gz",
+                               "/data/countries/tbA.geojson.gz"]
+
+
+def test_lru_cache_keeps_recently_used_entries():
+    cache = LRUCache(max_bytes=10)
+    cache.put("a", 1, 4)
+    cache.put("b", 2, 4)
+    cache.get("a")
+    cache.put("c", 3, 4)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    cache.put("big", 4, 11)
+    assert cache.get("big") is None
+    assert cache.size == 8
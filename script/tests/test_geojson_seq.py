@@ -0,0 +1,62 @@
+import os
+import sys
+import gzip
+import json
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geojson_seq import SeqReader, convert_file, seq_paths_for  # noqa: E402
+
+
+def write_source(path, count=4000):
+    """Points répartis au hasard sur l'Europe, dans un ordre sans lien avec leur position"""
+    rng = random.Random(3)
+    features = [{"type": "Feature", "id": i,
+                 "geometry": {"type": "Point",
+                              "coordinates": [round(rng.uniform(-10, 30), 5),
+                                              round(rng.uniform(35, 70), 5)]},
+                 "properties": {"name": f"Barrage {i} – Ürün"}}
+                for i in range(count)]
+    features.append({"type": "Feature", "id": count, "geometry": None, "properties": {}})
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f, ensure_ascii=False)
+    return features
+
+
+def by_id(features):
+    return sorted(features, key=lambda feature: feature["id"])
+
+
+def test_convert_round_trip(tmp_path):
+    source = str(tmp_path / "tbTEST.geojson.gz")
+    features = write_source(source)
+
+    info = convert_file(source, block_size=16 * 1024)
+
+    seq_file, index_file = seq_paths_for(source)
+    assert info["path"] == seq_file and info["index"] == index_file
+    assert info["features"] == len(features) and info["blocks"] > 10
+    with SeqReader(seq_file) as reader:
+        assert reader.features == len(features)
+        assert by_id(reader.iter_features()) == features
+    # Le fichier complet reste un gzip valide (membres concaténés)
+    with gzip.open(seq_file, 'rt', encoding='utf-8') as f:
+        assert by_id(json.loads(line) for line in f) == features
+
+
+def test_blocks_in_bbox_selects_only_nearby_blocks(tmp_path):
+    source = str(tmp_path / "tbTEST.geojson.gz")
+    features = write_source(source)
+    convert_file(source, block_size=16 * 1024)
+
+    bbox = (2.0, 45.0, 3.0, 46.0)
+    inside = [feature["id"] for feature in features if feature["geometry"]
+              and bbox[0] <= feature["geometry"]["coordinates"][0] <= bbox[2]
+              and bbox[1] <= feature["geometry"]["coordinates"][1] <= bbox[3]]
+    with SeqReader(seq_paths_for(source)[0]) as reader:
+        blocks = reader.blocks_in_bbox(*bbox)
+        found = {feature["id"] for feature in reader.iter_features(blocks)}
+        # Le tri spatial regroupe les points voisins : peu de blocs à lire
+        assert len(blocks) <= len(reader.blocks) // 4
+    assert inside and set(inside) <= found
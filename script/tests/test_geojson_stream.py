@@ -0,0 +1,110 @@
+import io
+import os
+import sys
+import gzip
+import json
+import sqlite3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from create_geojson import export_table  # noqa: E402
+from geojson_stream import FeatureCollectionWriter, iter_features  # noqa: E402
+
+ROWS = [
+    (1, 48.8566, 2.3522, "Paris", 12),
+    (2, 45.764043, 4.835659, "Lyon", None),
+    (3, None, 5.36978, "Sans latitude", 3),
+    (4, 43.296482, 5.36978, "Marseille", 7),
+    (5, 50.62925, 3.057256, "Lille", 0),
+    (6, 44.837789, -0.57918, "Bordeaux", 41),
+]
+
+
+class RecordingCursor:
+    """Curseur sqlite3 qui enregistre la taille demandée à chaque fetchmany"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.fetchmany_sizes = []
+
+    def fetchmany(self, size):
+        self.fetchmany_sizes.append(size)
+        return self._cursor.fetchmany(size)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def make_cursor():
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE tbTEST (id INTEGER, latitude REAL, longitude REAL, "
+                       "name TEXT, height INTEGER)")
+    connection.executemany("INSERT INTO tbTEST VALUES (?, ?, ?, ?, ?)", ROWS)
+    return RecordingCursor(connection.cursor())
+
+
+def expected_collection():
+    """FeatureCollection construite en mémoire, comme avant le streaming"""
+    features = []
+    for id_, lat, lon, name, height in ROWS:
+        if lat is None or lon is None:
+            continue
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [round(lon, 6), round(lat, 6)]},
+            "properties": {"id": str(id_), "name": name,
+                           "height": None if height is None else str(height)}
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def test_export_table_matches_full_collection(tmp_path):
+    cursor = make_cursor()
+
+    count = export_table(cursor, "tbTEST", str(tmp_path), batch_size=2)
+
+    expected = json.dumps(expected_collection(), separators=(',', ':'), ensure_ascii=False)
+    assert count == 5
+    with open(tmp_path / "tbTEST.geojson", encoding="utf-8") as f:
+        assert f.read() == expected
+    with gzip.open(tmp_path / "tbTEST.geojson.gz", "rt", encoding="utf-8") as f:
+        assert f.read() == expected
+
+
+def test_export_table_fetches_in_batches(tmp_path):
+    cursor = make_cursor()
+
+    export_table(cursor, "tbTEST", str(tmp_path), batch_size=2)
+
+    # 5 lignes valides : trois lots puis un lot vide qui termine la lecture
+    assert cursor.fetchmany_sizes == [2, 2, 2, 2]
+
+
+def test_iter_features_decodes_characters_split_across_reads():
+    collection = {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "geometry": None, "properties": {"name": "Barrage de l'Œuf — Ñ 日本"}},
+        {"type": "Feature", "geometry": None, "properties": {"name": "Zürich 🐟"}},
+    ]}
+    data = json.dumps(collection, ensure_ascii=False).encode('utf-8')
+
+    # Lecture octet par octet : chaque caractère multi-octets est coupé
+    features = list(iter_features(io.BytesIO(data), chunk_size=1))
+
+    assert features == collection["features"]
+
+
+def test_collection_members_round_trip():
+    collection = {"type": "FeatureCollection", "name": "tbTEST",
+                  "crs": {"type": "name", "properties": {"name": "EPSG:4326"}},
+                  "features": [{"type": "Feature", "geometry": None, "properties": {}}]}
+    members = {}
+    features = list(iter_features(io.StringIO(json.dumps(collection)), members=members))
+
+    for indent in (None, 2):
+        out = io.StringIO()
+        writer = FeatureCollectionWriter(out, indent, members=members)
+        for feature in features:
+            writer.write(feature)
+        writer.close()
+        assert out.getvalue() == json.dumps(collection, indent=indent, ensure_ascii=False,
+                                            separators=None if indent else (',', ':'))
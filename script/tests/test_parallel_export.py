@@ -0,0 +1,57 @@
+import os
+import sys
+import gzip
+import random
+import sqlite3
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from create_geojson import export_table  # noqa: E402
+from parallel_export import export_tables_parallel  # noqa: E402
+
+
+def make_database(path, rows=3000):
+    """Table géolocalisée dont les lignes sont insérées dans le désordre"""
+    rng = random.Random(1)
+    ids = list(range(1, rows + 1))
+    rng.shuffle(ids)
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE tbTEST (id INTEGER, latitude REAL, longitude REAL, "
+                           "name TEXT, height REAL)")
+        connection.executemany("INSERT INTO tbTEST VALUES (?, ?, ?, ?, ?)", [
+            (id_, rng.uniform(35, 70), rng.uniform(-10, 30), f"Barrage {id_} é",
+             None if id_ % 7 == 0 else round(rng.uniform(0, 40), 2))
+            for id_ in ids])
+    connection.close()
+
+
+def read_outputs(output_dir):
+    with open(os.path.join(output_dir, "tbTEST.geojson"), 'rb') as f:
+        text = f.read()
+    with gzip.open(os.path.join(output_dir, "tbTEST.geojson.gz"), 'rb') as f:
+        compressed = f.read()
+    return text, compressed
+
+
+def test_serial_parallel_and_sharded_outputs_are_identical(tmp_path):
+    database = str(tmp_path / "atlas.sqlite")
+    make_database(database)
+    connection_factory = partial(sqlite3.connect, database)
+
+    serial_dir = tmp_path / "serial"
+    serial_dir.mkdir()
+    connection = connection_factory()
+    try:
+        assert export_table(connection.cursor(), "tbTEST", str(serial_dir), batch_size=500) == 3000
+    finally:
+        connection.close()
+    expected = read_outputs(serial_dir)
+    assert expected[0] == expected[1]
+
+    for name, shards in (("parallel", 1), ("sharded", 4)):
+        output_dir = str(tmp_path / name)
+        timings = export_tables_parallel(connection_factory, ["tbTEST"], output_dir,
+                                         connections=4, workers=2, batch_size=500, shards=shards)
+        assert timings["tbTEST"]["features"] == 3000
+        assert read_outputs(output_dir) == expected, name
@@ -0,0 +1,55 @@
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from region_index import PreparedPolygon, RegionIndex, find_regions, point_in_polygons  # noqa: E402
+
+SQUARE = [[[[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]]]]
+
+# Carré troué et triangle à arêtes obliques, dans le même multipolygone
+SHAPES = [
+    [[0, 0], [8, 0], [8, 8], [0, 8], [0, 0]],
+    [[2, 2], [2, 5], [5, 5], [5, 2], [2, 2]],
+], [
+    [[10, 1], [16, 1], [13, 7], [10, 1]],
+]
+
+
+def grid_points(min_v, max_v, step):
+    values = [min_v + i * step for i in range(int((max_v - min_v) / step) + 1)]
+    return [(x, y) for x in values for y in values]
+
+
+def test_edge_points_follow_point_in_polygons():
+    prepared = PreparedPolygon(SQUARE, grid_size=8)
+    points = grid_points(-1, 11, 0.25)
+    on_edge = [(x, y) for x, y in points
+               if (x in (0, 10) and 0 <= y <= 10) or (y in (0, 10) and 0 <= x <= 10)]
+    assert len(on_edge) == 160
+    for x, y in points:
+        assert prepared.contains(x, y) == point_in_polygons(x, y, SQUARE), (x, y)
+    # Règle du lancer de rayon : bords gauche et bas dedans, droit et haut dehors
+    assert prepared.contains(0, 5) and prepared.contains(5, 0)
+    assert not prepared.contains(10, 5) and not prepared.contains(5, 10)
+
+
+def test_holes_and_oblique_edges_follow_point_in_polygons():
+    polygons = list(SHAPES)
+    prepared = PreparedPolygon(polygons, grid_size=16)
+    points = grid_points(-1, 17, 0.125)
+    # Points exactement sur les arêtes obliques du triangle
+    points += [(10 + t * 0.5, 1 + t) for t in range(7)] + [(16 - t * 0.5, 1 + t) for t in range(7)]
+    rng = random.Random(7)
+    points += [(rng.uniform(-1, 17), rng.uniform(-1, 9)) for _ in range(5000)]
+    for x, y in points:
+        assert prepared.contains(x, y) == point_in_polygons(x, y, polygons), (x, y)
+
+
+def test_region_index_matches_find_regions():
+    regions = [("carre", (0, 0, 10, 10), SQUARE[0:1]),
+               ("formes", (0, 0, 16, 8), list(SHAPES))]
+    index = RegionIndex(regions, grid_size=8)
+    for x, y in grid_points(-1, 17, 0.5):
+        assert index.find(x, y) == find_regions(regions, x, y), (x, y)
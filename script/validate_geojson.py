@@ -0,0 +1,490 @@
+import os
+import json
+import gzip
+import math
+import time
+import argparse
+from array import array
+from hashlib import blake2b
+from collections import Counter
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
+
+from geojson_stream import FeatureCollectionWriter, encode_feature, get_serializer, iter_features
+
+# Propriété contenant l'identifiant quand la feature n'a pas de membre "id"
+DEFAULT_ID_PROPERTY = "ID"
+
+# Nombre d'exemples de problèmes gardés par fichier
+MAX_EXAMPLES = 20
+
+# Problèmes qui empêchent la publication (sans réparation)
+ERRORS = ("invalid_feature", "invalid_geometry", "non_finite", "out_of_range",
+          "unclosed_ring", "duplicate_id")
+# Problèmes signalés sans bloquer la publication
+WARNINGS = ("null_geometry", "missing_id")
+
+# Profondeur d'imbrication des coordonnées de chaque type de géométrie
+# (1 : une position) et nombre minimal d'éléments au premier niveau
+GEOMETRY_TYPES = {
+    "Point": (1, 0),
+    "MultiPoint": (2, 0),
+    "LineString": (2, 2),
+    "MultiLineString": (3, 0),
+    "Polygon": (3, 1),
+    "MultiPolygon": (4, 0),
+}
+
+_NUMBER_TYPES = (int, float)
+
+
+class IdSet:
+    """
+    Ensemble compact d'identifiants
+
+    Chaque identifiant est réduit à une empreinte de 64 bits (BLAKE2b),
+    rangée dans une table à adressage ouvert (array) remplie au plus à
+    moitié : 16 octets par identifiant au plus, contre une centaine pour un
+    set de chaînes. Les identifiants sont comparés sous forme de texte (1 et
+    "1" sont le même identifiant). Deux identifiants distincts ne se
+    confondent qu'avec une probabilité de l'ordre de n² / 2^65, moins de
+    1e-7 pour un million d'identifiants.
+    """
+
+    def __init__(self, capacity=1024):
+        size = 1
+        while size < capacity:
+            size *= 2
+        self._table = array('Q', bytes(8 * size))
+        self._mask = size - 1
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        """Taille de la table en octets"""
+        return len(self._table) * self._table.itemsize
+
+    @staticmethod
+    def fingerprint(value):
+        digest = blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+        # 0 marque une case vide
+        return int.from_bytes(digest, 'little') or 1
+
+    def add(self, value):
+        """Ajoute un identifiant ; retourne False s'il était déjà présent"""
+        key = self.fingerprint(value)
+        table, mask = self._table, self._mask
+        slot = key & mask
+        while True:
+            current = table[slot]
+            if not current:
+                break
+            if current == key:
+                return False
+            slot = (slot + 1) & mask
+        table[slot] = key
+        self.count += 1
+        if self.count * 2 > len(table):
+            self._grow()
+        return True
+
+    def _grow(self):
+        old = self._table
+        self._table = array('Q', bytes(16 * len(old)))
+        self._mask = len(self._table) - 1
+        table, mask = self._table, self._mask
+        for key in old:
+            if key:
+                slot = key & mask
+                while table[slot]:
+                    slot = (slot + 1) & mask
+                table[slot] = key
+
+
+def check_position(position):
+    """Problème d'une position [longitude, latitude, ...] (None si valide)"""
+    if type(position) is not list or len(position) < 2:
+        return "invalid_geometry"
+    for value in position:
+        if type(value) not in _NUMBER_TYPES:
+            return "invalid_geometry"
+        if not math.isfinite(value):
+            return "non_finite"
+    if not (-180 <= position[0] <= 180 and -90 <= position[1] <= 90):
+        return "out_of_range"
+    return None
+
+
+def _check_coordinates(coordinates, depth, minimum=0, polygon=False):
+    if depth == 1:
+        return check_position(coordinates)
+    if type(coordinates) is not list or len(coordinates) < minimum:
+        return "invalid_geometry"
+    found = None
+    for item in coordinates:
+        if polygon and depth == 3:
+            issue = _check_ring(item)
+        elif polygon:
+            issue = _check_coordinates(item, depth - 1, 1, True)
+        else:
+            issue = _check_coordinates(item, depth - 1, 2 if depth == 3 else 0)
+        # Une géométrie invalide l'emporte sur les autres problèmes
+        if issue in ("invalid_geometry", "non_finite"):
+            return issue
+        found = found or issue
+    return found
+
+
+def _check_ring(ring):
+    issue = _check_coordinates(ring, 2, 3)
+    if issue in ("invalid_geometry", "non_finite"):
+        return issue
+    if ring[0] != ring[-1]:
+        return "unclosed_ring"
+    if len(ring) < 4:
+        return "invalid_geometry"
+    return issue
+
+
+def check_geometry(geometry):
+    """
+    Problème d'une géométrie GeoJSON (None si valide)
+
+    Vérifie le type, l'imbrication et le nombre des positions (deux pour une
+    ligne, quatre pour un anneau), la fermeture des anneaux et les bornes
+    des coordonnées (longitude entre -180 et 180, latitude entre -90 et 90).
+    """
+    if geometry is None:
+        return "null_geometry"
+    if type(geometry) is not dict:
+        return "invalid_geometry"
+    kind = geometry.get("type")
+    if kind == "GeometryCollection":
+        geometries = geometry.get("geometries")
+        if type(geometries) is not list:
+            return "invalid_geometry"
+        found = None
+        for member in geometries:
+            issue = "invalid_geometry" if member is None else check_geometry(member)
+            if issue in ("invalid_geometry", "non_finite"):
+                return issue
+            found = found or issue
+        return found
+    if kind not in GEOMETRY_TYPES:
+        return "invalid_geometry"
+    depth, minimum = GEOMETRY_TYPES[kind]
+    return _check_coordinates(geometry.get("coordinates"), depth, minimum, kind.endswith("Polygon"))
+
+
+def _rings(geometry):
+    """Anneaux des polygones d'une géométrie"""
+    kind = geometry.get("type")
+    if kind == "Polygon":
+        yield from geometry["coordinates"]
+    elif kind == "MultiPolygon":
+        for polygon in geometry["coordinates"]:
+            yield from polygon
+    elif kind == "GeometryCollection":
+        for member in geometry["geometries"]:
+            yield from _rings(member)
+
+
+def _positions(geometry):
+    """Positions d'une géométrie (listes modifiables en place)"""
+    if geometry.get("type") == "GeometryCollection":
+        for member in geometry["geometries"]:
+            yield from _positions(member)
+        return
+    depth = GEOMETRY_TYPES[geometry["type"]][0]
+    stack = [(geometry["coordinates"], depth)]
+    while stack:
+        coordinates, depth = stack.pop()
+        if depth == 1:
+            yield coordinates
+        else:
+            stack.extend((item, depth - 1) for item in coordinates)
+
+
+def repair_geometry(geometry, issue):
+    """
+    Tente de corriger une géométrie (modifiée en place)
+
+    - unclosed_ring : la première position de chaque anneau ouvert est
+      ajoutée à sa fin
+    - out_of_range : longitude et latitude sont inversées si toutes les
+      positions deviennent valides (export en latitude, longitude)
+
+    Returns:
+        True si la géométrie est valide après correction
+    """
+    if issue == "unclosed_ring":
+        for ring in _rings(geometry):
+            if ring[0] != ring[-1]:
+                ring.append(list(ring[0]))
+    elif issue == "out_of_range":
+        positions = list(_positions(geometry))
+        if not all(-180 <= y <= 180 and -90 <= x <= 90 for x, y, *_ in positions):
+            return False
+        for position in positions:
+            position[0], position[1] = position[1], position[0]
+    else:
+        return False
+    return check_geometry(geometry) is None
+
+
+class FeatureValidator:
+    """
+    Valide les features une par une et compte les problèmes trouvés
+
+    Seul l'ensemble des identifiants (voir IdSet) grandit avec le nombre de
+    features. Avec repair, les géométries sont corrigées quand c'est
+    possible (voir repair_geometry) ; les features invalides restantes et
+    les doublons d'identifiant sont écartés.
+
+    Args:
+        id_property: Propriété lue quand la feature n'a pas de membre "id"
+            (None : membre "id" seulement)
+        repair: Corriger ou écarter les features invalides
+    """
+
+    def __init__(self, id_property=DEFAULT_ID_PROPERTY, repair=False):
+        self.id_property = id_property
+        self.repair = repair
+        self.ids = IdSet()
+        self.issues = Counter()
+        self.repaired = Counter()
+        self.examples = []
+        self.count = 0
+        self.dropped = 0
+
+    @property
+    def errors(self):
+        """Nombre de problèmes bloquants"""
+        return sum(self.issues[issue] for issue in ERRORS)
+
+    def _issue(self, issue, feature_id=None):
+        self.issues[issue] += 1
+        if len(self.examples) < MAX_EXAMPLES:
+            self.examples.append({"feature": self.count - 1, "issue": issue, "id": feature_id})
+
+    def feature_id(self, feature):
+        """Identifiant d'une feature (membre "id" ou propriété id_property)"""
+        feature_id = feature.get("id")
+        if feature_id is None and self.id_property:
+            properties = feature.get("properties")
+            if type(properties) is dict:
+                feature_id = properties.get(self.id_property)
+        return feature_id
+
+    def check(self, feature):
+        """
+        Valide (et répare) une feature
+
+        Returns:
+            True si la feature est à écrire : valide, réparée, ou invalide
+            sans repair (la publication est alors refusée)
+        """
+        self.count += 1
+        if (type(feature) is not dict or feature.get("type") != "Feature"
+                or type(feature.get("properties", {})) not in (dict, type(None))):
+            self._issue("invalid_feature")
+            return self._drop()
+
+        feature_id = self.feature_id(feature)
+        issue = check_geometry(feature.get("geometry"))
+        if issue is not None:
+            self._issue(issue, feature_id)
+            if self.repair and issue != "null_geometry":
+                if not repair_geometry(feature["geometry"], issue):
+                    return self._drop()
+                self.repaired[issue] += 1
+
+        if feature_id is None:
+            self._issue("missing_id")
+        elif not self.ids.add(feature_id):
+            self._issue("duplicate_id", feature_id)
+            return self._drop()
+        return True
+
+    def _drop(self):
+        if not self.repair:
+            return True
+        self.dropped += 1
+        return False
+
+
+def open_source(path):
+    """Ouvre un fichier GeoJSON en lecture, compressé en gzip ou non"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def validate_file(source, output=None, compressed=None, repair=False,
+                  id_property=DEFAULT_ID_PROPERTY, serializer=None, compresslevel=9):
+    """
+    Valide un fichier GeoJSON en une lecture en flux et, dans la même passe,
+    écrit sa version compacte (et compressée)
+
+    Les fichiers de sortie sont écrits dans des fichiers temporaires, mis en
+    place seulement si le fichier est publiable : sans problème bloquant, ou
+    corrigé avec repair.
+
+    Args:
+        source: Fichier .geojson ou .geojson.gz
+        output: Fichier .geojson compact à écrire (None : aucun)
+        compressed: Fichier .geojson.gz à écrire (None : aucun)
+        repair: Corriger ou écarter les features invalides (voir FeatureValidator)
+        id_property: Propriété d'identifiant (voir FeatureValidator)
+        serializer: Sérialiseur (voir geojson_stream.get_serializer)
+        compresslevel: Niveau de compression gzip
+
+    Returns:
+        Rapport : source, features, written, dropped, issues, repaired,
+        examples, fatal (document illisible), valid, outputs, bytes_in,
+        bytes_out, seconds, cpu_seconds, features_per_s, mb_per_s
+    """
+    start, cpu_start = time.perf_counter(), time.process_time()
+    validator = FeatureValidator(id_property, repair)
+    serializer = get_serializer(serializer)
+    outputs = [path for path in (output, compressed) if path]
+    tmp_paths = {path: f"{path}.{os.getpid()}.tmp" for path in outputs}
+    written = 0
+    fatal = None
+
+    with ExitStack() as stack:
+        writers = []
+        if output:
+            f = stack.enter_context(open(tmp_paths[output], 'w', encoding='utf-8'))
+            writers.append(FeatureCollectionWriter(f, serializer=serializer))
+        if compressed:
+            gz = stack.enter_context(gzip.open(tmp_paths[compressed], 'wt', encoding='utf-8',
+                                               compresslevel=compresslevel))
+            writers.append(FeatureCollectionWriter(gz, serializer=serializer))
+        try:
+            with open_source(source) as f:
+                for feature in iter_features(f):
+                    if not validator.check(feature):
+                        continue
+                    # Sans repair, la sortie d'un fichier invalide ne sera pas publiée
+                    if writers and (repair or not validator.errors):
+                        text = encode_feature(feature, serializer=serializer)
+                        for writer in writers:
+                            writer.write_encoded(text)
+                        written += 1
+        except (ValueError, EOFError, OSError) as e:
+            fatal = f"{type(e).__name__}: {e}"
+        for writer in writers:
+            writer.close()
+
+    valid = fatal is None and (repair or not validator.errors)
+    bytes_out = 0
+    for path, tmp_path in tmp_paths.items():
+        if valid:
+            bytes_out += os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        else:
+            os.remove(tmp_path)
+
+    seconds = time.perf_counter() - start
+    bytes_in = os.path.getsize(source)
+    return {
+        "source": source,
+        "features": validator.count,
+        "written": written if valid and outputs else 0,
+        "dropped": validator.dropped,
+        "issues": {issue: validator.issues[issue] for issue in ERRORS + WARNINGS
+                   if validator.issues[issue]},
+        "repaired": dict(validator.repaired),
+        "examples": validator.examples,
+        "ids": len(validator.ids),
+        "id_table_bytes": validator.ids.nbytes,
+        "fatal": fatal,
+        "valid": valid,
+        "outputs": outputs if valid else [],
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+        "seconds": seconds,
+        "cpu_seconds": time.process_time() - cpu_start,
+        "features_per_s": validator.count / seconds if seconds else 0,
+        "mb_per_s": bytes_in / seconds / 1024 / 1024 if seconds else 0,
+    }
+
+
+def validate_files(jobs, workers=None):
+    """
+    Exécute validate_file sur plusieurs fichiers en parallèle
+
+    Args:
+        jobs: Arguments nommés de validate_file, un dictionnaire par fichier
+        workers: Nombre de processus (défaut : nombre de CPU)
+
+    Returns:
+        Rapports dans l'ordre des jobs (fatal renseigné si le traitement a
+        échoué)
+    """
+    reports = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(validate_file, **job) for job in jobs]
+        for job, future in zip(jobs, futures):
+            try:
+                reports.append(future.result())
+            except Exception as e:
+                reports.append(failed_report(job["source"], e))
+    return reports
+
+
+def failed_report(source, error):
+    """Rapport d'un fichier dont le traitement a échoué"""
+    return {"source": source, "features": 0, "written": 0, "dropped": 0, "issues": {},
+            "repaired": {}, "examples": [], "ids": 0, "id_table_bytes": 0,
+            "fatal": f"{type(error).__name__}: {error}", "valid": False, "outputs": [],
+            "bytes_in": 0, "bytes_out": 0, "seconds": 0, "cpu_seconds": 0,
+            "features_per_s": 0, "mb_per_s": 0}
+
+
+def print_report(reports):
+    """Affiche le débit et les problèmes de chaque fichier"""
+    print(f"\n{'Fichier':<40} {'Features':>9} {'Écrites':>9} {'Écartées':>9} {'Erreurs':>8} "
+          f"{'MB/s':>7} {'Features/s':>11}  Statut")
+    print("-" * 110)
+    for report in reports:
+        errors = sum(n for issue, n in report["issues"].items() if issue in ERRORS)
+        status = "OK" if report["valid"] else ("ILLISIBLE" if report["fatal"] else "REFUSÉ")
+        print(f"{os.path.basename(report['source']):<40} {report['features']:>9} "
+              f"{report['written']:>9} {report['dropped']:>9} {errors:>8} "
+              f"{report['mb_per_s']:>7.1f} {report['features_per_s']:>11,.0f}  {status}")
+        if report["fatal"]:
+            print(f"    {report['fatal']}")
+        for issue, count in report["issues"].items():
+            repaired = report["repaired"].get(issue, 0)
+            print(f"    {issue:<20} {count:>8}" + (f"  ({repaired} corrigées)" if repaired else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Valider des fichiers GeoJSON (géométries, coordonnées, identifiants)')
+    parser.add_argument('sources', nargs='+', help='Fichiers .geojson ou .geojson.gz')
+    parser.add_argument('--id-property', default=DEFAULT_ID_PROPERTY,
+                        help=f'Propriété d\'identifiant, si la feature n\'a pas de membre "id" '
+                             f'(défaut : {DEFAULT_ID_PROPERTY})')
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                        help='Nombre de processus (défaut : nombre de CPU)')
+    parser.add_argument('--report', '-r',
+                        help='Fichier JSON où écrire les rapports')
+
+    args = parser.parse_args()
+
+    reports = validate_files([{"source": source, "id_property": args.id_property}
+                              for source in args.sources], args.workers)
+    print_report(reports)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+        print(f"Rapports écrits dans {args.report}")
+
+
+if __name__ == "__main__":
+    main()